@@ -0,0 +1,95 @@
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from benchmarks.suite import generate_data_file
+from lib.data_access import BLOOM_HEADROOM, FileStudentDataAccess
+from lib.entities import Student, PrimaryKey
+from lib.exceptions import RecordNotFound
+from lib.file_data_client import FileDataClient
+from lib.metrics import BLOOM_REJECTS, Metrics
+
+
+ROWS_COUNT = 50_000
+SCAN_MISSES_COUNT = 5  # промах без фильтра - полный проход по файлу, их немного
+BLOOM_MISSES_COUNT = 10_000
+FALSE_POSITIVE_RATES = (0.01, 0.001)
+LOOKUPS_SEED = 1
+BENCHMARK_RESULTS_FILE_PATH = "benchmark_results_bloom.txt"
+
+
+def measure_misses(dao: FileStudentDataAccess, record_ids) -> float:
+    """ Среднее время поиска несуществующего id, секунды """
+    start_time = perf_counter()
+
+    for record_id in record_ids:
+        try:
+            dao.get_student(PrimaryKey(record_id))
+        except RecordNotFound:
+            pass
+
+    return (perf_counter() - start_time) / len(record_ids)
+
+
+def run_benchmark():
+    work_dir = tempfile.mkdtemp()
+    data_path = os.path.join(work_dir, "students.txt")
+    bloom_path = data_path + ".bloom"
+    generate_data_file(data_path, ROWS_COUNT)
+    # id в файле - от 0 до ROWS_COUNT, промахи - опечатки за этим диапазоном
+    generator = random.Random(LOOKUPS_SEED)
+    missing_ids = [ROWS_COUNT + generator.randrange(ROWS_COUNT * 100) for _ in range(BLOOM_MISSES_COUNT)]
+
+    try:
+        with open(BENCHMARK_RESULTS_FILE_PATH, "w") as file:
+            print("Bloom filter benchmark", file=file)
+            print("\n", file=file)
+            print(f"{ROWS_COUNT} rows, linear FileStudentDataAccess, lookups of missing ids", file=file)
+            print(f"Filter capacity is {BLOOM_HEADROOM} times the ids in the file, so the real rate is below the configured one", file=file)
+
+            with FileDataClient(data_path, Student, encoding="utf-8", keep_open=True) as client:
+                dao = FileStudentDataAccess(client)
+                miss_seconds = measure_misses(dao, missing_ids[:SCAN_MISSES_COUNT])
+                print(f"no filter: {miss_seconds * 1000:.1f} ms per miss", file=file)
+
+                for false_positive_rate in FALSE_POSITIVE_RATES:
+                    if os.path.exists(bloom_path):
+                        os.remove(bloom_path)
+
+                    metrics = Metrics()
+                    dao = FileStudentDataAccess(
+                        client, metrics=metrics, bloom_filter=True,
+                        bloom_false_positive_rate=false_positive_rate, bloom_path=bloom_path,
+                    )
+                    # первый поиск проходит файл и попутно строит фильтр
+                    build_seconds = measure_misses(dao, missing_ids[:1])
+
+                    metrics.reset()
+                    miss_seconds = measure_misses(dao, missing_ids)
+                    passed = 1 - metrics.snapshot().get(BLOOM_REJECTS, 0) / BLOOM_MISSES_COUNT
+
+                    # новый объект загружает сохраненный фильтр при первом поиске
+                    reloaded = FileStudentDataAccess(
+                        client, bloom_filter=True, bloom_false_positive_rate=false_positive_rate, bloom_path=bloom_path
+                    )
+                    start_time = perf_counter()
+                    measure_misses(reloaded, missing_ids[:1])
+                    load_seconds = perf_counter() - start_time
+
+                    print(
+                        f"filter {false_positive_rate}: {miss_seconds * 1e6:.1f} us per miss, "
+                        f"{passed:.2%} of misses scanned the file, "
+                        f"first lookup with build {build_seconds * 1000:.0f} ms, "
+                        f"first lookup with saved filter {load_seconds * 1000:.1f} ms, "
+                        f"filter file {os.path.getsize(bloom_path):,} bytes",
+                        file=file,
+                    )
+    finally:
+        for path in (data_path, bloom_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    run_benchmark()
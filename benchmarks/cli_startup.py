@@ -0,0 +1,113 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from benchmarks.suite import generate_data_file
+
+
+ROWS_COUNT = 200_000
+RUNS = 5
+RECORD_ID = ROWS_COUNT // 2
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_RESULTS_FILE_PATH = "benchmark_results_cli_startup.txt"
+
+# Полная сборка, как в интерактивном режиме run.py: все зависимости из конфига и индекс в памяти.
+# simio_di не запускаем - его импорт и внедрение только добавились бы к этому времени
+FULL_WIRING = """
+import config
+from lib.data_access import IndexFileStudentDataAccess
+from lib.entities import PrimaryKey
+from lib.file_data_client import FileDataClient
+
+options = config.get_config()
+file_client = FileDataClient(**options[FileDataClient])
+print(IndexFileStudentDataAccess(file_client, **options[IndexFileStudentDataAccess]).get_student(PrimaryKey({record_id})))
+"""
+
+COMMANDS = {
+    "run.py --find": [os.path.join(PACKAGE_PATH, "run.py"), "--find", str(RECORD_ID)],
+    "full wiring": ["-c", FULL_WIRING.format(record_id=RECORD_ID)],
+}
+
+
+def run(arguments: List[str], work_dir: str, python_options: List[str] = ()) -> subprocess.CompletedProcess:
+    """ Запускает новый интерпретатор в work_dir, где лежит students.txt, как это делают скрипты """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (PACKAGE_PATH, os.environ.get("PYTHONPATH")))))
+    return subprocess.run(
+        [sys.executable, *python_options, *arguments], cwd=work_dir, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def measure_wall_time(arguments: List[str], work_dir: str, index_path: Optional[str]) -> float:
+    """ Медиана времени запуска процесса до выхода, секунды. Если передан index_path, перед запуском он удаляется """
+    durations = []
+
+    for _ in range(RUNS):
+        if index_path is not None and os.path.exists(index_path):
+            os.remove(index_path)  # полная сборка сохраняет индекс, а этот замер - без него
+
+        start_time = perf_counter()
+        run(arguments, work_dir)
+        durations.append(perf_counter() - start_time)
+
+    return statistics.median(durations)
+
+
+def measure_import_time(arguments: List[str], work_dir: str) -> Dict[str, int]:
+    """ Время импорта модулей верхнего уровня по -X importtime, микросекунды. Ключ total - сумма """
+    stderr = run(arguments, work_dir, ["-X", "importtime"]).stderr
+    modules = {}
+
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):  # вложенные импорты уже учтены в cumulative родителя
+            modules[name.strip()] = int(cumulative)
+
+    return {"total": sum(modules.values()), **modules}
+
+
+def run_benchmark():
+    work_dir = tempfile.mkdtemp()
+    data_path = os.path.join(work_dir, "students.txt")
+    index_path = data_path + ".idx"
+    generate_data_file(data_path, ROWS_COUNT)
+
+    try:
+        with open(BENCHMARK_RESULTS_FILE_PATH, "w") as file:
+            print("CLI startup benchmark", file=file)
+            print("\n", file=file)
+            print(f"{ROWS_COUNT} rows, one lookup per process, median of {RUNS} runs", file=file)
+
+            for with_index in (False, True):
+                for name, arguments in COMMANDS.items():
+                    if with_index and not os.path.exists(index_path):
+                        run(COMMANDS["full wiring"], work_dir)  # сохраняет индекс students.txt.idx
+
+                    seconds = measure_wall_time(arguments, work_dir, None if with_index else index_path)
+                    print(f"{name}, persisted index={with_index}: {seconds * 1000:.0f} ms", file=file)
+
+            print("\n", file=file)
+            for name, arguments in COMMANDS.items():
+                import_times = measure_import_time(arguments, work_dir)
+                slowest = sorted(
+                    ((module, time) for module, time in import_times.items() if module != "total"),
+                    key=lambda item: item[1],
+                    reverse=True,
+                )[:5]
+                print(f"{name}: imports {import_times['total'] / 1000:.1f} ms", file=file)
+                print("  slowest: " + ", ".join(f"{module} {time / 1000:.1f} ms" for module, time in slowest), file=file)
+    finally:
+        for path in (data_path, index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    run_benchmark()
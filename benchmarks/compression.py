@@ -0,0 +1,81 @@
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from benchmarks.suite import generate_data_file, measure_lookups, random_ids, skewed_ids
+from lib.compressed_data_client import CODEC_LZMA, CODEC_ZLIB, CompressedFileDataClient, convert_text_file
+from lib.data_access import IndexFileStudentDataAccess, KEY_FIELD
+from lib.entities import Student
+from lib.file_data_client import FileDataClient
+from lib.metrics import BYTES_READ, Metrics
+
+
+ROWS_COUNT = 200_000
+LOOKUPS_COUNT = 5_000
+BLOCK_SIZES = (8 * 1024, 64 * 1024)
+LOOKUPS_SEED = 1
+BENCHMARK_RESULTS_FILE_PATH = "benchmark_results_compression.txt"
+
+
+def benchmark(name: str, client, data_path: str, file) -> None:
+    """ Пишет в file размер файла, время построения индекса, задержки поиска и байты с диска на один поиск """
+    metrics = Metrics()
+    client.metrics = metrics
+    start_time = perf_counter()
+    data_access = IndexFileStudentDataAccess(client)
+    build_seconds = perf_counter() - start_time
+
+    # генератор id не должен совпадать с генератором файла, иначе id коррелируют с позициями
+    for pattern, record_ids in (
+        ("random", random_ids(ROWS_COUNT, LOOKUPS_COUNT, random.Random(LOOKUPS_SEED))),
+        ("skewed", skewed_ids(ROWS_COUNT, LOOKUPS_COUNT, random.Random(LOOKUPS_SEED))),
+    ):
+        metrics.reset()
+        latencies = measure_lookups(data_access, record_ids)
+        bytes_per_lookup = metrics.snapshot().get(BYTES_READ, 0) / LOOKUPS_COUNT
+
+        print(
+            f"{name}, {pattern} lookups: p50 {latencies['p50'] * 1e6:.1f} us, p99 {latencies['p99'] * 1e6:.1f} us, "
+            f"{bytes_per_lookup:,.0f} bytes read per lookup",
+            file=file,
+        )
+
+    print(
+        f"{name}: file {os.path.getsize(data_path):,} bytes, index build {build_seconds:.3f} seconds",
+        file=file,
+    )
+
+
+def run_benchmark():
+    work_dir = tempfile.mkdtemp()
+    text_path = os.path.join(work_dir, "students.txt")
+    generate_data_file(text_path, ROWS_COUNT)
+    paths = [text_path]
+
+    try:
+        with open(BENCHMARK_RESULTS_FILE_PATH, "w") as file:
+            print("Compressed block storage benchmark", file=file)
+            print("\n", file=file)
+            print(f"{ROWS_COUNT} rows, {LOOKUPS_COUNT} lookups, block cache of 16 blocks", file=file)
+            print("Text: bytes of read lines. Compressed: compressed bytes of blocks missed in the block cache", file=file)
+
+            with FileDataClient(text_path, Student, encoding="utf-8", keep_open=True) as client:
+                benchmark("text", client, text_path, file)
+
+            for codec in (CODEC_ZLIB, CODEC_LZMA):
+                for block_size in BLOCK_SIZES:
+                    path = os.path.join(work_dir, f"students.{codec}.{block_size}")
+                    paths.append(path)
+                    source = FileDataClient(text_path, Student, encoding="utf-8")
+                    convert_text_file(source, path, KEY_FIELD, codec, block_size)
+
+                    with CompressedFileDataClient(path, Student) as client:
+                        benchmark(f"{codec}, {block_size // 1024} KB blocks", client, path, file)
+    finally:
+        for path in paths:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    run_benchmark()
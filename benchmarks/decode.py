@@ -0,0 +1,60 @@
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from lib.entities import Student
+from lib.file_data_client import FileDataClient
+
+
+ROWS_COUNT = 1_000_000
+BENCHMARK_RESULTS_FILE_PATH = "benchmark_results_decode.txt"
+
+
+class DictFileDataClient(FileDataClient):
+    """ Прежний способ десериализации: словарь на каждую строку и Student.from_dict """
+    def _load_entity(self, raw_line: str) -> Student:
+        raw_line = raw_line.rstrip(self.new_line)
+
+        entity_as_dict = {}
+
+        for idx, col in enumerate(raw_line.split(self.delimiter)):
+            field_name = self._field_names[idx]
+            entity_as_dict[field_name] = col
+
+        return self.entity_type.from_dict(entity_as_dict)
+
+
+def generate_file(path: str, size: int):
+    with open(path, "w") as file:
+        file.write("record_id,first_name,last_name,birthday_date\n")
+        for record_id in range(size):
+            file.write(f"{record_id},first{random.randint(0, 999)},last{random.randint(0, 999)},2000-01-01\n")
+
+
+def benchmark(client: FileDataClient) -> float:
+    start_time = perf_counter()
+
+    for _ in client.iter_read():
+        pass
+
+    return perf_counter() - start_time
+
+
+def run_benchmark():
+    path = os.path.join(tempfile.mkdtemp(), "benchmark_decode.txt")
+    generate_file(path, ROWS_COUNT)
+
+    try:
+        with open(BENCHMARK_RESULTS_FILE_PATH, "w") as file:
+            print("Decode benchmark", file=file)
+            print("\n", file=file)
+            print(f"Full scan of {ROWS_COUNT} rows", file=file)
+            print(f"Dict decoding: {benchmark(DictFileDataClient(path, Student)):.3f} seconds", file=file)
+            print(f"Compiled decoding: {benchmark(FileDataClient(path, Student)):.3f} seconds", file=file)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,85 @@
+import tracemalloc
+from dataclasses import dataclass, asdict
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+from lib.entities import Student, PrimaryKey
+
+
+ENTITIES_COUNT = 100_000
+BENCHMARK_RESULTS_FILE_PATH = "benchmark_results_entity.txt"
+FIELD_NAMES = ["record_id", "first_name", "last_name", "birthday_date"]
+
+
+class DictPrimaryKey(int):
+    """ Прежний PrimaryKey без __slots__ """
+
+
+@dataclass
+class DictStudent:
+    """ Прежний Student: обычный dataclass с __dict__ и сериализацией через asdict """
+    record_id: DictPrimaryKey
+    first_name: str
+    last_name: str
+    birthday_date: str
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def measure_memory(create: Callable[[int], Any]) -> float:
+    """ Отдает кол-во байт памяти на одну сущность """
+    tracemalloc.start()
+    entities = [create(idx) for idx in range(ENTITIES_COUNT)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del entities
+
+    return current / ENTITIES_COUNT
+
+
+def measure_dump(entities: List[Any], dump: Callable[[Any], str]) -> float:
+    """ Отдает кол-во сериализованных сущностей в секунду """
+    start_time = perf_counter()
+
+    for entity in entities:
+        dump(entity)
+
+    return len(entities) / (perf_counter() - start_time)
+
+
+def dump_dict_student(entity: DictStudent) -> str:
+    entity_as_dict = entity.as_dict()
+    return ",".join(str(entity_as_dict[field_name]) for field_name in FIELD_NAMES)
+
+
+def run_benchmark():
+    # строки создаем заранее, чтобы в замер попали только сами сущности
+    names = [f"name{idx}" for idx in range(ENTITIES_COUNT)]
+
+    def create_dict_student(idx: int) -> DictStudent:
+        return DictStudent(DictPrimaryKey(idx + 1000), names[idx], names[idx], "2000-01-01")
+
+    def create_student(idx: int) -> Student:
+        return Student(PrimaryKey(idx + 1000), names[idx], names[idx], "2000-01-01")
+
+    dumper = Student.compile_dumper(FIELD_NAMES)
+
+    def dump_student(entity: Student) -> str:
+        return ",".join(map(str, dumper(entity)))
+
+    dict_students = [create_dict_student(idx) for idx in range(ENTITIES_COUNT)]
+    students = [create_student(idx) for idx in range(ENTITIES_COUNT)]
+
+    with open(BENCHMARK_RESULTS_FILE_PATH, "w") as file:
+        print("Entity benchmark", file=file)
+        print("\n", file=file)
+        print(f"Entities count: {ENTITIES_COUNT}", file=file)
+        print(f"Dataclass with __dict__: {measure_memory(create_dict_student):.1f} bytes per instance", file=file)
+        print(f"Slotted Student: {measure_memory(create_student):.1f} bytes per instance", file=file)
+        print(f"asdict serialization: {measure_dump(dict_students, dump_dict_student):.0f} entities/sec", file=file)
+        print(f"Compiled serialization: {measure_dump(students, dump_student):.0f} entities/sec", file=file)
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+from time import perf_counter
+
+from lib.data_access import IndexFileStudentDataAccess
+from lib.entities import Student, PrimaryKey
+from lib.file_data_client import FileDataClient
+
+
+APPENDS_COUNT = 20_000
+BUFFER_SIZE = 64 * 1024
+BENCHMARK_RESULTS_FILE_PATH = "benchmark_results_group_commit.txt"
+
+
+def benchmark(path: str, keep_open: bool, buffer_size: int, fsync: bool) -> float:
+    """ Отдает кол-во добавлений в секунду через add_student. Файл данных каждый раз новый """
+    with open(path, "w") as file:
+        file.write("record_id,first_name,last_name,birthday_date\n")
+
+    with FileDataClient(path, Student, keep_open=keep_open, buffer_size=buffer_size, fsync=fsync) as client:
+        dao = IndexFileStudentDataAccess(client)
+        start_time = perf_counter()
+
+        for record_id in range(APPENDS_COUNT):
+            dao.add_student(Student(PrimaryKey(record_id), "Иван", "Иванов", "2000-01-01"))
+
+        client.flush()  # запись в буфере еще не в файле, сброс входит в замер
+        return APPENDS_COUNT / (perf_counter() - start_time)
+
+
+def run_benchmark():
+    path = os.path.join(tempfile.mkdtemp(), "benchmark_group_commit.txt")
+
+    try:
+        with open(BENCHMARK_RESULTS_FILE_PATH, "w") as file:
+            print("Group commit benchmark", file=file)
+            print("\n", file=file)
+            print(f"{APPENDS_COUNT} add_student calls, buffer {BUFFER_SIZE} bytes", file=file)
+
+            for fsync in (False, True):
+                for keep_open in (False, True):
+                    for buffer_size in (0, BUFFER_SIZE):
+                        rate = benchmark(path, keep_open, buffer_size, fsync)
+                        print(
+                            f"keep_open={keep_open}, buffered={buffer_size > 0}, fsync={fsync}: "
+                            f"{rate:,.0f} appends/second",
+                            file=file,
+                        )
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    run_benchmark()
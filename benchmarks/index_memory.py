@@ -0,0 +1,59 @@
+import tracemalloc
+from typing import Callable, List, Optional
+
+from lib.entities import PrimaryKey
+from lib.index import ArrayIndex
+
+
+INDEX_SIZES = [100_000, 1_000_000, 3_000_000]
+BENCHMARK_RESULTS_FILE_PATH = "benchmark_results_index_memory.txt"
+
+
+def build_list_index(size: int) -> List[Optional[int]]:
+    """ Прежняя реализация индекса: список из int и None, расширяемый по одному элементу """
+    index_array: List[Optional[int]] = []
+
+    for record_id in range(size):
+        if record_id >= len(index_array):
+            for _ in range((record_id - (len(index_array) - 1)) * 2):
+                index_array.append(None)
+        # позиции в реальном файле больше 256, поэтому каждая из них - отдельный объект int
+        index_array[record_id] = record_id * 40 + 1000
+
+    return index_array
+
+
+def build_array_index(size: int) -> ArrayIndex:
+    index = ArrayIndex()
+
+    for record_id in range(size):
+        index.add(PrimaryKey(record_id), record_id * 40 + 1000)
+
+    return index
+
+
+def measure(build: Callable[[int], object], size: int) -> float:
+    """ Отдает кол-во байт памяти на одну запись индекса """
+    tracemalloc.start()
+    index = build(size)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del index
+
+    return current / size
+
+
+def run_benchmark():
+    with open(BENCHMARK_RESULTS_FILE_PATH, "w") as file:
+        print("Index memory benchmark", file=file)
+        print("\n", file=file)
+
+        for size in INDEX_SIZES:
+            print(f"Index size: {size}", file=file)
+            print(f"List index: {measure(build_list_index, size):.1f} bytes per record", file=file)
+            print(f"Array index: {measure(build_array_index, size):.1f} bytes per record", file=file)
+            print("\n", file=file)
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+from time import perf_counter
+from typing import Optional
+
+from benchmarks.suite import generate_data_file
+from lib.data_access import IndexFileStudentDataAccess, LAZY_INDEX_SCAN, LAZY_INDEX_WAIT
+from lib.entities import Student, PrimaryKey
+from lib.exceptions import RecordNotFound
+from lib.file_data_client import FileDataClient
+
+
+ROWS_COUNT = 200_000
+REPEATS = 1
+BENCHMARK_RESULTS_FILE_PATH = "benchmark_results_lazy_startup.txt"
+
+
+def time_to_first_answer(data_path: str, lazy_index: Optional[str], record_id: int) -> float:
+    """ Секунды от создания объекта до ответа на первый get_student (лучшее из REPEATS запусков) """
+    best = float("inf")
+
+    for _ in range(REPEATS):
+        with FileDataClient(data_path, Student, encoding="utf-8", keep_open=True) as client:
+            start_time = perf_counter()
+            dao = IndexFileStudentDataAccess(client, lazy_index=lazy_index)
+
+            try:
+                dao.get_student(PrimaryKey(record_id))
+            except RecordNotFound:
+                pass
+
+            best = min(best, perf_counter() - start_time)
+            dao.wait_for_index()  # следующий запуск не должен делить диск и GIL с этим построением
+
+    return best
+
+
+def run_benchmark():
+    data_path = os.path.join(tempfile.mkdtemp(), "students.txt")
+    generate_data_file(data_path, ROWS_COUNT)
+    record_ids = [student.record_id for student, _ in FileDataClient(data_path, Student, encoding="utf-8").iter_read()]
+    # id перемешаны, поэтому берем записи по месту в файле
+    targets = {
+        "start of file": record_ids[0],
+        "middle of file": record_ids[len(record_ids) // 2],
+        "end of file": record_ids[-1],
+        "missing id": ROWS_COUNT + 1,
+    }
+
+    try:
+        with open(BENCHMARK_RESULTS_FILE_PATH, "w") as file:
+            print("Lazy index startup benchmark", file=file)
+            print("\n", file=file)
+            print(f"{ROWS_COUNT} rows, time from start to the first get_student, best of {REPEATS}", file=file)
+
+            for name, record_id in targets.items():
+                for lazy_index in (None, LAZY_INDEX_WAIT, LAZY_INDEX_SCAN):
+                    seconds = time_to_first_answer(data_path, lazy_index, record_id)
+                    print(f"{name}, lazy_index={lazy_index}: {seconds * 1000:.1f} ms", file=file)
+    finally:
+        os.remove(data_path)
+
+
+if __name__ == "__main__":
+    run_benchmark()
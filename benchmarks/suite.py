@@ -0,0 +1,301 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+from lib import binary_data_client, compressed_data_client
+from lib.binary_data_client import BinaryFileDataClient
+from lib.compressed_data_client import CompressedFileDataClient
+from lib.data_access import FileStudentDataAccess, IndexFileStudentDataAccess, StudentDataAccessProtocol, KEY_FIELD
+from lib.entities import Student, PrimaryKey
+from lib.file_data_client import FileDataClient
+from lib.sharded_data_access import ROUTING_HASH, ShardedStudentDataAccess, create_router, split_into_shards
+from tools.convert_to_binary import STUDENT_FIELD_FORMATS
+
+
+# 10_000_000 тоже допустимо (см. --sizes), но прогон занимает больше часа и ~1 ГБ на диске на каждую копию файла
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+LOOKUPS_COUNT = 1000  # кол-во поисков для замера задержек
+LINEAR_LOOKUPS_COUNT = 20  # линейный поиск медленный, для него поисков меньше
+LINEAR_MAX_ROWS = 100_000  # линейный поиск на файлах больше этого размера не запускаем
+APPENDS_COUNT = 1000
+SHARDS_COUNT = 4
+REGRESSION_THRESHOLD = 0.1  # на сколько (в долях) метрика может ухудшиться без предупреждения
+BENCHMARK_RESULTS_FILE_PATH = "benchmark_results.json"
+BASELINE_FILE_PATH = "benchmark_baseline.json"  # прогон, с которым сравнивается --compare без аргумента
+
+FIRST_NAMES = ["Иван", "Петр", "Анна", "Мария", "Олег", "Нина", "Егор", "Софья"]
+LAST_NAMES = ["Иванов", "Петров", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Новиков"]
+
+# Для каких метрик рост - это ухудшение. Для остальных ухудшение - это падение
+HIGHER_IS_WORSE = ("build_seconds", "peak_memory_bytes", "latency")
+
+
+
+@dataclass
+class Implementation:
+    """ Реализация доступа к данным: как переложить синтетический текстовый файл в ее файлы и как их открыть """
+    prepare: Callable[[str], List[str]]  # текстовый файл -> файлы реализации
+    open: Callable[[List[str]], StudentDataAccessProtocol]
+
+
+def text_client(path: str) -> FileDataClient:
+    return FileDataClient(path, Student, encoding="utf-8")
+
+
+def text_files(data_path: str) -> List[str]:
+    return [data_path]
+
+
+def binary_files(data_path: str) -> List[str]:
+    target_path = data_path + ".bin"
+    binary_data_client.convert_text_file(text_client(data_path), target_path, KEY_FIELD, STUDENT_FIELD_FORMATS)
+    return [target_path]
+
+
+def compressed_files(data_path: str) -> List[str]:
+    target_path = data_path + ".blocks"
+    compressed_data_client.convert_text_file(text_client(data_path), target_path, KEY_FIELD)
+    return [target_path]
+
+
+def shard_files(data_path: str) -> List[str]:
+    shard_paths = [f"{data_path}.{shard_index}" for shard_index in range(SHARDS_COUNT)]
+    split_into_shards(text_client(data_path), shard_paths, create_router(ROUTING_HASH, SHARDS_COUNT))
+    return shard_paths
+
+
+IMPLEMENTATIONS: Dict[str, Implementation] = {
+    "linear": Implementation(text_files, lambda paths: FileStudentDataAccess(text_client(paths[0]))),
+    "index": Implementation(text_files, lambda paths: IndexFileStudentDataAccess(text_client(paths[0]))),
+    "index_binary": Implementation(
+        binary_files, lambda paths: IndexFileStudentDataAccess(BinaryFileDataClient(paths[0], Student))
+    ),
+    "index_compressed": Implementation(
+        compressed_files, lambda paths: IndexFileStudentDataAccess(CompressedFileDataClient(paths[0], Student))
+    ),
+    "sharded": Implementation(
+        shard_files,
+        lambda paths: ShardedStudentDataAccess(paths, index_suffix=None, file_client_options={"encoding": "utf-8"}),
+    ),
+}
+
+
+def generate_data_file(path: str, rows: int, seed: int = 0):
+    """ Синтетический файл со студентами; id перемешаны, чтобы позиции не совпадали с порядком id """
+    generator = random.Random(seed)
+    record_ids = list(range(rows))
+    generator.shuffle(record_ids)
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("record_id,first_name,last_name,birthday_date\n")
+        for record_id in record_ids:
+            birthday = f"{generator.randint(1995, 2005)}-{generator.randint(1, 12):02}-{generator.randint(1, 28):02}"
+            file.write(f"{record_id},{generator.choice(FIRST_NAMES)},{generator.choice(LAST_NAMES)},{birthday}\n")
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50": statistics.median(latencies),
+        "p95": quantiles[94],
+        "p99": quantiles[98],
+        "max": max(latencies),
+    }
+
+
+def measure_lookups(data_access: StudentDataAccessProtocol, record_ids: List[int]) -> Dict[str, float]:
+    latencies = []
+
+    for record_id in record_ids:
+        start_time = perf_counter()
+        data_access.get_student(PrimaryKey(record_id))
+        latencies.append(perf_counter() - start_time)
+
+    return percentiles(latencies)
+
+
+def random_ids(rows: int, count: int, generator: random.Random) -> List[int]:
+    return [generator.randrange(rows) for _ in range(count)]
+
+
+def skewed_ids(rows: int, count: int, generator: random.Random) -> List[int]:
+    """ Перекошенная нагрузка: небольшая часть студентов запрашивается большую часть времени """
+    return [min(int(generator.paretovariate(1.16)) - 1, rows - 1) for _ in range(count)]
+
+
+def close(data_access: StudentDataAccessProtocol):
+    """ Закрывает файлы реализации """
+    if isinstance(data_access, ShardedStudentDataAccess):
+        data_access.close()
+    else:
+        data_access.file_client.close()
+
+
+def measure_build(implementation: Implementation, paths: List[str]) -> Dict[str, float]:
+    start_time = perf_counter()
+    close(implementation.open(paths))
+    build_seconds = perf_counter() - start_time
+
+    # пиковую память меряем отдельным построением: tracemalloc сильно замедляет выполнение
+    tracemalloc.start()
+    data_access = implementation.open(paths)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    close(data_access)
+
+    return {"build_seconds": build_seconds, "peak_memory_bytes": peak}
+
+
+def measure_scan(data_access: StudentDataAccessProtocol, rows: int) -> float:
+    """ Скорость полного прохода по всем студентам, строк в секунду """
+    start_time = perf_counter()
+    for _ in data_access.query():
+        pass
+    return rows / (perf_counter() - start_time)
+
+
+def measure_appends(implementation: Implementation, paths: List[str], rows: int) -> float:
+    """ Скорость добавления студентов по одному, записей в секунду. Пишем в копии файлов """
+    copy_paths = [path + ".append" for path in paths]
+    for path, copy_path in zip(paths, copy_paths):
+        shutil.copyfile(path, copy_path)
+
+    try:
+        data_access = implementation.open(copy_paths)
+        students = [
+            Student(PrimaryKey(rows + idx), "Иван", "Иванов", "2000-01-01") for idx in range(APPENDS_COUNT)
+        ]
+
+        start_time = perf_counter()
+        for student in students:
+            data_access.add_student(student)
+        appends_per_second = APPENDS_COUNT / (perf_counter() - start_time)
+
+        close(data_access)
+        return appends_per_second
+    finally:
+        for copy_path in copy_paths:
+            os.remove(copy_path)
+
+
+def run_size(rows: int, work_dir: str, seed: int) -> List[Dict[str, Any]]:
+    data_path = os.path.join(work_dir, f"benchmark_{rows}.txt")
+    generate_data_file(data_path, rows, seed)
+    results = []
+
+    for name, implementation in IMPLEMENTATIONS.items():
+        if name == "linear" and rows > LINEAR_MAX_ROWS:
+            continue
+
+        generator = random.Random(seed)
+        lookups_count = LINEAR_LOOKUPS_COUNT if name == "linear" else LOOKUPS_COUNT
+        paths = implementation.prepare(data_path)
+
+        metrics = measure_build(implementation, paths)
+        data_access = implementation.open(paths)
+        metrics["random_latency"] = measure_lookups(data_access, random_ids(rows, lookups_count, generator))
+        metrics["skewed_latency"] = measure_lookups(data_access, skewed_ids(rows, lookups_count, generator))
+        metrics["scan_rows_per_second"] = measure_scan(data_access, rows)
+        close(data_access)
+        metrics["append_rows_per_second"] = measure_appends(implementation, paths, rows)
+
+        results.append({"implementation": name, "rows": rows, "metrics": metrics})
+
+        for path in paths:
+            if path != data_path:
+                os.remove(path)
+
+    os.remove(data_path)
+    return results
+
+
+def flatten(metrics: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{name}."))
+        else:
+            flat[f"{prefix}{name}"] = value
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """ Сравнивает два прогона. Отдает описания метрик, ухудшившихся больше чем на threshold """
+    baseline_results = {
+        (result["implementation"], result["rows"]): flatten(result["metrics"]) for result in baseline["results"]
+    }
+    regressions = []
+
+    for result in current["results"]:
+        key = (result["implementation"], result["rows"])
+        if key not in baseline_results:
+            continue
+
+        for name, value in flatten(result["metrics"]).items():
+            old_value = baseline_results[key].get(name)
+            if not old_value:
+                continue
+
+            change = (value - old_value) / old_value
+            if not any(marker in name for marker in HIGHER_IS_WORSE):
+                change = -change
+
+            if change > threshold:
+                regressions.append(f"{key[0]} rows={key[1]} {name}: {old_value:.6g} -> {value:.6g} ({change:+.0%})")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки реализаций доступа к данным о студентах")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="размеры файлов в строках")
+    parser.add_argument("--output", default=BENCHMARK_RESULTS_FILE_PATH, help="куда сохранить результаты в JSON")
+    parser.add_argument(
+        "--compare", nargs="?", const=BASELINE_FILE_PATH,
+        help=f"JSON с результатами предыдущего прогона для поиска регрессий. Без значения - {BASELINE_FILE_PATH}",
+    )
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        results = [result for rows in args.sizes for result in run_size(rows, work_dir, args.seed)]
+    finally:
+        shutil.rmtree(work_dir)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(json.load(file), report, args.threshold)
+
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
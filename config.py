@@ -2,20 +2,71 @@ import os
 import sys
 
 
-from lib.data_access import StudentDataAccessProtocol, IndexFileStudentDataAccess
-from lib.entities import Student
-from lib.file_data_client import FileDataClient
+def get_data_path() -> str:
+    """ Путь к файлу со студентами """
+    return os.path.join(getattr(sys, '_MEIPASS', os.getcwd()), "students.txt")
+
+
+def get_index_path() -> str:
+    """ Путь к сохраненному индексу файла со студентами """
+    return get_data_path() + ".idx"
 
 
 def get_config():
-    """ Конфиг зависимостей """
+    """
+        Конфиг зависимостей
+        Реализации импортируются здесь, а не при импорте модуля: run.py --find берет из конфига только пути
+    """
+    from lib.async_data_access import AsyncStudentDataAccessProtocol, AsyncIndexFileStudentDataAccess
+    from lib.data_access import StudentDataAccessProtocol, FileStudentDataAccess, IndexFileStudentDataAccess
+    from lib.entities import Student
+    from lib.file_data_client import FileDataClient
+    from lib.sharded_data_access import ShardedStudentDataAccess
+
     path = getattr(sys, '_MEIPASS', os.getcwd())
+    metrics = None  # lib.metrics.Metrics() - собирать метрики чтения, поиска и записи (см. lib/metrics.py)
     return {
         # Конфиг зависимости
         FileDataClient: {
-            "file_path": os.path.join(path, "students.txt"),
+            "file_path": get_data_path(),
             "entity_type": Student,
+            "keep_open": True,  # файл открыт и отображен в память все время жизни контейнера
+            "metrics": metrics,
+            "buffer_size": 0,  # групповая запись: сколько байт копить перед записью в файл. 0 - писать сразу
+            "flush_interval": None,  # через сколько секунд записывать неполный буфер (например, 0.05)
+            "fsync": False,  # fsync после каждой записи в файл: дольше, но запись переживет сбой питания
+        },
+        FileStudentDataAccess: {
+            # линейный поиск: фильтр Блума по id отвечает на поиск несуществующих id без прохода по файлу
+            "bloom_filter": False,
+            "bloom_false_positive_rate": 0.01,  # доля несуществующих id, для которых файл все равно проходится
+            "bloom_path": get_data_path() + ".bloom",
+            "metrics": metrics,
+        },
+        IndexFileStudentDataAccess: {
+            "index_path": get_index_path(),
+            "index_mode": "auto",  # dense, sparse или auto (по плотности номеров зачетных книжек)
+            "cache_size": 4096,  # сколько последних найденных студентов держать в памяти
+            "index_workers": 1,  # кол-во процессов для построения индекса. Больше 1 - параллельное построение
+            "secondary_indexes": False,  # индексы по имени, фамилии и дате рождения (полный проход при запуске)
+            "multiprocess": False,  # True, если students.txt дописывают несколько процессов
+            "lazy_index": None,  # "wait" или "scan" - строить индексы в фоне, отвечая на запросы сразу
+            "metrics": metrics,  # тот же объект, что и у FileDataClient: все метрики в одном snapshot()
+        },
+        ShardedStudentDataAccess: {
+            # файлы шардов создает tools/split_into_shards.py, он же печатает routing и range_bounds
+            "shard_paths": [os.path.join(path, f"students.{shard}.txt") for shard in range(4)],
+            "routing": "hash",  # hash - остаток от деления id, range - диапазоны id по границам range_bounds
+            "range_bounds": None,  # для range: например [10000, 20000, 30000] для 4 шардов
+            "file_client_options": {"keep_open": True, "metrics": metrics},
+            # без index_workers файл каждого шарда при построении индекса сканируется пулом процессов на все ядра
+            "shard_options": {"index_mode": "auto", "cache_size": 1024, "metrics": metrics},
+        },
+        AsyncIndexFileStudentDataAccess: {
+            "max_workers": 4,  # размер пула потоков для файловых операций
         },
         # Бинд провайдера
-        StudentDataAccessProtocol: IndexFileStudentDataAccess,
+        StudentDataAccessProtocol: IndexFileStudentDataAccess,  # ShardedStudentDataAccess - данные в шардах,
+        # FileStudentDataAccess - линейный поиск без индекса в памяти
+        AsyncStudentDataAccessProtocol: AsyncIndexFileStudentDataAccess,
     }
@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Protocol
+
+from simio_di import Depends
+
+from lib.data_access import IndexFileStudentDataAccess
+from lib.entities import PrimaryKey, Student
+
+
+class AsyncStudentDataAccessProtocol(Protocol):
+    """ Асинхронный интефейс для коммуникации с БД с данными о студентах """
+    async def add_student(self, student: Student):
+        ...
+
+    async def get_student(self, record_id: PrimaryKey) -> Student:
+        ...
+
+    async def get_students(self, record_ids: Iterable[PrimaryKey]) -> Dict[PrimaryKey, Optional[Student]]:
+        ...
+
+
+@dataclass
+class AsyncIndexFileStudentDataAccess(AsyncStudentDataAccessProtocol):
+    """
+        Реализация интерфейса AsyncStudentDataAccessProtocol поверх IndexFileStudentDataAccess
+        Поиск в индексе выполняется сразу, а чтение файла - в ограниченном пуле потоков, чтобы не блокировать event loop.
+        Пока индекс строится (lazy_index) или при multiprocess=True поиск позиции может ждать или читать файл,
+        тогда он тоже выполняется в пуле
+        Одновременные запросы одной и той же записи объединяются в одно чтение
+    """
+    data_access: Depends[IndexFileStudentDataAccess]  # type: IndexFileStudentDataAccess
+    max_workers: int = 4  # размер пула потоков для чтения и записи файла
+
+    _executor: ThreadPoolExecutor = field(init=False)
+    _pending_reads: Dict[int, "asyncio.Future[Student]"] = field(default_factory=dict, init=False)
+    _write_lock: Optional[asyncio.Lock] = field(default=None, init=False)
+
+    def __post_init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="student-io")
+
+    async def add_student(self, student: Student):
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()  # создаем внутри работающего event loop
+
+        async with self._write_lock:  # записи выполняются по одной
+            await self._run(self.data_access.add_student, student)
+
+    async def get_student(self, record_id: PrimaryKey) -> Student:
+        # позиция берется из индекса в памяти; если записи нет, RecordNotFound выбрасывается без обращения к файлу
+        if self.data_access.lookups_in_memory():
+            position = self.data_access.get_position(record_id)
+        else:
+            position = await self._run(self.data_access.get_position, record_id)
+
+        future = self._pending_reads.get(position)
+        if future is None:
+            future = asyncio.ensure_future(self._run(self.data_access.get_student, record_id))
+            self._pending_reads[position] = future
+            future.add_done_callback(lambda _: self._pending_reads.pop(position, None))
+
+        # shield - отмена одного ожидающего не отменяет чтение для остальных
+        return await asyncio.shield(future)
+
+    async def get_students(self, record_ids: Iterable[PrimaryKey]) -> Dict[PrimaryKey, Optional[Student]]:
+        return await self._run(self.data_access.get_students, list(record_ids))
+
+    def close(self):
+        """ Останавливает пул потоков """
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
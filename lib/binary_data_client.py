@@ -0,0 +1,270 @@
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Dict, Generic, Iterable, Iterator, List, Optional, Tuple, Type
+
+from lib.exceptions import InvalidFile, NotSupported
+from lib.file_data_client import EntityType, FileDataClient
+from lib.file_lock import FileLock, lock_path_for
+
+# Заголовок файла: сигнатура, версия, длина описания колонок
+HEADER = struct.Struct("<4sHI")
+MAGIC = b"SFBN"
+VERSION = 1
+STRING_ENCODING = "utf-8"
+
+
+@dataclass
+class BinaryFileDataClient(Generic[EntityType]):
+    """
+        Клиент для чтения сущностей из бинарного файла с записями фиксированной длины
+        Интерфейс совпадает с FileDataClient: iter_read, read_at_position, write
+
+        Формат файла: заголовок HEADER, описание колонок вида "имя:формат,имя:формат",
+        затем записи, упакованные struct по форматам колонок (q - целое, Ns - строка из N байт в utf-8)
+        Т.к. длина записи постоянна, запись с порядковым номером i находится арифметически (см. position_of)
+        Изменение и удаление записей не поддерживаются: в файле только добавленные записи,
+        write_update, write_tombstone и compact выбрасывают NotSupported
+    """
+    file_path: str
+    entity_type: Type[EntityType]
+    buffer_size: int = field(default=0, init=False)  # групповой записи нет, записи сразу пишутся в файл
+
+    _field_names: List[str] = field(default_factory=list, init=False)
+    _field_formats: List[str] = field(default_factory=list, init=False)
+    _record: struct.Struct = field(init=False)  # упаковщик одной записи
+    _data_start: int = field(default=0, init=False)  # позиция первой записи
+    _file: Optional[BinaryIO] = field(default=None, init=False)
+    _mapping: Optional[mmap.mmap] = field(default=None, init=False)
+    _loader: Callable[[List[Any]], EntityType] = field(init=False)
+    _dumper: Callable[[EntityType], tuple] = field(init=False)
+    _lock: FileLock = field(init=False)  # межпроцессная блокировка записи
+    _write_lock: threading.RLock = field(default_factory=threading.RLock, init=False)
+
+    def __post_init__(self):
+        try:
+            self._file = open(self.file_path, "r+b")  # файл создает только create
+        except FileNotFoundError:
+            raise InvalidFile(f"{self.file_path} does not exist")
+
+        self._lock = FileLock(lock_path_for(self.file_path))  # lock-файл создается при первом захвате
+        raw_header = self._file.read(HEADER.size)
+        if len(raw_header) != HEADER.size or HEADER.unpack(raw_header)[:2] != (MAGIC, VERSION):
+            self.close()
+            raise InvalidFile(f"{self.file_path} is not a binary data file")
+
+        _, _, layout_size = HEADER.unpack(raw_header)
+
+        for column in self._file.read(layout_size).decode(STRING_ENCODING).split(","):
+            field_name, field_format = column.split(":")
+            self._field_names.append(field_name)
+            self._field_formats.append(field_format)
+
+        self._record = struct.Struct("<" + "".join(self._field_formats))
+        self._data_start = HEADER.size + layout_size
+        self._loader = self.entity_type.compile_loader(self._field_names)
+        self._dumper = self.entity_type.compile_dumper(self._field_names)
+        self._remap()
+
+    @classmethod
+    def create(
+        cls, file_path: str, entity_type: Type[EntityType], field_formats: Dict[str, str]
+    ) -> "BinaryFileDataClient[EntityType]":
+        """ Создает пустой файл с описанием колонок и открывает его """
+        layout = ",".join(f"{name}:{field_format}" for name, field_format in field_formats.items())
+        layout = layout.encode(STRING_ENCODING)
+
+        with open(file_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(layout)))
+            file.write(layout)
+
+        return cls(file_path, entity_type)
+
+    def __enter__(self) -> "BinaryFileDataClient[EntityType]":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        """ Кол-во записей в файле """
+        self._remap()
+        return (len(self._mapping) - self._data_start) // self._record.size
+
+    @property
+    def field_names(self) -> List[str]:
+        return list(self._field_names)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """ Как FileDataClient.locked: межпроцессная блокировка записи, реентерабельна """
+        with self._write_lock, self._lock:
+            yield
+
+    def close(self):
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        self._lock.close()
+
+    def size(self) -> int:
+        """ Размер файла в байтах. Буфера нет, записи сразу в файле """
+        return os.fstat(self._file.fileno()).st_size
+
+    def position_for_size(self, size: int) -> int:
+        """ Как FileDataClient.position_for_size: позиции - это смещения в файле """
+        return size
+
+    def position_of(self, record_number: int) -> int:
+        """ Позиция записи по ее порядковому номеру в файле """
+        return self._data_start + record_number * self._record.size
+
+    def read_record(self, record_number: int) -> EntityType:
+        """ Чтение записи по порядковому номеру. При плотных id номер записи вычисляется из id """
+        return self.read_at_position(self.position_of(record_number))
+
+    def iter_read(self, start_position: Optional[int] = None) -> Iterable[Tuple[EntityType, int]]:
+        for values, position in self._iter_values(start_position):
+            yield self._decode_values(values), position
+
+    def iter_rows(self, start_position: Optional[int] = None) -> Iterable[Tuple[List[str], int]]:
+        """ Как FileDataClient.iter_rows: значения колонок строками, как они были бы в текстовом файле """
+        for values, position in self._iter_values(start_position):
+            yield [str(value) for value in self._decode_strings(values)], position
+
+    def iter_changes(
+        self, key_field: str, start_position: Optional[int] = None
+    ) -> Iterable[Tuple[str, int, Optional[EntityType], int]]:
+        """ Как FileDataClient.iter_changes. Все записи - добавления, маркер пустой """
+        key_column = self._field_names.index(key_field)
+        for values, position in self._iter_values(start_position):
+            yield "", values[key_column], self._decode_values(values), position
+
+    def iter_keys(
+        self, key_field: str, start_position: Optional[int] = None, workers: int = 1
+    ) -> Iterable[Tuple[str, int, int]]:
+        """
+            Отдает маркер (всегда пустой), значение колонки key_field и позицию записи, не десериализуя сущности
+            Запись фиксированной длины разбирается без разбиения строк, поэтому workers не используется
+        """
+        key_column = self._field_names.index(key_field)
+        for entity_values, position in self._iter_values(start_position):
+            yield "", entity_values[key_column], position
+
+    def read_at_position(self, position: int) -> EntityType:
+        mapping = self._mapping  # работаем со снимком: другой поток может подменить отображение
+        if position + self._record.size > len(mapping):
+            mapping = self._remap()  # файл дописан после последнего отображения
+
+        try:
+            # разбор прямо из отображения, без копирования записи
+            values = self._record.unpack_from(mapping, position)
+        except struct.error as error:
+            # как и у текстового клиента: позиция за пределами файла - ValueError
+            raise ValueError(f"No record at position {position}") from error
+
+        return self._decode_values(values)
+
+    def read_at_positions(self, positions: Iterable[int]) -> Iterable[Tuple[EntityType, int]]:
+        for position in sorted(positions):
+            yield self.read_at_position(position), position
+
+    def write(self, entity: EntityType) -> int:
+        return self.write_many([entity])[0]
+
+    def write_many(self, entities: Iterable[EntityType]) -> List[int]:
+        records = [self._dump_entity(entity) for entity in entities]
+
+        with self.locked():
+            self._file.seek(0, os.SEEK_END)
+            start = self._file.tell()
+            self._file.write(b"".join(records))
+            self._file.flush()
+
+        return [start + idx * self._record.size for idx in range(len(records))]
+
+    def write_update(self, entity: EntityType) -> int:
+        raise NotSupported(f"{self.file_path}: binary data files do not support updates")
+
+    def write_tombstone(self, key_field: str, key: int) -> int:
+        raise NotSupported(f"{self.file_path}: binary data files do not support deletes")
+
+    def compact(self, positions: Iterable[int]) -> Dict[int, int]:
+        raise NotSupported(f"{self.file_path}: binary data files have no stale records to compact")
+
+    def _iter_values(self, start_position: Optional[int]) -> Iterable[Tuple[tuple, int]]:
+        mapping = self._remap()
+
+        position = self._data_start if start_position is None else start_position
+        end = len(mapping) - self._record.size
+
+        while position <= end:
+            yield self._record.unpack_from(mapping, position), position
+            position += self._record.size
+
+    def _decode_values(self, values: tuple) -> EntityType:
+        return self._loader(self._decode_strings(values))
+
+    @staticmethod
+    def _decode_strings(values: tuple) -> List[Any]:
+        return [value.rstrip(b"\0").decode(STRING_ENCODING) if isinstance(value, bytes) else value for value in values]
+
+    def _dump_entity(self, entity: EntityType) -> bytes:
+        values = []
+
+        for value, field_format in zip(self._dumper(entity), self._field_formats):
+            if field_format.endswith("s"):
+                value = str(value).encode(STRING_ENCODING)
+                if len(value) > struct.calcsize(field_format):
+                    # struct молча обрезал бы строку
+                    raise ValueError(f"Value {value!r} does not fit into column of format {field_format}")
+            values.append(value)
+
+        return self._record.pack(*values)
+
+    def _remap(self) -> mmap.mmap:
+        """ Отображает файл в память заново, если он вырос. Отдает актуальное отображение """
+        mapping = self._mapping
+        size = os.fstat(self._file.fileno()).st_size
+        if mapping is not None and len(mapping) == size:
+            return mapping
+
+        # старое отображение не закрываем, как и FileDataClient: его может читать другой поток
+        self._mapping = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        return self._mapping
+
+
+def convert_text_file(
+    source: FileDataClient,
+    target_path: str,
+    key_field: str,
+    field_formats: Dict[str, str],
+    batch_size: int = 10000,
+) -> int:
+    """
+        Переносит актуальные версии записей из текстового файла в новый бинарный файл
+        В бинарном формате нет маркеров изменений, поэтому устаревшие версии и удаленные записи не переносятся
+        Отдает кол-во перенесенных записей
+    """
+    count = 0
+
+    with BinaryFileDataClient.create(target_path, source.entity_type, field_formats) as target:
+        batch = []
+        for entity, _ in source.iter_latest(key_field):
+            batch.append(entity)
+
+            if len(batch) >= batch_size:
+                count += len(target.write_many(batch))
+                batch = []
+
+        count += len(target.write_many(batch))
+
+    return count
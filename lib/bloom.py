@@ -0,0 +1,155 @@
+import math
+import os
+import struct
+from dataclasses import dataclass, field
+from hashlib import blake2b
+from typing import Iterable, Optional, Tuple
+
+from lib.index_sidecar import data_checksum
+
+# Заголовок сохраненного фильтра: сигнатура, версия, доля ложных срабатываний, кол-во хэшей, размер в битах,
+# емкость, кол-во ключей, размер и mtime файла с данными, контрольная сумма данных
+HEADER = struct.Struct("<4sHdIqqqqqI")
+MAGIC = b"SFBF"
+VERSION = 2  # контрольная сумма данных - как в index_sidecar.data_checksum версии 2
+MIN_CAPACITY = 1024  # меньше смысла нет: фильтр на 1024 ключа при 1% занимает 1.2 КБ
+
+
+@dataclass
+class BloomFilter:
+    """
+        Фильтр Блума по целочисленным ключам: отвечает "ключа точно нет" или "ключ, возможно, есть"
+        Размер и кол-во хэшей подбираются под capacity ключей и долю ложных срабатываний false_positive_rate.
+        Если добавить больше capacity ключей, ложных срабатываний становится больше заданного.
+        Хэши не зависят от процесса (blake2b), поэтому фильтр можно сохранить и загрузить (см. BloomSidecar)
+    """
+    capacity: int
+    false_positive_rate: float
+    size_bits: int = field(init=False)
+    hashes_count: int = field(init=False)
+    count: int = field(default=0, init=False)  # сколько разных ключей добавлено (с точностью до ложных срабатываний)
+    _bits: bytearray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        if not 0 < self.false_positive_rate < 1:
+            raise ValueError(f"False positive rate must be between 0 and 1: {self.false_positive_rate}")
+
+        self.capacity = max(self.capacity, MIN_CAPACITY)
+        # оптимальные размер и кол-во хэшей: m = -n ln p / ln^2 2, k = m / n ln 2
+        self.size_bits = math.ceil(-self.capacity * math.log(self.false_positive_rate) / math.log(2) ** 2)
+        self.hashes_count = max(1, round(self.size_bits / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size_bits + 7) // 8)
+
+    def __contains__(self, key: int) -> bool:
+        bits = self._bits
+        return all(bits[bit >> 3] & (1 << (bit & 7)) for bit in self._bit_positions(key))
+
+    def add(self, key: int):
+        bits = self._bits
+        added = False
+
+        for bit in self._bit_positions(key):
+            mask = 1 << (bit & 7)
+            if not bits[bit >> 3] & mask:
+                bits[bit >> 3] |= mask
+                added = True
+
+        if added:  # все биты уже стояли - ключ был добавлен раньше (или ложное срабатывание)
+            self.count += 1
+
+    def update(self, keys: Iterable[int]):
+        for key in keys:
+            self.add(key)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+    def load_bits(self, bits: bytes, count: int):
+        """ Подменяет биты фильтра сохраненными (см. to_bytes). Размер должен совпадать """
+        if len(bits) != len(self._bits):
+            raise ValueError(f"Expected {len(self._bits)} bytes of bloom filter bits, got {len(bits)}")
+
+        self._bits = bytearray(bits)
+        self.count = count
+
+    def is_full(self) -> bool:
+        """ Ключей больше, чем рассчитан фильтр: доля ложных срабатываний выше заданной """
+        return self.count > self.capacity
+
+    def _bit_positions(self, key: int) -> Iterable[int]:
+        # двойное хэширование: k позиций из двух 64-битных хэшей одного дайджеста
+        digest = blake2b(key.to_bytes(8, "little", signed=True), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        size_bits = self.size_bits
+
+        return ((first + idx * second) % size_bits for idx in range(self.hashes_count))
+
+
+@dataclass
+class BloomSidecar:
+    """
+        Файл-спутник с сохраненным фильтром Блума по ключам файла с данными
+        Как и IndexSidecar, хранит размер файла с данными на момент сохранения и контрольную сумму:
+        если файл только дописан, фильтр актуален для прежнего размера, а хвост нужно досканировать
+    """
+    path: str
+
+    def load(self, data_path: str, false_positive_rate: float) -> Optional[Tuple[BloomFilter, int]]:
+        """
+            Загружает фильтр и размер файла с данными, до которого он актуален.
+            Если фильтра нет, он не соответствует данным или рассчитан на другую долю ложных срабатываний - None
+        """
+        try:
+            with open(self.path, "rb") as file:
+                raw_header = file.read(HEADER.size)
+                if len(raw_header) != HEADER.size:
+                    return None
+
+                (
+                    magic, version, saved_rate, hashes_count, size_bits, capacity, count,
+                    data_size, data_mtime, checksum,
+                ) = HEADER.unpack(raw_header)
+                if magic != MAGIC or version != VERSION or saved_rate != false_positive_rate:
+                    return None
+
+                bloom = BloomFilter(capacity, false_positive_rate)
+                if (bloom.size_bits, bloom.hashes_count) != (size_bits, hashes_count):
+                    return None  # фильтр посчитан по другим формулам
+
+                bloom.load_bits(file.read(), count)
+        except (OSError, ValueError):
+            return None  # в том числе файл фильтра обрезан
+
+        stat = os.stat(data_path)
+        if stat.st_size < data_size:
+            return None  # файл с данными уменьшился (compact), размер в заголовке ему не соответствует
+
+        if stat.st_size != data_size or stat.st_mtime_ns != data_mtime:
+            # файл изменился или дописан, проверяем, что учтенная в фильтре часть осталась прежней
+            if data_checksum(data_path, data_size) != checksum:
+                return None
+
+        return bloom, data_size
+
+    def save(self, data_path: str, bloom: BloomFilter, data_size: int):
+        """ Сохраняет фильтр, актуальный для первых data_size байт файла. Пишем во временный файл и подменяем """
+        header = HEADER.pack(
+            MAGIC,
+            VERSION,
+            bloom.false_positive_rate,
+            bloom.hashes_count,
+            bloom.size_bits,
+            bloom.capacity,
+            bloom.count,
+            data_size,
+            os.stat(data_path).st_mtime_ns,
+            data_checksum(data_path, data_size),
+        )
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(header)
+            file.write(bloom.to_bytes())
+
+        os.replace(tmp_path, self.path)
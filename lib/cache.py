@@ -0,0 +1,53 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Generic, Hashable, Optional, TypeVar
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ValueType = TypeVar("ValueType")
+
+
+@dataclass
+class LRUCache(Generic[KeyType, ValueType]):
+    """
+        Ограниченный кэш, при переполнении вытесняется давно не использованное значение
+        Операции защищены блокировкой, кэш можно использовать из нескольких потоков
+    """
+    max_size: int
+
+    hits: int = field(default=0, init=False)  # кол-во попаданий в кэш
+    misses: int = field(default=0, init=False)  # кол-во промахов
+    _data: "OrderedDict[KeyType, ValueType]" = field(default_factory=OrderedDict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: KeyType) -> Optional[ValueType]:
+        """ Отдает значение из кэша или None, если его нет """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)  # значение использовано - переносим в конец очереди на вытеснение
+            self.hits += 1
+            return value
+
+    def put(self, key: KeyType, value: ValueType):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)  # вытесняем самое давнее значение
+
+    def invalidate(self, key: KeyType):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,448 @@
+import atexit
+import lzma
+import mmap
+import os
+import struct
+import threading
+import weakref
+import zlib
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Callable, Dict, Generic, Iterable, Iterator, List, Optional, Tuple, Type, BinaryIO
+
+from lib.cache import LRUCache
+from lib.exceptions import InvalidFile
+from lib.file_data_client import EntityType, DELETE_MARKER, MARKERS, UPDATE_MARKER, FileDataClient, _flush_at_exit
+from lib.metrics import Metrics, BYTES_READ, DECODE_SECONDS, READ_SECONDS
+
+# Заголовок файла: сигнатура, версия, кодек, длина строки с названиями колонок
+HEADER = struct.Struct("<4sHBI")
+MAGIC = b"SFCZ"
+VERSION = 1
+# Заголовок блока: размер сжатых данных и размер строк до сжатия
+BLOCK_HEADER = struct.Struct("<II")
+# size() добавляет к размеру файла, пока в открытом блоке есть строки. Сжатый блок с заголовком длиннее,
+# поэтому размер не уменьшается, когда блок записывается в файл
+PENDING_BLOCK_MARKER = 1
+
+CODEC_ZLIB = "zlib"
+CODEC_LZMA = "lzma"
+# кодек: (номер в заголовке файла, сжатие, распаковка)
+CODECS: Dict[str, Tuple[int, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    CODEC_ZLIB: (1, zlib.compress, zlib.decompress),
+    CODEC_LZMA: (2, lzma.compress, lzma.decompress),
+}
+
+OFFSET_BITS = 32  # позиция записи: номер блока << OFFSET_BITS | смещение строки внутри распакованного блока
+OFFSET_MASK = (1 << OFFSET_BITS) - 1
+DELIMITER = ","
+NEW_LINE = b"\n"
+ENCODING = "utf-8"
+
+
+@dataclass
+class CompressedFileDataClient(Generic[EntityType]):
+    """
+        Клиент для файла, в котором записи хранятся сжатыми блоками (zlib или lzma)
+        Интерфейс совпадает с FileDataClient, клиент можно передать в IndexFileStudentDataAccess
+
+        Формат файла: заголовок HEADER, названия колонок через запятую, затем блоки:
+        BLOCK_HEADER и сжатые строки в том же виде, что и в текстовом файле (с маркерами изменений и удалений).
+        Каталог блоков (где лежит каждый блок) собирается при открытии по заголовкам блоков.
+        Позиция записи - номер блока и смещение строки в распакованном блоке, см. OFFSET_BITS
+
+        Новые строки копятся в открытом блоке в памяти и сжимаются, когда набралось block_size байт,
+        а также при flush(), close() и завершении интерпретатора. Записи из открытого блока читаются из памяти.
+        Последние распакованные блоки хранятся в LRU кэше на block_cache_size блоков.
+        Блокировка записи действует только внутри процесса: файл должен дописывать один процесс
+    """
+    file_path: str
+    entity_type: Type[EntityType]
+
+    block_size: int = 64 * 1024  # сколько байт строк собирать в блок перед сжатием
+    block_cache_size: int = 16  # сколько распакованных блоков держать в памяти
+    metrics: Optional[Metrics] = None  # сбор метрик. BYTES_READ - сжатые байты, прочитанные с диска
+
+    _field_names: List[str] = field(default_factory=list, init=False)
+    _codec: str = field(default=CODEC_ZLIB, init=False)
+    _compress: Callable[[bytes], bytes] = field(init=False)
+    _decompress: Callable[[bytes], bytes] = field(init=False)
+    _file: Optional[BinaryIO] = field(default=None, init=False)
+    _mapping: Optional[mmap.mmap] = field(default=None, init=False)
+    _blocks: List[Tuple[int, int]] = field(default_factory=list, init=False)  # каталог: (смещение данных, размер)
+    _block_starts: List[int] = field(default_factory=list, init=False)  # смещения заголовков блоков
+    _open_block: Tuple[int, bytearray] = field(init=False)  # номер открытого блока и его строки
+    _cache: LRUCache[int, bytes] = field(init=False)
+    _write_lock: threading.RLock = field(default_factory=threading.RLock, init=False)
+    _loader: Callable[[List[str]], EntityType] = field(init=False)
+    _dumper: Callable[[EntityType], tuple] = field(init=False)
+
+    def __post_init__(self):
+        self._cache = LRUCache(self.block_cache_size)
+        self._open_file()
+        self._loader = self.entity_type.compile_loader(self._field_names)
+        self._dumper = self.entity_type.compile_dumper(self._field_names)
+        atexit.register(_flush_at_exit, weakref.ref(self))
+
+    @classmethod
+    def create(
+        cls, file_path: str, entity_type: Type[EntityType], field_names: List[str], codec: str = CODEC_ZLIB, **options
+    ) -> "CompressedFileDataClient[EntityType]":
+        """ Создает пустой файл с названиями колонок и открывает его. options - параметры клиента """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+
+        layout = DELIMITER.join(field_names).encode(ENCODING)
+
+        with open(file_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, CODECS[codec][0], len(layout)))
+            file.write(layout)
+
+        return cls(file_path, entity_type, **options)
+
+    def __enter__(self) -> "CompressedFileDataClient[EntityType]":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def field_names(self) -> List[str]:
+        return list(self._field_names)
+
+    @property
+    def buffer_size(self) -> int:
+        """ Записи попадают в файл группами по блоку, как у FileDataClient с групповой записью """
+        return self.block_size
+
+    @property
+    def codec(self) -> str:
+        return self._codec
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """ Блокировка записи. В отличие от FileDataClient, только внутри процесса """
+        with self._write_lock:
+            yield
+
+    def size(self) -> int:
+        """
+            Логический размер: размер файла плюс PENDING_BLOCK_MARKER, если в открытом блоке есть строки
+            Открытый блок не сжимается, иначе частые вызовы (проверка хвоста файла) дробили бы файл на мелкие блоки.
+            Строки, дописанные в уже непустой открытый блок, размер не меняют
+        """
+        with self._write_lock:
+            pending = bool(self._open_block[1])
+            return os.fstat(self._file.fileno()).st_size + (PENDING_BLOCK_MARKER if pending else 0)
+
+    def position_for_size(self, size: int) -> int:
+        """
+            Позиция первой строки блока, который начинался с размера файла size
+            Для размера с PENDING_BLOCK_MARKER - первая строка блока, открытого в тот момент:
+            с нее нужно досканировать, чтобы не пропустить строки, дописанные в этот блок позже
+        """
+        # блок длиннее маркера, поэтому на size - 1 начинается только блок, открытый при замере
+        return bisect_left(self._block_starts, size - PENDING_BLOCK_MARKER) << OFFSET_BITS
+
+    def block_cache_info(self) -> Dict[str, int]:
+        return {"hits": self._cache.hits, "misses": self._cache.misses, "blocks": len(self._blocks)}
+
+    def flush(self):
+        """ Сжимает и записывает открытый блок, даже если он заполнен не до конца """
+        with self._write_lock:
+            self._seal_block()
+
+    def close(self):
+        if self._file is None:
+            return
+
+        self.flush()
+
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+        self._file.close()
+        self._file = None
+
+    def iter_read(self, start_position: Optional[int] = None) -> Iterable[Tuple[EntityType, int]]:
+        """ Как FileDataClient.iter_read """
+        for line, position in self._iter_lines(start_position):
+            if not line.startswith(DELETE_MARKER):
+                yield self._load_row(self._split_marked_line(line)[1]), position
+
+    def iter_rows(self, start_position: Optional[int] = None) -> Iterable[Tuple[List[str], int]]:
+        """ Как FileDataClient.iter_rows """
+        for line, position in self._iter_lines(start_position):
+            if not line.startswith(DELETE_MARKER):
+                yield self._split_marked_line(line)[1], position
+
+    def iter_changes(
+        self, key_field: str, start_position: Optional[int] = None
+    ) -> Iterable[Tuple[str, int, Optional[EntityType], int]]:
+        """ Как FileDataClient.iter_changes """
+        key_column = self._field_names.index(key_field)
+
+        for line, position in self._iter_lines(start_position):
+            marker, row = self._split_marked_line(line)
+            entity = None if marker == DELETE_MARKER else self._load_row(row)
+            yield marker, int(row[key_column]), entity, position
+
+    def iter_keys(
+        self, key_field: str, start_position: Optional[int] = None, workers: int = 1
+    ) -> Iterable[Tuple[str, int, int]]:
+        """ Как FileDataClient.iter_keys. Блоки распаковываются по очереди, workers не используется """
+        key_column = self._field_names.index(key_field)
+
+        for line, position in self._iter_lines(start_position):
+            marker, row = self._split_marked_line(line)
+            yield marker, int(row[key_column]), position
+
+    def read_at_position(self, position: int) -> EntityType:
+        if self.metrics is None:
+            return self._read_at_position(position)
+
+        with self.metrics.timer(READ_SECONDS):
+            return self._read_at_position(position)
+
+    def read_at_positions(self, positions: Iterable[int]) -> Iterable[Tuple[EntityType, int]]:
+        """ Позиции сортируются, поэтому записи одного блока читаются подряд и блок распаковывается один раз """
+        for position in sorted(positions):
+            yield self.read_at_position(position), position
+
+    def write(self, entity: EntityType) -> int:
+        return self._append_lines([self._dump_entity(entity)])[0]
+
+    def write_update(self, entity: EntityType) -> int:
+        return self._append_lines([UPDATE_MARKER + self._dump_entity(entity)])[0]
+
+    def write_tombstone(self, key_field: str, key: int) -> int:
+        row = [""] * len(self._field_names)
+        row[self._field_names.index(key_field)] = str(key)
+        return self._append_lines([DELETE_MARKER + DELIMITER.join(row)])[0]
+
+    def write_many(self, entities: Iterable[EntityType]) -> List[int]:
+        return self._append_lines([self._dump_entity(entity) for entity in entities])
+
+    def compact(self, positions: Iterable[int]) -> Dict[int, int]:
+        """ Как FileDataClient.compact: новый файл собирается из блоков заново и подменяет старый """
+        new_positions = {}
+        tmp_path = f"{self.file_path}.{os.getpid()}.compact"
+
+        with self._write_lock:
+            self._seal_block()
+            target = type(self).create(
+                tmp_path, self.entity_type, self._field_names, self._codec, block_size=self.block_size
+            )
+
+            with target:
+                for position in sorted(positions):
+                    line = self._read_line(position)
+                    if line.startswith(UPDATE_MARKER):
+                        line = line[len(UPDATE_MARKER):]
+
+                    new_positions[position] = target._append_lines([line])[0]
+
+            os.replace(tmp_path, self.file_path)
+
+            # старое отображение не закрываем: его может читать другой поток
+            self._file.close()
+            self._mapping = None
+            self._cache.clear()
+            self._open_file()
+
+        return new_positions
+
+    def _open_file(self):
+        """ Открывает файл, читает заголовок и собирает каталог блоков """
+        try:
+            self._file = open(self.file_path, "r+b")  # файл создает только create
+        except FileNotFoundError:
+            raise InvalidFile(f"{self.file_path} does not exist")
+
+        raw_header = self._file.read(HEADER.size)
+
+        if len(raw_header) != HEADER.size or HEADER.unpack(raw_header)[:2] != (MAGIC, VERSION):
+            self._file.close()
+            self._file = None
+            raise InvalidFile(f"{self.file_path} is not a compressed data file")
+
+        mapping = self._remap()
+
+        _, _, codec_number, layout_size = HEADER.unpack_from(mapping)
+        self._codec = next(name for name, (number, _, _) in CODECS.items() if number == codec_number)
+        _, self._compress, self._decompress = CODECS[self._codec]
+        self._field_names = mapping[HEADER.size:HEADER.size + layout_size].decode(ENCODING).split(DELIMITER)
+
+        blocks, block_starts = [], []
+        position = HEADER.size + layout_size
+
+        while position + BLOCK_HEADER.size <= len(mapping):
+            compressed_size, _ = BLOCK_HEADER.unpack_from(mapping, position)
+            block_starts.append(position)
+            blocks.append((position + BLOCK_HEADER.size, compressed_size))
+            position += BLOCK_HEADER.size + compressed_size
+
+        self._blocks, self._block_starts = blocks, block_starts
+        self._open_block = (len(blocks), bytearray())
+
+    def _append_lines(self, lines: List[str]) -> List[int]:
+        """ Дописывает строки в открытый блок. Отдает их позиции """
+        positions = []
+
+        with self._write_lock:
+            for line in lines:
+                block_number, data = self._open_block
+                positions.append(block_number << OFFSET_BITS | len(data))
+                data += line.encode(ENCODING) + NEW_LINE
+
+                if len(data) >= self.block_size:
+                    self._seal_block()
+
+        return positions
+
+    def _seal_block(self):
+        """ Сжимает открытый блок и дописывает его в файл. Вызывается под _write_lock """
+        block_number, data = self._open_block
+        if not data:
+            return
+
+        raw = bytes(data)
+        compressed = self._compress(raw)
+
+        self._file.seek(0, os.SEEK_END)
+        block_start = self._file.tell()
+        self._file.write(BLOCK_HEADER.pack(len(compressed), len(raw)) + compressed)
+        self._file.flush()
+
+        # сначала блок появляется в каталоге, потом открывается новый:
+        # читатель, увидевший новый открытый блок, найдет старый в каталоге
+        self._cache.put(block_number, raw)
+        self._blocks.append((block_start + BLOCK_HEADER.size, len(compressed)))
+        self._block_starts.append(block_start)
+        self._open_block = (block_number + 1, bytearray())
+
+    def _read_at_position(self, position: int) -> EntityType:
+        return self._load_row(self._split_marked_line(self._read_line(position))[1])
+
+    def _read_line(self, position: int) -> str:
+        data = self._block_data(position >> OFFSET_BITS)
+        offset = position & OFFSET_MASK
+        end = data.find(NEW_LINE, offset)
+
+        if end == -1 or offset >= len(data):
+            raise ValueError(f"No record at position {position}")
+
+        return data[offset:end].decode(ENCODING)
+
+    def _block_data(self, block_number: int, use_cache: bool = True) -> bytes:
+        """ Распакованные строки блока. Для открытого блока - его строки в памяти """
+        open_number, open_data = self._open_block
+        if block_number == open_number:
+            return open_data
+
+        raw = self._cache.get(block_number)
+        if raw is None:
+            raw = self._read_block(block_number)
+            if use_cache:
+                self._cache.put(block_number, raw)
+
+        return raw
+
+    def _read_block(self, block_number: int) -> bytes:
+        offset, compressed_size = self._blocks[block_number]  # IndexError, если такого блока нет
+
+        mapping = self._mapping
+        if offset + compressed_size > len(mapping):
+            mapping = self._remap()  # блок дописан после последнего отображения
+
+        try:
+            raw = self._decompress(mapping[offset:offset + compressed_size])
+        except (zlib.error, lzma.LZMAError) as error:
+            raise ValueError(f"Block {block_number} of {self.file_path} is corrupted") from error
+
+        if self.metrics is not None:
+            self.metrics.increment(BYTES_READ, compressed_size)
+
+        return raw
+
+    def _iter_lines(self, start_position: Optional[int]) -> Iterable[Tuple[str, int]]:
+        """ Отдает строки и их позиции по блокам. Полный проход не вытесняет блоки из кэша """
+        position = 0 if start_position is None else start_position
+        block_number, offset = position >> OFFSET_BITS, position & OFFSET_MASK
+
+        while block_number <= self._open_block[0]:
+            is_open = block_number == self._open_block[0]
+            data = self._block_data(block_number, use_cache=False)
+
+            while offset < len(data):
+                end = data.find(NEW_LINE, offset)
+                yield data[offset:end].decode(ENCODING), block_number << OFFSET_BITS | offset
+                offset = end + len(NEW_LINE)
+
+            if is_open:
+                return  # строки, дописанные после начала прохода, не отдаются
+
+            block_number, offset = block_number + 1, 0
+
+    def _remap(self) -> mmap.mmap:
+        mapping = self._mapping
+        size = os.fstat(self._file.fileno()).st_size
+        if mapping is not None and len(mapping) == size:
+            return mapping
+
+        self._mapping = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        return self._mapping
+
+    def _load_row(self, row: List[str]) -> EntityType:
+        if self.metrics is None:
+            return self._loader(row)
+
+        start_time = perf_counter()
+        entity = self._loader(row)
+        self.metrics.observe(DECODE_SECONDS, perf_counter() - start_time)
+        return entity
+
+    @staticmethod
+    def _split_marked_line(line: str) -> Tuple[str, List[str]]:
+        marker = line[:1]
+        if marker not in MARKERS:
+            marker = ""
+
+        return marker, line[len(marker):].split(DELIMITER)
+
+    def _dump_entity(self, entity: EntityType) -> str:
+        return DELIMITER.join(map(str, self._dumper(entity)))
+
+
+def convert_text_file(
+    source: FileDataClient,
+    target_path: str,
+    key_field: str,
+    codec: str = CODEC_ZLIB,
+    block_size: int = 64 * 1024,
+    batch_size: int = 10000,
+) -> int:
+    """
+        Переносит актуальные версии записей из текстового файла в новый сжатый файл
+        Устаревшие версии и удаленные записи не переносятся: иначе в новом файле id повторялись бы без маркеров
+        Отдает кол-во перенесенных записей
+    """
+    count = 0
+
+    with CompressedFileDataClient.create(
+        target_path, source.entity_type, source.field_names, codec, block_size=block_size
+    ) as target:
+        batch = []
+        for entity, _ in source.iter_latest(key_field):
+            batch.append(entity)
+
+            if len(batch) >= batch_size:
+                count += len(target.write_many(batch))
+                batch = []
+
+        count += len(target.write_many(batch))
+
+    return count
@@ -1,11 +1,46 @@
+import threading
+from array import array
+from contextlib import nullcontext
 from dataclasses import dataclass, field
-from typing import Protocol, List, Optional
+from datetime import date
+from itertools import islice, takewhile
+from typing import Protocol, Optional, Iterable, Dict, Tuple, List, Callable, TypeVar
 
 from simio_di import Depends
 
+from lib.bloom import BloomFilter, BloomSidecar
+from lib.cache import LRUCache
 from lib.entities import PrimaryKey, Student
-from lib.exceptions import DuplicateRecordId, RecordNotFound
-from lib.file_data_client import FileDataClient
+from lib.exceptions import DuplicateRecordId, RecordNotFound, StaleIndex
+from lib.file_data_client import FileDataClient, DELETE_MARKER, UPDATE_MARKER
+from lib.index import IndexProtocol, ABSENT, INDEX_MODE_AUTO, create_index
+from lib.index_sidecar import IndexSidecar
+from lib.metrics import (
+    Metrics,
+    APPENDS,
+    APPEND_SECONDS,
+    BLOOM_REJECTS,
+    CACHE_HITS,
+    COMPACTION_SECONDS,
+    DELETES,
+    INDEX_BUILD_PROGRESS,
+    INDEX_BUILD_SECONDS,
+    INDEX_LOOKUP_SECONDS,
+    INDEX_SIZE,
+    LOOKUPS,
+    LOOKUP_MISSES,
+    LOOKUP_SECONDS,
+    UPDATES,
+)
+from lib.query import Query
+from lib.secondary_index import SortedValueIndex, normalize_name, parse_date
+
+KEY_FIELD = "record_id"  # колонка с первичным ключом
+LAZY_INDEX_WAIT = "wait"  # поиск во время построения индекса ждет, пока построение дойдет до записи
+LAZY_INDEX_SCAN = "scan"  # поиск во время построения индекса сам дочитывает непройденную часть файла
+BLOOM_HEADROOM = 2  # во сколько раз емкость фильтра Блума больше кол-ва id при построении: запас под добавления
+BUILD_CHUNK_SIZE = 4096  # сколько строк построение индекса добавляет за один захват блокировки
+ResultType = TypeVar("ResultType")
 
 
 class StudentDataAccessProtocol(Protocol):
@@ -13,29 +48,294 @@ class StudentDataAccessProtocol(Protocol):
     def add_student(self, student: Student):
         ...
 
+    def add_students(self, students: Iterable[Student]):
+        """ Добавление сразу нескольких студентов. Если хоть один не прошел проверку, не записывается никто """
+        ...
+
+    def update_student(self, student: Student):
+        """ Заменяет данные студента с тем же record_id. Если такого студента нет - RecordNotFound """
+        ...
+
+    def delete_student(self, record_id: PrimaryKey):
+        """ Удаляет студента. Если такого студента нет - RecordNotFound """
+        ...
+
+    def compact(self):
+        """ Переписывает файл без удаленных и устаревших версий записей """
+        ...
+
     def get_student(self, record_id: PrimaryKey) -> Student:
         ...
 
+    def get_students(self, record_ids: Iterable[PrimaryKey]) -> Dict[PrimaryKey, Optional[Student]]:
+        """ Поиск сразу нескольких студентов. Для ненайденных id в результате None """
+        ...
+
+    def find_by_last_name(self, last_name: str, prefix: bool = False) -> List[Student]:
+        """ Поиск по фамилии без учета регистра. При prefix=True - по началу фамилии """
+        ...
+
+    def find_by_first_name(self, first_name: str, prefix: bool = False) -> List[Student]:
+        """ Поиск по имени без учета регистра. При prefix=True - по началу имени """
+        ...
+
+    def find_by_birthday(self, start: date, end: date) -> List[Student]:
+        """ Поиск студентов, родившихся в диапазоне дат [start, end] """
+        ...
+
+    def query(self) -> Query[Student]:
+        """ Ленивый запрос по всем студентам с отбором, выбором полей и ограничением кол-ва """
+        ...
+
 
 @dataclass
 class FileStudentDataAccess(StudentDataAccessProtocol):
     """
         Реализация интерфейса StudentDataAccessProtocol, где в качестве БД используется файл
         Данная реализация использует линейный поиск. Сложность O(n)
+        Изменения дописываются в файл, поэтому поиск проходит файл до конца: актуальна последняя версия записи
     """
     file_client: Depends[FileDataClient]  # type: FileDataClient[Student]
+    metrics: Optional[Metrics] = None  # сбор метрик. None - метрики не собираются
+    # отсеивать промахи поиска фильтром Блума по id. Фильтр строится при первом полном проходе по файлу
+    bloom_filter: bool = False
+    bloom_false_positive_rate: float = 0.01  # доля отсутствующих id, для которых файл все равно проходится
+    bloom_path: Optional[str] = None  # путь к сохраненному фильтру Блума. None - фильтр только в памяти
+    _bloom: Optional[BloomFilter] = field(default=None, init=False)
+    _bloom_size: int = field(default=0, init=False)  # до какого размера файла id есть в фильтре
+    _bloom_loaded: bool = field(default=False, init=False)  # сохраненный фильтр уже пробовали загрузить
 
     def add_student(self, student: Student):
-        self.file_client.write(student)
+        with self._timer(APPEND_SECONDS):
+            self.file_client.write(student)
+        self._add_to_bloom([student.record_id])
+        self._count(APPENDS)
+
+    def add_students(self, students: Iterable[Student]):
+        students = list(students)
+        with self._timer(APPEND_SECONDS):
+            positions = self.file_client.write_many(students)
+        self._add_to_bloom(student.record_id for student in students)
+        self._count(APPENDS, len(positions))
+
+    def update_student(self, student: Student):
+        with self.file_client.locked():  # проверка и запись атомарны и для других процессов
+            self._ensure_exists(student.record_id)
+            self.file_client.write_update(student)
+        self._count(UPDATES)
+
+    def delete_student(self, record_id: PrimaryKey):
+        with self.file_client.locked():
+            self._ensure_exists(record_id)
+            self.file_client.write_tombstone(KEY_FIELD, record_id)
+        self._count(DELETES)
+
+    def compact(self):
+        with self._timer(COMPACTION_SECONDS), self.file_client.locked():
+            self.file_client.compact(self._latest_positions().values())
+            self._after_compact_bloom()
 
     def get_student(self, record_id: PrimaryKey) -> Student:
-        for student, _ in self.file_client.iter_read():
-            # Проходимся по всем записям, ищем нужного студента
-            if student.record_id == record_id:
-                return student
+        self._count(LOOKUPS)
+
+        with self._timer(LOOKUP_SECONDS):
+            student = None
+            if self._may_contain(record_id):
+                # Проходимся по всем записям, запоминаем последнюю версию нужного студента
+                student = self._scan_latest(lambda candidate: candidate.record_id == record_id).get(record_id)
+
+        if student is None:
+            # Если не нашли, выкидываем ошибку
+            self._count(LOOKUP_MISSES)
+            raise RecordNotFound(f"Student with id {record_id} not found")
+
+        return student
+
+    def get_students(self, record_ids: Iterable[PrimaryKey]) -> Dict[PrimaryKey, Optional[Student]]:
+        result: Dict[PrimaryKey, Optional[Student]] = dict.fromkeys(record_ids)
+        self._count(LOOKUPS, len(result))
+
+        candidates = {record_id for record_id in result if self._may_contain(record_id)}
+        if not candidates:
+            self._count(LOOKUP_MISSES, len(result))
+            return result
+
+        # Все id ищем за один проход по файлу
+        found = self._scan_latest(lambda student: student.record_id in candidates)
+        result.update(found)
+
+        self._count(LOOKUP_MISSES, len(result) - len(found))
+        return result
+
+    def find_by_last_name(self, last_name: str, prefix: bool = False) -> List[Student]:
+        return self._find_by_name("last_name", last_name, prefix)
+
+    def find_by_first_name(self, first_name: str, prefix: bool = False) -> List[Student]:
+        return self._find_by_name("first_name", first_name, prefix)
+
+    def find_by_birthday(self, start: date, end: date) -> List[Student]:
+        def matches(student: Student) -> bool:
+            birthday_date = parse_date(student.birthday_date)
+            return birthday_date is not None and start <= birthday_date <= end
+
+        return list(self._scan_latest(matches).values())
+
+    def query(self) -> Query[Student]:
+        latest_positions = None
+
+        def is_latest(row: List[str], position: int) -> bool:
+            nonlocal latest_positions
+            if latest_positions is None:
+                # актуальные версии узнаем одним проходом по ключам при первой подходящей строке
+                latest_positions = set(self._latest_positions().values())
+            return position in latest_positions
+
+        return Query(self.file_client, is_live=is_latest)
+
+    def _find_by_name(self, field_name: str, value: str, prefix: bool) -> List[Student]:
+        value = normalize_name(value)
+
+        def matches(student: Student) -> bool:
+            student_value = normalize_name(getattr(student, field_name))
+            return student_value.startswith(value) if prefix else student_value == value
+
+        return list(self._scan_latest(matches).values())
+
+    def _scan_latest(self, matches: Callable[[Student], bool]) -> Dict[PrimaryKey, Student]:
+        """
+            Проходит весь файл и отдает актуальные версии студентов, подходящих под matches,
+            в порядке следования этих версий в файле
+        """
+        result: Dict[PrimaryKey, Student] = {}
+        changes = self.file_client.iter_changes(KEY_FIELD)
+
+        bloom_keys = None
+        if self._needs_bloom():
+            # фильтр Блума строится попутно: id собираются во время прохода
+            bloom_size = self.file_client.size()  # строки, дописанные во время прохода, досканируются потом
+            bloom_keys = array("q")
+            changes = self._collect_keys(changes, bloom_keys)
+
+        for marker, record_id, student, _ in changes:
+            result.pop(record_id, None)  # предыдущая версия больше не актуальна
+            if marker != DELETE_MARKER and matches(student):
+                result[student.record_id] = student
+
+        if bloom_keys is not None:
+            self._install_bloom(bloom_keys, bloom_size)
+
+        return result
+
+    def _latest_positions(self) -> Dict[int, int]:
+        """ Позиции актуальных версий всех записей. Сущности не десериализуются """
+        positions = {}
+
+        for marker, record_id, position in self.file_client.iter_keys(KEY_FIELD):
+            if marker == DELETE_MARKER:
+                positions.pop(record_id, None)
+            else:
+                positions[record_id] = position
+
+        return positions
+
+    def _ensure_exists(self, record_id: PrimaryKey):
+        if not self._may_contain(record_id) or record_id not in self._scan_latest(
+            lambda student: student.record_id == record_id
+        ):
+            raise RecordNotFound(f"Student with id {record_id} not found")
+
+    def _may_contain(self, record_id: PrimaryKey) -> bool:
+        """ False - студента с таким id точно нет (по фильтру Блума), файл можно не проходить """
+        if not self.bloom_filter:
+            return True
+
+        with self.file_client.locked():  # досканированный хвост и проверка атомарны относительно записей
+            bloom = self._current_bloom()
+            if bloom is None or record_id in bloom:
+                return True
+
+        self._count(BLOOM_REJECTS)
+        return False
+
+    def _current_bloom(self) -> Optional[BloomFilter]:
+        """ Фильтр, в котором есть все id файла, или None, если его нужно построить. Вызывается под locked() """
+        if not self._bloom_loaded:
+            self._bloom_loaded = True
+            if self.bloom_path is not None:
+                loaded = BloomSidecar(self.bloom_path).load(self.file_client.file_path, self.bloom_false_positive_rate)
+                if loaded is not None:
+                    self._bloom, self._bloom_size = loaded
+
+        if self._bloom is None:
+            return None
+
+        size = self.file_client.size()
+        if size < self._bloom_size:
+            self._bloom = None  # файл переписал другой процесс (compact)
+        elif size > self._bloom_size:
+            # id строк, дописанных после построения, в том числе другими процессами
+            start_position = self.file_client.position_for_size(self._bloom_size)
+            self._bloom.update(record_id for _, record_id, _ in self.file_client.iter_keys(KEY_FIELD, start_position))
+            self._bloom_size = size
+
+        if self._bloom is not None and self._bloom.is_full():
+            self._bloom = None  # id больше, чем рассчитан фильтр - ложных срабатываний больше заданного
+
+        return self._bloom
+
+    def _needs_bloom(self) -> bool:
+        if not self.bloom_filter:
+            return False
+
+        with self.file_client.locked():
+            return self._current_bloom() is None
+
+    def _install_bloom(self, keys: array, size: int):
+        """ Строит фильтр по id, собранным за проход по первым size байтам файла, и сохраняет его """
+        bloom = BloomFilter(len(keys) * BLOOM_HEADROOM, self.bloom_false_positive_rate)
+        bloom.update(keys)
 
-        # Если не нашли, выкидываем ошибку
-        raise RecordNotFound(f"Student with id {record_id} not found")
+        with self.file_client.locked():
+            self._bloom, self._bloom_size = bloom, size
+
+        if self.bloom_path is not None:
+            BloomSidecar(self.bloom_path).save(self.file_client.file_path, bloom, size)
+
+    def _add_to_bloom(self, record_ids: Iterable[PrimaryKey]):
+        if not self.bloom_filter:
+            return
+
+        with self.file_client.locked():
+            if self._bloom is not None:
+                self._bloom.update(record_ids)
+
+    def _after_compact_bloom(self):
+        """
+            После compact файл стал меньше: все id в фильтре остались, но размер, до которого он актуален, другой
+            Вызывается под locked()
+        """
+        if not self.bloom_filter or self._bloom is None:
+            return
+
+        self._bloom_size = self.file_client.size()
+        if self.bloom_path is not None:
+            BloomSidecar(self.bloom_path).save(self.file_client.file_path, self._bloom, self._bloom_size)
+
+    @staticmethod
+    def _collect_keys(
+        changes: Iterable[Tuple[str, PrimaryKey, Student, int]], keys: array
+    ) -> Iterable[Tuple[str, PrimaryKey, Student, int]]:
+        for change in changes:
+            keys.append(change[1])
+            yield change
+
+    def _timer(self, name: str):
+        """ Замер времени блока в метрику name. Без метрик - пустой контекстный менеджер """
+        return nullcontext() if self.metrics is None else self.metrics.timer(name)
+
+    def _count(self, name: str, value: int = 1):
+        if self.metrics is not None:
+            self.metrics.increment(name, value)
 
 
 @dataclass
@@ -43,51 +343,786 @@ class IndexFileStudentDataAccess(FileStudentDataAccess):
     """
         Реализация интерфейса StudentDataAccessProtocol, где в качестве БД используется файл
         Данная реализация использует поиск с помощью индексного массива. Сложность O(1)
+        Объект можно использовать из нескольких потоков: поиск по id идет без блокировок, запись - под блокировкой записи
     """
-    _index_array: List[Optional[int]] = field(default_factory=list, init=False)
+    index_path: Optional[str] = None  # путь к сохраненному индексу: при следующем запуске индекс не строится заново
+    # способ хранения индекса: dense - массив, sparse - для больших или разбросанных id, auto - по плотности id
+    index_mode: str = INDEX_MODE_AUTO
+    cache_size: int = 0  # размер кэша прочитанных студентов. 0 - без кэша
+    index_workers: int = 1  # кол-во процессов для построения индекса
+    secondary_indexes: bool = False  # строить индексы по имени, фамилии и дате рождения
+    # файл дописывают несколько процессов: запись идет под межпроцессной блокировкой, поиск сначала дочитывает
+    # чужие записи. Не поддерживается вместе с lazy_index, групповой записью клиента и compact
+    multiprocess: bool = False
+    # строить индексы в фоне, см. _positions_during_build. None - при создании объекта.
+    # wait - поиск ждет, пока построение дойдет до записи. До конца построения может вернуть устаревшую версию,
+    # если более новая дальше в файле. scan - поиск сам дочитывает непройденную часть файла
+    lazy_index: Optional[str] = None
+    _index: IndexProtocol = field(init=False)
+    _name_indexes: Dict[str, SortedValueIndex[str]] = field(default_factory=dict, init=False)
+    _birthday_index: Optional[SortedValueIndex[int]] = field(default=None, init=False)
+    _write_lock: threading.RLock = field(default_factory=threading.RLock, init=False)
+    _index_sidecar: Optional[IndexSidecar] = field(default=None, init=False)
+    _cache: Optional[LRUCache[PrimaryKey, Student]] = field(default=None, init=False)
+    _indexed_size: int = field(default=0, init=False)  # до какой позиции файла записи есть в индексе
+    _generation: int = field(default=0, init=False)  # счетчик подмен файла при compact, см. _read_consistent
+    # построение индексов: изменения индекса и их ожидание идут под _build_condition
+    _build_condition: threading.Condition = field(default_factory=threading.Condition, init=False)
+    _build_position: Optional[int] = field(default=None, init=False)  # последняя проиндексированная позиция
+    _applied_position: int = field(default=-1, init=False)  # последняя строка файла, примененная к индексу
+    # новые записи для дописывания в сохраненный индекс. None - дописывать не нужно, записи не собираются
+    _build_entries: Optional[List[Tuple[PrimaryKey, int]]] = field(default=None, init=False)
+    _build_total: int = field(default=0, init=False)  # позиция конца файла на момент запуска построения
+    _build_error: Optional[BaseException] = field(default=None, init=False)
+    _keys_ready: bool = field(default=False, init=False)  # индекс по id построен
+    _index_ready: bool = field(default=False, init=False)  # построены все индексы
 
     def __post_init__(self):
-        # при инициализации строим индекс
-        self._create_index()
+        self._index = create_index(self.index_mode)
+
+        if self.cache_size > 0:
+            self._cache = LRUCache(self.cache_size)
+
+        if self.index_path is not None:
+            self._index_sidecar = IndexSidecar(self.index_path)
+
+        if self.multiprocess and self.file_client.buffer_size > 0:
+            # позиции буферизованных строк считаются от конца файла и разойдутся с чужими записями
+            raise ValueError("Buffered writes are not supported with multiprocess=True")
+
+        if self.lazy_index not in (None, LAZY_INDEX_WAIT, LAZY_INDEX_SCAN):
+            raise ValueError(f"Unknown lazy index mode: {self.lazy_index}")
+
+        if self.lazy_index is not None and self.multiprocess:
+            # чужие записи дочитываются в индекс, который еще строится
+            raise ValueError("Lazy index build is not supported with multiprocess=True")
+
+        if self.multiprocess:
+            with self.file_client.locked():
+                # под блокировкой в файле нет недописанных строк
+                self._indexed_size = self.file_client.size()
+
+        self._build_total = self.file_client.position_for_size(self.file_client.size())
+
+        if self.lazy_index is None:
+            self._build_indexes()  # при инициализации строим индекс
+        else:
+            threading.Thread(target=self._build_indexes, name="student-index-build", daemon=True).start()
 
     def add_student(self, student: Student):
-        self._validate_record_id(student.record_id)  # проверяем id
-        position = self.file_client.write(student)  # записываем в файл
-        self._index_array[student.record_id] = position  # обновляем индекс
+        self._wait_for_index()
+
+        with self._timer(APPEND_SECONDS), self._write_lock, self._process_lock():
+            self._catch_up()  # подтягиваем записи других процессов, чтобы проверка id была полной
+            self._validate_record_id(student.record_id)  # проверяем id
+            position = self.file_client.write(student)  # записываем в файл
+            self._index_student(student, position)  # обновляем индексы
+
+            self._append_to_sidecar([(student.record_id, position)])  # дописываем новую запись в сохраненный индекс
+
+            self._mark_indexed()
+
+        self._count(APPENDS)
+
+    def add_students(self, students: Iterable[Student]):
+        students = list(students)
+        batch_ids = set()
+        self._wait_for_index()
+
+        with self._timer(APPEND_SECONDS), self._write_lock, self._process_lock():
+            self._catch_up()
+
+            # сначала проверяем все id: и по индексу, и внутри пачки
+            for student in students:
+                self._validate_record_id(student.record_id)
+
+                if student.record_id in batch_ids:
+                    raise DuplicateRecordId(f"Found duplicate record id {student.record_id}")
+                batch_ids.add(student.record_id)
+
+            positions = self.file_client.write_many(students)  # записываем всю пачку разом
+            new_entries = []
+
+            for student, position in zip(students, positions):
+                self._index_student(student, position)  # обновляем индексы
+                new_entries.append((student.record_id, position))
+
+            self._append_to_sidecar(new_entries)
+            self._mark_indexed()
+
+        self._count(APPENDS, len(students))
+
+    def update_student(self, student: Student):
+        self._wait_for_index()
+
+        with self._write_lock, self._process_lock():
+            self._catch_up()
+            self._get_position_by_key(student.record_id)  # RecordNotFound, если такого студента нет
+            position = self.file_client.write_update(student)
+            self._reindex_student(student, position)  # индекс указывает на новую версию
+            self._append_to_sidecar([(student.record_id, position)])
+            self._mark_indexed()
+
+        self._count(UPDATES)
+
+    def delete_student(self, record_id: PrimaryKey):
+        self._wait_for_index()
+
+        with self._write_lock, self._process_lock():
+            self._catch_up()
+            self._get_position_by_key(record_id)
+            self.file_client.write_tombstone(KEY_FIELD, record_id)
+            self._unindex_student(record_id)
+            self._append_to_sidecar([(record_id, ABSENT)])  # ABSENT в сохраненном индексе - удаление ключа
+            self._mark_indexed()
+
+        self._count(DELETES)
+
+    def compact(self):
+        """
+            Переписывает файл, оставляя только актуальные версии записей, и переставляет индексы на новые позиции
+            Добавления и изменения на время компакции блокируются. Поиск по индексам продолжает работать:
+            чтение повторяется, если файл подменили. Полные проходы по файлу (query) в это время могут пропустить записи
+        """
+        if self.multiprocess:
+            # другие процессы продолжили бы читать старый файл по старым позициям
+            raise RuntimeError("Compaction is not supported when several processes share the data file")
+
+        self._wait_for_index()
+
+        with self._timer(COMPACTION_SECONDS), self._write_lock:
+            entries = list(self._index.items())
+            self._generation += 1  # нечетное значение - файл переписывается
+
+            try:
+                new_positions = self.file_client.compact(position for _, position in entries)
+
+                index = create_index(self.index_mode)
+                index.start_build()
+                for record_id, position in entries:  # ключи идут по возрастанию
+                    index.add(record_id, new_positions[position])
+                index.finish_build()
+                self._index = index
+
+                for secondary_index in (*self._name_indexes.values(), self._birthday_index):
+                    if secondary_index is not None:
+                        secondary_index.remap(new_positions)
+
+                if self._index_sidecar is not None:
+                    self._index_sidecar.save(self.file_client.file_path, self._index.items())
+            finally:
+                self._generation += 1
 
     def get_student(self, record_id: PrimaryKey) -> Student:
-        position = self._get_position_by_key(record_id)  # получаем позицию в файле из индекса
-        return self.file_client.read_at_position(position)
+        self._count(LOOKUPS)
+
+        with self._timer(LOOKUP_SECONDS):
+            self._refresh_index()  # до кэша: дочитывание хвоста сбрасывает из него измененные записи
+
+            if self._cache is not None:
+                student = self._cache.get(record_id)
+                if student is not None:
+                    self._count(CACHE_HITS)
+                    return student
+
+            student, position = self._read_checked(lambda: self._read_student(record_id))
+
+            if self._cache is not None and self._keys_ready:
+                # до конца построения индекса в режиме wait может быть прочитана устаревшая версия
+                self._cache_put(record_id, student, position)
+
+            return student
+
+    def get_students(self, record_ids: Iterable[PrimaryKey]) -> Dict[PrimaryKey, Optional[Student]]:
+        result: Dict[PrimaryKey, Optional[Student]] = dict.fromkeys(record_ids)
+        not_cached = []
+        self._count(LOOKUPS, len(result))
+        self._refresh_index()
+
+        for record_id in result:
+            if self._cache is not None:
+                result[record_id] = self._cache.get(record_id)
+                if result[record_id] is not None:
+                    self._count(CACHE_HITS)
+                    continue
+
+            not_cached.append(record_id)
+
+        found = self._read_checked(lambda: self._read_students(not_cached))
+        self._count(LOOKUP_MISSES, len(not_cached) - len(found))  # ненайденные id остаются в результате с None
+
+        for record_id, (student, position) in found.items():
+            result[record_id] = student
+
+            if self._cache is not None and self._keys_ready:
+                self._cache_put(record_id, student, position)
+
+        return result
+
+    def find_by_last_name(self, last_name: str, prefix: bool = False) -> List[Student]:
+        self._wait_for_index()
+        self._refresh_index()
+
+        if not self.secondary_indexes:
+            return super().find_by_last_name(last_name, prefix)
+
+        return self._find_by_name_index("last_name", last_name, prefix)
+
+    def find_by_first_name(self, first_name: str, prefix: bool = False) -> List[Student]:
+        self._wait_for_index()
+        self._refresh_index()
+
+        if not self.secondary_indexes:
+            return super().find_by_first_name(first_name, prefix)
+
+        return self._find_by_name_index("first_name", first_name, prefix)
+
+    def find_by_birthday(self, start: date, end: date) -> List[Student]:
+        self._wait_for_index()
+        self._refresh_index()
+
+        if not self.secondary_indexes:
+            return super().find_by_birthday(start, end)
+
+        def find() -> List[Student]:
+            with self._write_lock:  # вторичные индексы читаем под блокировкой, их списки меняются не атомарно
+                positions = self._birthday_index.find_range(start.toordinal(), end.toordinal())
+
+            return [student for student, _ in self.file_client.read_at_positions(positions)]
+
+        return self._read_consistent(find)
+
+    def query(self) -> Query[Student]:
+        self._wait_for_index()
+        self._refresh_index()
+        key_column = self.file_client.field_names.index(KEY_FIELD)
+
+        def is_live(row: List[str], position: int) -> bool:
+            # актуальна только та версия записи, на которую указывает индекс
+            return self._index_position(PrimaryKey(row[key_column])) == position
+
+        return Query(self.file_client, is_live=is_live)
+
+    def get_position(self, record_id: PrimaryKey) -> int:
+        """ Позиция записи в файле по индексу. Если записи нет - RecordNotFound """
+        self._refresh_index()  # запись могли добавить, перенести или удалить другие процессы
+        return self._get_position_by_key(record_id)
+
+    def cache_info(self) -> Dict[str, int]:
+        """ Статистика кэша: попадания, промахи и текущий размер """
+        if self._cache is None:
+            return {"hits": 0, "misses": 0, "size": 0, "max_size": 0}
+
+        return {
+            "hits": self._cache.hits,
+            "misses": self._cache.misses,
+            "size": len(self._cache),
+            "max_size": self._cache.max_size,
+        }
+
+    def lookups_in_memory(self) -> bool:
+        """ get_position отвечает из памяти: не ждет построения индекса и не дочитывает хвост файла """
+        return self._keys_ready and not self.multiprocess
+
+    def index_build_progress(self) -> float:
+        """ Доля файла, пройденная построением индекса по id, от 0 до 1 """
+        if self._keys_ready or not self._build_total:
+            return 1.0
+
+        return min((self._build_position or 0) / self._build_total, 1.0)
+
+    def wait_for_index(self, timeout: Optional[float] = None) -> bool:
+        """
+            Ждет конца построения индексов (см. lazy_index). Отдает False, если за timeout секунд оно не закончилось
+            Если построение упало, бросает RuntimeError
+        """
+        with self._build_condition:
+            ready = self._build_condition.wait_for(lambda: self._index_ready, timeout)
+
+        self._check_build_error()
+        return ready
+
+    def _wait_for_index(self):
+        if not self._index_ready or self._build_error is not None:
+            self.wait_for_index()
+
+    def _check_build_error(self):
+        if self._build_error is not None:
+            raise RuntimeError("Index build failed") from self._build_error
+
+    def _build_indexes(self):
+        """ Строит все индексы. При lazy_index выполняется в фоновом потоке, ошибка сохраняется в _build_error """
+        try:
+            with self._timer(INDEX_BUILD_SECONDS):
+                self._create_index()
+
+                with self._build_condition:
+                    self._keys_ready = True
+                    self._build_condition.notify_all()
+                self._set_build_progress()
+
+                if self.secondary_indexes:
+                    self._create_secondary_indexes()
+
+            self._update_index_size()
+        except Exception as error:
+            if self.lazy_index is None:
+                raise
+            self._build_error = error
+        finally:
+            with self._build_condition:
+                self._index_ready = True
+                self._build_condition.notify_all()
+
+    def _set_build_progress(self):
+        if self.metrics is not None:
+            self.metrics.set_gauge(INDEX_BUILD_PROGRESS, self.index_build_progress())
 
     def _create_index(self):
+        start_position = None  # позиция, с которой нужно сканировать файл. None - с начала
+        self._index.start_build()
+
+        if self._index_sidecar is not None:
+            loaded = self._index_sidecar.load(self.file_client.file_path)
+
+            if loaded is not None:
+                entries, indexed_size = loaded
+                start_position = self.file_client.position_for_size(indexed_size)
+
+                with self._build_condition:
+                    for idx in range(0, len(entries), 2):
+                        # записи индекса на диске идут в порядке изменений: новые версии и удаления - после добавлений
+                        marker = DELETE_MARKER if entries[idx + 1] == ABSENT else UPDATE_MARKER
+                        self._apply_key_change(marker, PrimaryKey(entries[idx]), entries[idx + 1])
+
+                    self._build_position = start_position
+                    self._build_condition.notify_all()
+
+                if self.multiprocess:
+                    # индекс на диске мог обновить другой процесс уже после замера размера файла
+                    self._indexed_size = max(self._indexed_size, indexed_size)
+
+        changes = self._iter_keys(start_position)
+        if self.multiprocess:
+            # дальше строки, дописанные после запуска, их дочитает _refresh_index
+            changes = takewhile(lambda change: change[2] < self._indexed_size, changes)
+
+        if self._index_sidecar is not None and start_position is not None:
+            self._build_entries = []  # сохраненный индекс актуален, к нему дописываются только строки хвоста
+
+        while True:
+            # индекс пополняется пачками: между ними поиск в режиме lazy_index получает блокировку
+            chunk = list(islice(changes, BUILD_CHUNK_SIZE))
+            if not chunk:
+                break
+
+            with self._build_condition:
+                self._apply_build_chunk(chunk)
+
+            self._set_build_progress()
+
+        with self._build_condition:
+            self._index.finish_build()
+
+        if self._index_sidecar is None:
+            return
+
+        with self._process_lock():  # индекс на диске общий для всех процессов
+            if self.multiprocess:
+                # заголовок индекса на диске учтет весь файл - в нем должны быть и строки, дописанные за время построения
+                self._index_build_tail()
+
+            if start_position is None:
+                # индекса на диске не было или он устарел - сохраняем целиком
+                self._index_sidecar.save(self.file_client.file_path, self._index.items())
+            elif self._build_entries:
+                # файл был дописан - сохраняем только новые записи
+                self._index_sidecar.append(self.file_client.file_path, self._build_entries)
+
+        self._build_entries = None
+
+    def _index_build_tail(self):
+        """ Дочитывает в индекс по id строки, которые другие процессы дописали за время построения. Вызывается под блокировкой файла """
+        size = self.file_client.size()
+        changes = [
+            (marker, PrimaryKey(record_id), position)
+            for marker, record_id, position in self.file_client.iter_keys(
+                KEY_FIELD, self.file_client.position_for_size(self._indexed_size)
+            )
+        ]
+
+        if changes:
+            with self._build_condition:
+                self._apply_build_chunk(changes)
+
+        self._indexed_size = size
+
+    def _append_to_sidecar(self, entries: List[Tuple[PrimaryKey, int]]):
+        """
+            Дописывает изменения в сохраненный индекс
+            При групповой записи строки могут быть еще в буфере клиента, а сохраненный индекс должен
+            описывать только записанное в файл. Поэтому он не дописывается: хвост файла после него
+            доиндексируется при следующем запуске
+        """
+        if self._index_sidecar is not None and entries and not self.file_client.buffer_size:
+            self._index_sidecar.append(self.file_client.file_path, entries)
+
+    def _create_secondary_indexes(self):
+        """ Строит индексы по имени, фамилии и дате рождения за один проход по файлу """
+        first_names, last_names, birthdays = [], [], []
+
         for student, position in self.file_client.iter_read():
-            self._validate_record_id(student.record_id)  # проверяем id
-            self._index_array[student.record_id] = position  # сохраняем в массиве позицию в файле
+            if self.multiprocess and position >= self._indexed_size:
+                break
 
-    def _validate_record_id(self, record_id: PrimaryKey):
-        if record_id >= len(self._index_array):
-            # если id больше текущего, то расширяем его
-            self._expand_index_array(record_id)
+            if self._index_position(student.record_id) != position:
+                continue  # устаревшая версия записи
+
+            first_names.append((normalize_name(student.first_name), position))
+            last_names.append((normalize_name(student.last_name), position))
+
+            birthday_date = parse_date(student.birthday_date)
+            if birthday_date is not None:  # даты в неизвестном формате не индексируем
+                birthdays.append((birthday_date.toordinal(), position))
+
+        self._name_indexes = {"first_name": SortedValueIndex(), "last_name": SortedValueIndex()}
+        self._name_indexes["first_name"].load(first_names)
+        self._name_indexes["last_name"].load(last_names)
+        self._birthday_index = SortedValueIndex()
+        self._birthday_index.load(birthdays)
+
+    def _refresh_index(self) -> bool:
+        """
+            Дочитывает в индекс записи, дописанные в файл другими процессами. Отдает True, если они были
+            Без multiprocess и пока файл не вырос - только сравнение размеров, без блокировок
+        """
+        if not self.multiprocess or self.file_client.size() <= self._indexed_size:
+            return False
+
+        with self._write_lock, self._process_lock():
+            return self._catch_up()
+
+    def _catch_up(self) -> bool:
+        """ Индексирует хвост файла после _indexed_size. Вызывается под блокировками записи """
+        if not self.multiprocess:
+            return False
+
+        size = self.file_client.size()
+        new_entries = []
+
+        for marker, record_id, student, position in self.file_client.iter_changes(KEY_FIELD, self._indexed_size):
+            record_id = PrimaryKey(record_id)
+
+            if marker == DELETE_MARKER:
+                if record_id in self._index:
+                    self._unindex_student(record_id)
+                new_entries.append((record_id, ABSENT))
+                continue
+
+            if marker == UPDATE_MARKER and record_id in self._index:
+                self._reindex_student(student, position)
+            else:
+                self._index_student(student, position)
+            new_entries.append((record_id, position))
+
+        self._indexed_size = size
+
+        if self._index_sidecar is not None and new_entries:
+            self._index_sidecar.append(self.file_client.file_path, new_entries)
+
+        return bool(new_entries)
 
-        if self._index_array[record_id] is not None:
-            # Если такой индес уже есть, выкидываем ошибку, данные некорректны
-            raise DuplicateRecordId(f"Found duplicate record id {record_id}")
+    def _mark_indexed(self):
+        """ После собственной записи под блокировкой весь файл проиндексирован """
+        if self.multiprocess:
+            self._indexed_size = self.file_client.size()
+
+    def _process_lock(self):
+        """ Межпроцессная блокировка файла, если его дописывают несколько процессов """
+        return self.file_client.locked() if self.multiprocess else nullcontext()
+
+    def _update_index_size(self):
+        if self.metrics is not None:
+            self.metrics.set_gauge(INDEX_SIZE, len(self._index))
+
+    def _index_student(self, student: Student, position: int):
+        """ Добавляет записанного студента во все индексы """
+        self._index.add(student.record_id, position)
+        self._update_index_size()
+
+        if self._cache is not None:
+            self._cache.invalidate(student.record_id)
+
+        if self.secondary_indexes:
+            self._index_secondary(student, position)
+
+    def _reindex_student(self, student: Student, position: int):
+        """ Переставляет индексы с текущей версии студента на новую, записанную на позиции position """
+        old_position = self._index.get(student.record_id)
+        if self.secondary_indexes:
+            self._unindex_secondary(self.file_client.read_at_position(old_position), old_position)
+
+        self._index.put(student.record_id, position)
+
+        if self._cache is not None:
+            self._cache.invalidate(student.record_id)
+
+        if self.secondary_indexes:
+            self._index_secondary(student, position)
+
+    def _unindex_student(self, record_id: PrimaryKey):
+        """ Убирает удаленного студента из всех индексов """
+        old_position = self._index.get(record_id)
+        if self.secondary_indexes:
+            self._unindex_secondary(self.file_client.read_at_position(old_position), old_position)
+
+        self._index.remove(record_id)
+        self._update_index_size()
+
+        if self._cache is not None:
+            self._cache.invalidate(record_id)
+
+    def _index_secondary(self, student: Student, position: int):
+        self._name_indexes["first_name"].add(normalize_name(student.first_name), position)
+        self._name_indexes["last_name"].add(normalize_name(student.last_name), position)
+
+        birthday_date = parse_date(student.birthday_date)
+        if birthday_date is not None:
+            self._birthday_index.add(birthday_date.toordinal(), position)
+
+    def _unindex_secondary(self, student: Student, position: int):
+        self._name_indexes["first_name"].remove(normalize_name(student.first_name), position)
+        self._name_indexes["last_name"].remove(normalize_name(student.last_name), position)
+
+        birthday_date = parse_date(student.birthday_date)
+        if birthday_date is not None:
+            self._birthday_index.remove(birthday_date.toordinal(), position)
+
+    def _apply_build_chunk(self, chunk: List[Tuple[str, PrimaryKey, int]]):
+        """
+            Применяет к индексу пачку строк файла (маркер, id, позиция) при построении. Вызывается под _build_condition
+            Строки, которые уже проиндексировал поиск в режиме lazy_index=scan, пропускаются
+        """
+        skip_applied = self.lazy_index == LAZY_INDEX_SCAN  # только в этом режиме индекс пополняют два потока
+
+        for marker, record_id, position in chunk:
+            if skip_applied and position <= self._applied_position:
+                continue
+
+            self._apply_key_change(marker, record_id, position)  # сохраняем в индексе позицию в файле
+            if self._build_entries is not None:
+                self._build_entries.append((record_id, ABSENT if marker == DELETE_MARKER else position))
+            self._applied_position = position
+
+        self._build_position = max(self._build_position or 0, chunk[-1][2])
+        self._build_condition.notify_all()
+
+    def _apply_key_change(self, marker: str, record_id: PrimaryKey, position: int):
+        """ Применяет к индексу по id одну строку файла при построении """
+        if marker == DELETE_MARKER:
+            if record_id in self._index:
+                self._index.remove(record_id)
+        elif marker == UPDATE_MARKER:
+            self._index.put(record_id, position)
+        else:
+            self._index.add(record_id, position)
+
+    def _find_by_name_index(self, field_name: str, value: str, prefix: bool) -> List[Student]:
+        index = self._name_indexes[field_name]
+        value = normalize_name(value)
+
+        def find() -> List[Student]:
+            with self._write_lock:
+                positions = index.find_prefix(value) if prefix else index.find(value)
+
+            return [student for student, _ in self.file_client.read_at_positions(positions)]
+
+        return self._read_consistent(find)
+
+    def _read_student(self, record_id: PrimaryKey) -> Tuple[Student, int]:
+        """ Читает студента по позиции из индекса. Отдает студента и позицию """
+        try:
+            with self._timer(INDEX_LOOKUP_SECONDS):
+                # хвост файла уже дочитан в get_student
+                position = self._get_position_by_key(record_id)  # получаем позицию в файле из индекса
+        except RecordNotFound:
+            self._count(LOOKUP_MISSES)
+            raise
 
-    def _get_position_by_key(self, key: PrimaryKey):
         try:
-            position = self._index_array[key]
-        except IndexError as exception:
-            # Если вышли за пределы массива, значит такой записи нет
-            raise RecordNotFound(f"Student with id: {key} not found") from exception
+            student = self.file_client.read_at_position(position)
+        except (ValueError, IndexError) as error:
+            raise StaleIndex(f"Index points to unreadable data instead of student {record_id} at {position}") from error
+
+        self._check_record_id(student, record_id, position)
+        return student, position
+
+    def _read_students(self, record_ids: List[PrimaryKey]) -> Dict[PrimaryKey, Tuple[Student, int]]:
+        id_by_position: Dict[int, PrimaryKey] = {}
+
+        if not self._keys_ready:
+            # пока индекс строится, все id ищутся за одно ожидание или один проход по файлу
+            positions = self._positions_during_build(record_ids)
+            id_by_position = {position: record_id for record_id, position in positions.items()}
+        else:
+            for record_id in record_ids:
+                try:
+                    id_by_position[self._get_position_by_key(record_id)] = record_id
+                except RecordNotFound:
+                    continue
 
+        # позиции читаются по возрастанию, файл проходится от начала к концу
+        found = {}
+        try:
+            for student, position in self.file_client.read_at_positions(id_by_position):
+                self._check_record_id(student, id_by_position[position], position)
+                found[student.record_id] = (student, position)
+        except StaleIndex:
+            raise
+        except (ValueError, IndexError) as error:
+            raise StaleIndex("Index points to unreadable data") from error
+
+        return found
+
+    @staticmethod
+    def _check_record_id(student: Student, record_id: PrimaryKey, position: int):
+        if student.record_id != record_id:
+            raise StaleIndex(f"Index points to student {student.record_id} instead of {record_id} at {position}")
+
+    def _read_checked(self, read: Callable[[], ResultType]) -> ResultType:
+        """
+            Как _read_consistent, но если индекс указал на чужую запись или на середину строки,
+            перестраивает индексы и читает заново
+        """
+        try:
+            return self._read_consistent(read)
+        except StaleIndex:
+            self._rebuild_indexes()
+            return self._read_consistent(read)
+
+    def _rebuild_indexes(self):
+        """
+            Сохраненный индекс прошел проверки, но не соответствует файлу. Индексы строятся заново по всему файлу
+            в отдельном объекте и подменяют текущие, поиск до подмены идет по старым. Сохраненный индекс перезаписывается
+        """
+        self._wait_for_index()
+
+        with self._write_lock, self._process_lock():
+            fresh = IndexFileStudentDataAccess(
+                self.file_client,
+                index_mode=self.index_mode,
+                index_workers=self.index_workers,
+                secondary_indexes=self.secondary_indexes,
+                multiprocess=self.multiprocess,
+            )
+            self._index, self._name_indexes, self._birthday_index = (
+                fresh._index, fresh._name_indexes, fresh._birthday_index
+            )
+            self._indexed_size = fresh._indexed_size
+
+            if self._cache is not None:
+                self._cache.clear()
+
+            if self._index_sidecar is not None:
+                self._index_sidecar.save(self.file_client.file_path, self._index.items())
+
+        self._update_index_size()
+
+    def _read_consistent(self, read: Callable[[], ResultType]) -> ResultType:
+        """
+            Выполняет чтение по позициям из индексов так, чтобы оно не пересеклось с compact
+            compact увеличивает _generation до и после подмены файла. Если счетчик изменился за время чтения,
+            позиции могли относиться к старому файлу - читаем заново
+        """
+        while True:
+            generation = self._generation
+            if generation % 2:
+                with self._write_lock:  # файл переписывается прямо сейчас - ждем окончания
+                    continue
+
+            try:
+                result = read()
+            except (ValueError, IndexError):
+                # строка по старой позиции в новом файле может не разобраться
+                if generation == self._generation:
+                    raise
+                continue
+
+            if generation == self._generation:
+                return result
+
+    def _cache_put(self, record_id: PrimaryKey, student: Student, position: int):
+        self._cache.put(record_id, student)
+
+        if self._index_position(record_id) != position:
+            # запись изменили, пока мы ее читали - в кэше не должно остаться старой версии
+            self._cache.invalidate(record_id)
+
+    def _iter_keys(self, start_position: Optional[int]) -> Iterable[Tuple[str, PrimaryKey, int]]:
+        """ Отдает (маркер, record_id, позиция в файле) для всех строк, начиная с start_position """
+        # сущности не десериализуем, из каждой строки берем только record_id
+        for marker, record_id, position in self.file_client.iter_keys(KEY_FIELD, start_position, self.index_workers):
+            yield marker, PrimaryKey(record_id), position
+
+    def _validate_record_id(self, record_id: PrimaryKey):
+        self._index.validate(record_id)
+
+    def _get_position_by_key(self, key: PrimaryKey) -> int:
+        if self._keys_ready:
+            return self._index.get(key)
+
+        position = self._positions_during_build([key]).get(key)
         if position is None:
-            # Для этого ключа не нашли значения, значит такой записи нет
             raise RecordNotFound(f"Student with id: {key} not found")
 
         return position
 
-    def _expand_index_array(self, record_id: PrimaryKey):
-        """ Расширяет массив в два раза значениями None """
-        expand_size = (record_id - (len(self._index_array) - 1)) * 2
-        for _ in range(expand_size):
-            self._index_array.append(None)
+    def _positions_during_build(self, record_ids: List[PrimaryKey]) -> Dict[PrimaryKey, int]:
+        """ Позиции записей, пока индекс по id строится (см. lazy_index). Ненайденных id в результате нет """
+        wanted = set(record_ids)
+
+        with self._build_condition:
+            if self.lazy_index == LAZY_INDEX_WAIT:
+                # построение будит ожидающих после каждой пачки
+                self._build_condition.wait_for(
+                    lambda: self._keys_ready or self._index_ready or all(key in self._index for key in wanted)
+                )
+
+            self._check_build_error()
+            positions = {key: self._index.get(key) for key in wanted if key in self._index}
+            start_position = self._build_position
+            keys_ready = self._keys_ready
+
+        if keys_ready or self.lazy_index == LAZY_INDEX_WAIT:
+            return positions
+
+        # строки до start_position уже в индексе, остаток файла индексируем сами - за построение.
+        # Следующие промахи найдут эти строки в индексе, а не будут сканировать хвост заново
+        changes = (
+            (marker, PrimaryKey(record_id), position)
+            for marker, record_id, position in self.file_client.iter_keys(KEY_FIELD, start_position)
+        )
+        if self.multiprocess:
+            # как и построение, не трогаем строки после _indexed_size - их дочитает _refresh_index
+            changes = takewhile(lambda change: change[2] < self._indexed_size, changes)
+        while True:
+            chunk = list(islice(changes, BUILD_CHUNK_SIZE))
+            if not chunk:
+                break
+
+            with self._build_condition:
+                if self._keys_ready:
+                    break  # построение дошло до конца файла раньше
+                self._apply_build_chunk(chunk)
+
+        self._set_build_progress()
+
+        with self._build_condition:
+            return {key: self._index.get(key) for key in wanted if key in self._index}
+
+    def _index_position(self, key: PrimaryKey) -> Optional[int]:
+        """ Позиция актуальной версии записи или None, если ее нет в индексе """
+        try:
+            return self._index.get(key)
+        except RecordNotFound:
+            return None
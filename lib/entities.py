@@ -1,15 +1,18 @@
-from dataclasses import dataclass, asdict
-from typing import Dict, Any, Protocol
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Dict, Any, Protocol, List, Callable, Tuple
 
 
 class PrimaryKey(int):
     """ Тип данных, обозначающий первичный ключ """
-    ...
+    __slots__ = ()  # без __dict__ у каждого ключа
 
 
 @dataclass
 class DataProtocol(Protocol):
     """ Интерфейс для сущностей """
+    __slots__ = ()  # чтобы наследники со __slots__ не получали __dict__
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "DataProtocol":
         """ десериализация """
@@ -19,10 +22,43 @@ class DataProtocol(Protocol):
         """ сериализация """
         ...
 
+    @classmethod
+    def compile_loader(cls, field_names: List[str]) -> Callable[[List[str]], "DataProtocol"]:
+        """
+            Собирает функцию десериализации из списка колонок, идущих в порядке field_names
+            По умолчанию собирает словарь и вызывает from_dict
+        """
+        def load(row: List[str]) -> "DataProtocol":
+            return cls.from_dict(dict(zip(field_names, row)))
+
+        return load
+
+    @classmethod
+    def compile_field_loader(cls, field_name: str) -> Callable[[str], Any]:
+        """
+            Собирает функцию, приводящую значение одной колонки из файла к типу поля сущности
+            Нужна, чтобы разбирать только часть колонок, не создавая сущность. По умолчанию значение - строка
+        """
+        return str
+
+    @classmethod
+    def compile_dumper(cls, field_names: List[str]) -> Callable[["DataProtocol"], Tuple[Any, ...]]:
+        """
+            Собирает функцию сериализации в кортеж значений в порядке field_names
+            По умолчанию вызывает as_dict
+        """
+        def dump(entity: "DataProtocol") -> Tuple[Any, ...]:
+            entity_as_dict = entity.as_dict()
+            return tuple(entity_as_dict[field_name] for field_name in field_names)
+
+        return dump
+
 
 @dataclass
 class Student(DataProtocol):
     """ Реализация интерфейса DataProtocol для сущности студента """
+    __slots__ = ("record_id", "first_name", "last_name", "birthday_date")
+
     record_id: PrimaryKey
     first_name: str
     last_name: str
@@ -44,5 +80,35 @@ class Student(DataProtocol):
             birthday_date=data["birthday_date"],
         )
 
+    @classmethod
+    def compile_loader(cls, field_names: List[str]) -> Callable[[List[str]], "Student"]:
+        # номера колонок вычисляем один раз, дальше конструктор вызывается без промежуточного словаря
+        record_id = field_names.index("record_id")
+        first_name = field_names.index("first_name")
+        last_name = field_names.index("last_name")
+        birthday_date = field_names.index("birthday_date")
+
+        def load(row: List[str]) -> "Student":
+            return cls(PrimaryKey(row[record_id]), row[first_name], row[last_name], row[birthday_date])
+
+        return load
+
+    @classmethod
+    def compile_field_loader(cls, field_name: str) -> Callable[[str], Any]:
+        return PrimaryKey if field_name == "record_id" else str
+
+    @classmethod
+    def compile_dumper(cls, field_names: List[str]) -> Callable[["Student"], Tuple[Any, ...]]:
+        if len(field_names) == 1:
+            # attrgetter с одним атрибутом отдает значение, а не кортеж
+            return lambda student: (getattr(student, field_names[0]),)
+
+        return attrgetter(*field_names)
+
     def as_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        return {
+            "record_id": self.record_id,
+            "first_name": self.first_name,
+            "last_name": self.last_name,
+            "birthday_date": self.birthday_date,
+        }
@@ -4,3 +4,15 @@ class RecordNotFound(Exception):
 
 class DuplicateRecordId(Exception):
     ...
+
+
+class InvalidFile(ValueError):
+    """ Файла нет или он не в том формате, который ожидает клиент """
+
+
+class StaleIndex(ValueError):
+    """ Позиция из индекса указывает на другую запись: индекс не соответствует файлу """
+
+
+class NotSupported(Exception):
+    """ Операция не поддерживается форматом файла """
@@ -1,14 +1,34 @@
+import atexit
+import locale
+import mmap
+import os
+import threading
+import weakref
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import Type, List, Iterable, Tuple, TypeVar, Generic
+from time import perf_counter
+from typing import Type, List, Iterable, Iterator, Tuple, TypeVar, Generic, Optional, BinaryIO, Callable, Dict
 
 from lib.entities import DataProtocol
+from lib.file_lock import FileLock, lock_path_for
+from lib.metrics import Metrics, BYTES_READ, DECODE_SECONDS, READ_SECONDS
+from lib.parallel_index import scan_keys_parallel
 
 EntityType = TypeVar("EntityType", bound=DataProtocol)  # Дженерик
 
+# Маркеры в начале строки. Строка без маркера - добавленная запись
+UPDATE_MARKER = "~"  # новая версия записи с тем же ключом
+DELETE_MARKER = "!"  # запись с этим ключом удалена (заполнена только колонка ключа)
+MARKERS = (UPDATE_MARKER, DELETE_MARKER)
+
 
 @dataclass
 class FileDataClient(Generic[EntityType]):
-    """ Клиент для чтения сущностей из файла """
+    """
+        Клиент для чтения сущностей из файла
+        Файл только дописывается: изменение записи - это новая строка с UPDATE_MARKER,
+        удаление - строка с DELETE_MARKER. Устаревшие строки убирает compact
+    """
     file_path: str
     # тип сущности, в который записи будут приводится.
     # Должен соответсвовать интерфейсу DataProtocol
@@ -16,24 +36,418 @@ class FileDataClient(Generic[EntityType]):
 
     delimiter: str = ","   # разделитель в файле
     new_line: str = "\n"   # символ, обозначабщий новую строку
+    encoding: Optional[str] = None  # кодировка файла. None - кодировка системы по умолчанию
+    # держать файл открытым и отображенным в память (mmap): чтение по позиции - срез отображения, без блокировок.
+    # Такой клиент нужно закрыть через close() или использовать как контекстный менеджер
+    keep_open: bool = False
+    metrics: Optional[Metrics] = None  # сбор метрик. None - метрики не собираются
+    # групповая запись: сколько байт копить в памяти перед записью в файл одной операцией. 0 - писать сразу.
+    # Позиция записи известна сразу, поэтому пока в буфере есть строки, дописывать файл должен только этот клиент
+    buffer_size: int = 0
+    flush_interval: Optional[float] = None  # через сколько секунд сбрасывать буфер. None - только по размеру
+    fsync: bool = False  # вызывать fsync после каждой записи в файл (при буфере - после каждой группы)
 
     _field_names: List[str] = field(default_factory=list, init=False)  # приватное свойство с названиями колонок в файле
+    _file: Optional[BinaryIO] = field(default=None, init=False)  # открытый файл (при keep_open)
+    _mapping: Optional[mmap.mmap] = field(default=None, init=False)  # отображение файла в память (при keep_open)
+    _lock: FileLock = field(init=False)  # межпроцессная блокировка записи
+    _file_encoding: str = field(default="", init=False)  # кодировка для чтения/записи байт
+    _data_start: int = field(default=0, init=False)  # позиция первой записи (сразу после заголовков)
+    _loader: Callable[[List[str]], EntityType] = field(init=False)  # десериализатор, собранный под колонки файла
+    _dumper: Callable[[EntityType], tuple] = field(init=False)  # сериализатор, собранный под колонки файла
+    _write_lock: threading.RLock = field(default_factory=threading.RLock, init=False)  # запись и буфер в процессе
+    _pending: Dict[int, bytes] = field(default_factory=dict, init=False)  # буфер: позиция -> еще не записанная строка
+    _pending_bytes: int = field(default=0, init=False)
+    _buffer_end: int = field(default=0, init=False)  # позиция следующей строки в буфере
+    _flush_timer: Optional[threading.Timer] = field(default=None, init=False)
 
     def __post_init__(self):
-        with open(self.file_path, "r") as file:
+        with open(self.file_path, "r", encoding=self.encoding) as file:
             # Читаем первую линию (это названия колонок)
             # Сначала чистим строку от спец символов, затем разбиваем по разделителю
             self._field_names = (
                 file.readline().rstrip(self.new_line).split(self.delimiter)
             )
 
-    def iter_read(self) -> Iterable[Tuple[EntityType, int]]:
+        with open(self.file_path, "rb") as file:
+            self._data_start = len(file.readline())
+
+        self._file_encoding = self.encoding or locale.getpreferredencoding(False)
+        self._lock = FileLock(lock_path_for(self.file_path))  # lock-файл создается при первом захвате
+        self._loader = self.entity_type.compile_loader(self._field_names)
+        self._dumper = self.entity_type.compile_dumper(self._field_names)
+
+        if self.keep_open:
+            self._file = open(self.file_path, "a+b")
+            self._remap()
+
+        if self.buffer_size > 0:
+            atexit.register(_flush_at_exit, weakref.ref(self))
+
+    def __enter__(self) -> "FileDataClient[EntityType]":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+            Межпроцессная блокировка записи в файл. Реентерабельна, можно брать поверх write:
+            with client.locked():
+                ...  # проверки, которые должны быть атомарны вместе с записью
+                client.write(entity)
+            Блокировка потоков берется раньше файловой, в том же порядке, что и при сбросе буфера
+        """
+        with self._write_lock, self._lock:
+            yield
+
+    def size(self) -> int:
+        """ Текущий размер файла в байтах. Буфер сначала сбрасывается в файл """
+        self.flush()
+        return self._file_size()
+
+    def position_for_size(self, size: int) -> int:
+        """ Позиция строки, с которой начинается файл, дописанный после того, как его размер был size """
+        return size
+
+    def flush(self):
+        """
+            Записывает строки из буфера в файл. Буфер сбрасывается и сам: по buffer_size и flush_interval,
+            при close(), перед полными проходами по файлу и при завершении интерпретатора
+        """
+        if self._pending:
+            with self.locked():
+                self._flush_pending()
+
+    def close(self):
+        """ Сбрасывает буфер, закрывает файл и отображение, если клиент держал их открытыми """
+        self.flush()
+
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        self._lock.close()
+
+    def iter_read(self, start_position: Optional[int] = None) -> Iterable[Tuple[EntityType, int]]:
         """
             Генератор, итерирующийся по записям в файле
             Отдает сущность и ее позицию в файле
+            Если передан start_position, чтение начинается с этой позиции (она должна указывать на начало записи)
+            Отдаются все версии записей, строки удаления пропускаются. Актуальность версий проверяет
+            вызывающий (см. iter_changes)
          """
-        with open(self.file_path, "r") as file:
-            file.readline()  # пропускаем первую строку (это заголовки)
+        for line, position in self._iter_lines(start_position):
+            if not line.startswith(DELETE_MARKER):
+                yield self._load_entity(line), position  # десериализованная запись, ее позицию в файле
+
+    def iter_rows(self, start_position: Optional[int] = None) -> Iterable[Tuple[List[str], int]]:
+        """
+            Как iter_read, но отдает строки, разбитые на колонки (в порядке field_names), без десериализации
+            Нужен, чтобы отбирать записи по отдельным колонкам, не собирая сущность целиком
+        """
+        for line, position in self._iter_lines(start_position):
+            if not line.startswith(DELETE_MARKER):
+                yield self._split_line(line), position
+
+    def iter_changes(
+        self, key_field: str, start_position: Optional[int] = None
+    ) -> Iterable[Tuple[str, int, Optional[EntityType], int]]:
+        """
+            Отдает все строки файла как изменения: (маркер, ключ, сущность, позиция)
+            Маркер - пустая строка для добавления, UPDATE_MARKER или DELETE_MARKER. При удалении сущность - None
+        """
+        key_column = self._field_names.index(key_field)
+
+        for line, position in self._iter_lines(start_position):
+            marker, row = self._split_marked_line(line)
+            entity = None if marker == DELETE_MARKER else self._load_row(row, line)
+            yield marker, int(row[key_column]), entity, position
+
+    @property
+    def field_names(self) -> List[str]:
+        """ Названия колонок в порядке их следования в файле """
+        return list(self._field_names)
+
+    def iter_keys(
+        self, key_field: str, start_position: Optional[int] = None, workers: int = 1
+    ) -> Iterable[Tuple[str, int, int]]:
+        """
+            Как iter_changes, но не десериализует сущности: отдает маркер, значение колонки key_field и позицию
+            При workers > 1 файл делится на диапазоны, которые сканируются в пуле процессов
+        """
+        if start_position is None:
+            start_position = self._data_start
+
+        self.flush()  # сканируется файл на диске
+        return scan_keys_parallel(
+            self.file_path,
+            start_position,
+            self._field_names.index(key_field),
+            self._encode(self.delimiter),
+            self._encode("".join(MARKERS)),
+            workers,
+        )
+
+    def iter_latest(self, key_field: str) -> Iterable[Tuple[EntityType, int]]:
+        """
+            Отдает только актуальные версии записей (без устаревших и удаленных) и их позиции, в порядке позиций
+            Ключи сначала собираются без десериализации (iter_keys), затем читаются только нужные строки
+        """
+        latest: Dict[int, int] = {}  # ключ -> позиция актуальной версии
+
+        for marker, key, position in self.iter_keys(key_field):
+            if marker == DELETE_MARKER:
+                latest.pop(key, None)
+            else:
+                latest[key] = position
+
+        return self.read_at_positions(latest.values())
+
+    def read_at_position(self, position: int) -> EntityType:
+        if self.metrics is None:
+            return self._read_at_position(position)
+
+        with self.metrics.timer(READ_SECONDS):
+            return self._read_at_position(position)
+
+    def read_at_positions(self, positions: Iterable[int]) -> Iterable[Tuple[EntityType, int]]:
+        """
+            Читает записи по нескольким позициям за одно открытие файла
+            Позиции сортируются, поэтому файл читается последовательно от начала к концу
+            Отдает сущность и ее позицию в файле
+        """
+        sorted_positions = sorted(positions)
+        pending = self._pending  # снимок: при сбросе буфер подменяется новым после записи в файл
+
+        if self._file is not None:
+            for position in sorted_positions:
+                line = pending.get(position)
+                if line is not None:
+                    yield self._load_entity(self._decode(line)), position
+                else:
+                    yield self._load_entity(self._read_mapped_line(position)[0]), position
+            return
+
+        with open(self.file_path, "r", encoding=self.encoding) as file:
+            for position in sorted_positions:
+                line = pending.get(position)
+                if line is not None:
+                    yield self._load_entity(self._decode(line)), position
+                    continue
+
+                file.seek(position)
+                yield self._load_entity(file.readline()), position
+
+    def write(self, entity: EntityType) -> int:
+        return self._append_line(self._dump_entity(entity))
+
+    def write_update(self, entity: EntityType) -> int:
+        """ Дописывает новую версию записи. Отдает ее позицию. Старая версия остается в файле до compact """
+        return self._append_line(UPDATE_MARKER + self._dump_entity(entity))
+
+    def write_tombstone(self, key_field: str, key: int) -> int:
+        """ Дописывает строку удаления записи с ключом key. Отдает ее позицию """
+        row = [""] * len(self._field_names)
+        row[self._field_names.index(key_field)] = str(key)
+        return self._append_line(DELETE_MARKER + self.delimiter.join(row))
+
+    def write_many(self, entities: Iterable[EntityType]) -> List[int]:
+        """
+            Записывает сразу несколько сущностей одной операцией записи
+            Отдает позиции записей в файле
+        """
+        lines = [self._encode(self._dump_entity(entity) + self.new_line) for entity in entities]
+
+        if self.buffer_size > 0:
+            return self._buffer_lines(lines)
+
+        if self._file is not None:
+            with self.locked():
+                return self._write_lines(self._file, lines)
+
+        with self.locked(), open(self.file_path, "ab") as file:
+            return self._write_lines(file, lines)
+
+    def compact(self, positions: Iterable[int]) -> Dict[int, int]:
+        """
+            Переписывает файл, оставляя только строки с позициями positions (обычно - актуальные версии записей)
+            Маркеры новых версий снимаются. Новый файл пишется рядом и атомарно подменяет старый
+            Отдает словарь старая позиция -> новая позиция
+        """
+        new_positions = {}
+        update_marker = self._encode(UPDATE_MARKER)
+        new_line = self._encode(self.new_line)
+        tmp_path = f"{self.file_path}.{os.getpid()}.compact"
+
+        with self.locked():
+            self._flush_pending()
+
+            with open(self.file_path, "rb") as source, open(tmp_path, "wb") as target:
+                target.write(source.readline())  # заголовки
+
+                for position in sorted(positions):
+                    source.seek(position)
+                    line = source.readline()
+
+                    if line.startswith(update_marker):
+                        line = line[len(update_marker):]
+                    if not line.endswith(new_line):  # последняя строка файла без переноса
+                        line += new_line
+
+                    new_positions[position] = target.tell()
+                    target.write(line)
+
+                target.flush()
+                os.fsync(target.fileno())  # на диске должен оказаться полный файл до подмены
+
+            if self._file is not None and os.name == "nt":
+                # в Windows открытый и отображенный в память файл не подменить - закрываем его на время подмены.
+                # Чтение из других потоков в это время падает с ValueError
+                if self._mapping is not None:
+                    self._mapping.close()
+                self._file.close()
+
+            os.replace(tmp_path, self.file_path)
+
+            if self._file is not None:
+                # файл и отображение открываем заранее и подменяем вместе: читатели не должны застать клиент без отображения.
+                # Старые файл и отображение закроются, когда на них не останется ссылок, см. _remap
+                new_file = open(self.file_path, "a+b")
+                new_mapping = mmap.mmap(new_file.fileno(), os.fstat(new_file.fileno()).st_size, access=mmap.ACCESS_READ)
+                self._file, self._mapping = new_file, new_mapping
+
+        return new_positions
+
+    def _append_line(self, line: str) -> int:
+        """ Дописывает строку в конец файла. Отдает ее позицию """
+        if self.buffer_size > 0:
+            return self._buffer_lines([self._encode(line + self.new_line)])[0]
+
+        if self._file is not None:
+            encoded_line = self._encode(line + self.new_line)
+            with self.locked():
+                self._file.seek(0, os.SEEK_END)
+                position = self._file.tell()
+                self._file.write(encoded_line)
+                self._file.flush()  # сразу сбрасываем буфер, чтобы запись была видна через отображение
+                self._sync(self._file)
+
+            return position
+
+        with self.locked(), open(self.file_path, "a", encoding=self.encoding) as file:
+            position = file.tell()  # получили текущую позицию в файле
+            file.write(line + self.new_line)
+            self._sync(file)
+            return position  # отдаем позицию записи в файле
+
+    def _write_lines(self, file: BinaryIO, lines: List[bytes]) -> List[int]:
+        """ Дописывает строки в конец файла одной записью. Отдает их позиции """
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        positions = []
+
+        for line in lines:
+            positions.append(position)
+            position += len(line)  # позицию следующей записи считаем по длине закодированной строки
+
+        file.write(b"".join(lines))
+        file.flush()
+        self._sync(file)
+        return positions
+
+    def _buffer_lines(self, lines: List[bytes]) -> List[int]:
+        """ Кладет строки в буфер и назначает им позиции. Сбрасывает буфер, если он заполнился """
+        positions = []
+
+        with self._write_lock:
+            if not self._pending:
+                self._buffer_end = self._file_size()  # новая группа начинается с конца файла
+                if self.flush_interval is not None:
+                    self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+
+            for line in lines:
+                positions.append(self._buffer_end)
+                self._pending[self._buffer_end] = line
+                self._buffer_end += len(line)
+                self._pending_bytes += len(line)
+
+            if self._pending_bytes >= self.buffer_size:
+                self.flush()
+
+        return positions
+
+    def _flush_pending(self):
+        """ Пишет буфер в файл одной операцией. Вызывается под locked() """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+        if not self._pending:
+            return
+
+        pending = self._pending
+        file = self._file if self._file is not None else open(self.file_path, "ab")
+
+        try:
+            file.seek(0, os.SEEK_END)
+            if file.tell() != next(iter(pending)):
+                raise RuntimeError(
+                    f"{self.file_path} was appended by another writer while records were buffered"
+                )
+
+            self._write_lines(file, list(pending.values()))
+        finally:
+            if file is not self._file:
+                file.close()
+
+        # буфер подменяем только после записи: читатели со старым снимком найдут строки в нем, с новым - в файле
+        self._pending = {}
+        self._pending_bytes = 0
+
+    def _sync(self, file):
+        """ fsync, если он включен: запись должна оказаться на диске, а не только в кэше ОС """
+        if self.fsync:
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _file_size(self) -> int:
+        if self._file is not None:
+            return os.fstat(self._file.fileno()).st_size
+        return os.stat(self.file_path).st_size
+
+    def _read_at_position(self, position: int) -> EntityType:
+        line = self._pending.get(position)
+        if line is not None:  # запись еще в буфере
+            return self._load_entity(self._decode(line))
+
+        if self._file is not None:
+            return self._load_entity(self._read_mapped_line(position)[0])
+
+        with open(self.file_path, "r", encoding=self.encoding) as file:
+            file.seek(position)  # перемещаем курсор файла на нужную позицию
+            return self._load_entity(file.readline())  # десериализуем считанную линию
+
+    def _iter_lines(self, start_position: Optional[int]) -> Iterable[Tuple[str, int]]:
+        """ Отдает строки с записями и их позиции в файле """
+        self.flush()  # читается файл на диске, буфер должен быть уже в нем
+
+        if self._file is not None:
+            yield from self._iter_mapped_lines(start_position)
+            return
+
+        with open(self.file_path, "r", encoding=self.encoding) as file:
+            if start_position is None:
+                file.readline()  # пропускаем первую строку (это заголовки)
+            else:
+                file.seek(start_position)
             position = file.tell()  # Запоминаем позицию файла
 
             while True:  # Читаем пока не дойдем до конца
@@ -42,36 +456,85 @@ class FileDataClient(Generic[EntityType]):
                 if not line:  # если считанной линии нет, значит дошли до конца файла
                     return
 
-                yield self._load_entity(line), position  # десериализованная запись, ее позицию в файле
+                yield line, position
                 position = file.tell()  # обновляем позицию в файле
 
-    def read_at_position(self, position: int) -> EntityType:
-        with open(self.file_path, "r") as file:
-            file.seek(position)  # перемещаем курсор файла на нужную позицию
-            return self._load_entity(file.readline())  # десериализуем считанную линию
+    def _iter_mapped_lines(self, start_position: Optional[int]) -> Iterable[Tuple[str, int]]:
+        """ _iter_lines для открытого клиента: идем по отображению в памяти """
+        self._remap()  # файл мог вырасти с прошлого обращения
 
-    def write(self, entity: EntityType) -> int:
-        with open(self.file_path, "a") as file:
-            position = file.tell()  # получили текущую позицию в файле
-            file.write(self._dump_entity(entity) + self.new_line)  # сериализовали сущность и записали в файл
-            return position  # отдаем позицию записи в файле
+        position = self._data_start if start_position is None else start_position
+        while position < len(self._mapping):
+            line, next_position = self._read_mapped_line(position)
+            yield line, position
+            position = next_position
+
+    def _read_mapped_line(self, position: int) -> Tuple[str, int]:
+        """ Читает строку из отображения. Отдает строку и позицию следующей строки """
+        mapping = self._mapping  # работаем со снимком: другой поток может подменить отображение
+        if position >= len(mapping):
+            mapping = self._remap()  # позиция за пределами отображения - файл дописан, обновляем отображение
+
+        new_line = self._encode(self.new_line)
+        end = mapping.find(new_line, position)
+
+        if end == -1:  # последняя строка без переноса
+            end = next_position = len(mapping)
+        else:
+            next_position = end + len(new_line)
+
+        return self._decode(mapping[position:end]).rstrip("\r"), next_position
+
+    def _remap(self) -> mmap.mmap:
+        """ Отображает файл в память заново, если он вырос. Отдает актуальное отображение """
+        mapping, file = self._mapping, self._file
+        size = os.fstat(file.fileno()).st_size
+        if mapping is not None and len(mapping) == size:
+            return mapping
+
+        # старое отображение не закрываем явно: его может читать другой поток,
+        # оно закроется само, когда на него не останется ссылок
+        self._mapping = mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+        return self._mapping
+
+    def _encode(self, data: str) -> bytes:
+        return data.encode(self._file_encoding)
+
+    def _decode(self, data: bytes) -> str:
+        return data.decode(self._file_encoding)
 
     def _load_entity(self, raw_line: str) -> EntityType:
-        raw_line = raw_line.rstrip(self.new_line)  # очищаем строку от спец символа
+        return self._load_row(self._split_line(raw_line), raw_line)
+
+    def _load_row(self, row: List[str], raw_line: str) -> EntityType:
+        """ Десериализует строку, уже разбитую на колонки. raw_line нужна только для метрик """
+        if self.metrics is None:
+            return self._loader(row)
+
+        start_time = perf_counter()
+        entity = self._loader(row)
+        self.metrics.observe(DECODE_SECONDS, perf_counter() - start_time)
+        self.metrics.increment(BYTES_READ, len(self._encode(raw_line)))
+        return entity
 
-        entity_as_dict = {}
+    def _split_line(self, raw_line: str) -> List[str]:
+        return self._split_marked_line(raw_line)[1]
 
-        for idx, col in enumerate(raw_line.split(self.delimiter)):  # разбиваем строку по разделителю
-            field_name = self._field_names[idx]  # получаем имя столбца
-            entity_as_dict[field_name] = col  # кладем в словарь, где ключ - столбец
+    def _split_marked_line(self, raw_line: str) -> Tuple[str, List[str]]:
+        """ Отделяет маркер в начале строки, очищает строку от спец символа и разбивает по разделителю """
+        marker = raw_line[:1]
+        if marker not in MARKERS:
+            marker = ""
 
-        return self.entity_type.from_dict(entity_as_dict)  # десериализуем
+        return marker, raw_line[len(marker):].rstrip(self.new_line).split(self.delimiter)
 
     def _dump_entity(self, entity: EntityType) -> str:
-        raw_data = []
-        entity_as_dict = entity.as_dict()  # сериализуем
+        # сериализуем в нужном порядке колонок, приводим все к строкам и конкатенируем разделителем
+        return self.delimiter.join(map(str, self._dumper(entity)))
 
-        for field_name in self._field_names:
-            raw_data.append(str(entity_as_dict[field_name]))  # приводим все к строкам в нужном порядке
 
-        return self.delimiter.join(raw_data)  # Все элементы списка конкатенируем разделителем
+def _flush_at_exit(client_ref: "weakref.ref[FileDataClient]"):
+    """ Сбрасывает буфер клиента при завершении интерпретатора, если клиент еще жив """
+    client = client_ref()
+    if client is not None:
+        client.flush()
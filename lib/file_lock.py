@@ -0,0 +1,83 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import BinaryIO, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@dataclass
+class FileLock:
+    """
+        Межпроцессная блокировка на отдельном lock-файле (advisory: защищает только тех, кто тоже ее берет)
+        Внутри процесса блокировка реентерабельна и заодно сериализует потоки
+    """
+    path: str
+
+    _file: Optional[BinaryIO] = field(default=None, init=False)
+    _depth: int = field(default=0, init=False)  # глубина вложенных захватов в текущем процессе
+    _thread_lock: threading.RLock = field(default_factory=threading.RLock, init=False)
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def acquire(self):
+        self._thread_lock.acquire()
+
+        if self._depth == 0:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a+b")
+                self._lock_file()
+            except BaseException:
+                self._thread_lock.release()
+                raise
+
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+
+        if self._depth == 0:
+            self._unlock_file()
+
+        self._thread_lock.release()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _lock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            return
+
+        self._file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue  # LK_LOCK сдается после 10 попыток, пробуем снова
+
+    def _unlock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            return
+
+        self._file.seek(0)
+        msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def lock_path_for(file_path: str) -> str:
+    """ Путь к lock-файлу для файла с данными """
+    return os.fspath(file_path) + ".lock"
@@ -0,0 +1,421 @@
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from dataclasses import dataclass, field
+from typing import Iterable, Tuple, Protocol, Dict, Union
+
+from lib.entities import PrimaryKey
+from lib.exceptions import DuplicateRecordId, RecordNotFound
+
+ABSENT = -1  # значение в массиве для ключей, которых нет в индексе
+MIN_CAPACITY = 16  # минимальный размер массива
+PENDING_MIN_SIZE = 1024  # минимальный размер буфера несортированных ключей в SortedArrayIndex
+DENSE_MAX_SIZE = 1 << 16  # до такого размера массива плотный индекс используется всегда
+DENSE_MAX_SPARSITY = 4  # во сколько раз размер массива может превышать кол-во ключей в плотном индексе
+
+INDEX_MODE_DENSE = "dense"
+INDEX_MODE_SPARSE = "sparse"
+INDEX_MODE_AUTO = "auto"
+
+
+class IndexProtocol(Protocol):
+    """ Интерфейс индекса record_id -> позиция в файле """
+    def __len__(self) -> int:
+        ...
+
+    def __contains__(self, key: PrimaryKey) -> bool:
+        ...
+
+    def get(self, key: PrimaryKey) -> int:
+        """ Отдает позицию записи в файле. Если ключа нет - RecordNotFound """
+        ...
+
+    def validate(self, key: PrimaryKey):
+        """ Проверяет, что ключ можно добавить в индекс. Если ключ уже есть - DuplicateRecordId """
+        ...
+
+    def add(self, key: PrimaryKey, position: int):
+        """ Добавляет ключ в индекс """
+        ...
+
+    def put(self, key: PrimaryKey, position: int):
+        """ Добавляет ключ или переставляет его на новую позицию (новая версия записи) """
+        ...
+
+    def remove(self, key: PrimaryKey):
+        """ Удаляет ключ из индекса. Если ключа нет - RecordNotFound """
+        ...
+
+    def items(self) -> Iterable[Tuple[PrimaryKey, int]]:
+        """ Отдает все пары (record_id, позиция в файле) в порядке возрастания ключей """
+        ...
+
+    def start_build(self):
+        """ Начинает построение пустого индекса: дальше ключи могут идти в любом порядке """
+        ...
+
+    def finish_build(self):
+        """ Заканчивает построение индекса """
+        ...
+
+
+@dataclass
+class ArrayIndex(IndexProtocol):
+    """
+        Плотный индекс record_id -> позиция в файле.
+        Позиции хранятся в типизированном массиве int64, индекс в массиве - это record_id
+    """
+    _positions: array = field(default_factory=lambda: array("q"), init=False)
+    _count: int = field(default=0, init=False)  # кол-во ключей в индексе
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def capacity(self) -> int:
+        """ Размер массива """
+        return len(self._positions)
+
+    def __contains__(self, key: PrimaryKey) -> bool:
+        return 0 <= key < len(self._positions) and self._positions[key] != ABSENT
+
+    def get(self, key: PrimaryKey) -> int:
+        """ Отдает позицию записи в файле """
+        if not 0 <= key < len(self._positions):
+            # Если вышли за пределы массива, значит такой записи нет
+            raise RecordNotFound(f"Student with id: {key} not found")
+
+        position = self._positions[key]
+        if position == ABSENT:
+            # Для этого ключа не нашли значения, значит такой записи нет
+            raise RecordNotFound(f"Student with id: {key} not found")
+
+        return position
+
+    def validate(self, key: PrimaryKey):
+        """ Проверяет, что ключ можно добавить в индекс """
+        if key < 0:
+            raise ValueError(f"Record id must be non-negative, got {key}")
+
+        if key in self:
+            # Если такой индес уже есть, выкидываем ошибку, данные некорректны
+            raise DuplicateRecordId(f"Found duplicate record id {key}")
+
+    def add(self, key: PrimaryKey, position: int):
+        """ Добавляет ключ в индекс """
+        self.validate(key)
+
+        if key >= len(self._positions):
+            self._expand(key)
+
+        self._positions[key] = position
+        self._count += 1
+
+    def put(self, key: PrimaryKey, position: int):
+        if key not in self:
+            self.add(key, position)
+            return
+
+        self._positions[key] = position
+
+    def remove(self, key: PrimaryKey):
+        if key not in self:
+            raise RecordNotFound(f"Student with id: {key} not found")
+
+        self._positions[key] = ABSENT
+        self._count -= 1
+
+    def items(self) -> Iterable[Tuple[PrimaryKey, int]]:
+        """ Отдает все пары (record_id, позиция в файле) """
+        for key, position in enumerate(self._positions):
+            if position != ABSENT:
+                yield PrimaryKey(key), position
+
+    def start_build(self):
+        pass
+
+    def finish_build(self):
+        pass
+
+    def _expand(self, key: PrimaryKey):
+        """ Расширяет массив как минимум в два раза, чтобы вместить ключ """
+        new_size = max(key + 1, len(self._positions) * 2, MIN_CAPACITY)
+        self._positions.extend(array("q", [ABSENT]) * (new_size - len(self._positions)))
+
+
+@dataclass
+class SortedArrayIndex(IndexProtocol):
+    """
+        Разреженный индекс record_id -> позиция в файле для больших или разбросанных ключей.
+        Ключи и позиции хранятся в двух отсортированных массивах int64, поиск - бинарный. Сложность O(log n)
+        Ключи, добавленные не по порядку, копятся в небольшом словаре и периодически вливаются в массивы
+
+        Чтение безопасно при одновременной записи из другого потока:
+        пара массивов подменяется одним присваиванием, позиция дописывается раньше ключа
+        Удаленные ключи остаются в массивах с позицией ABSENT до следующего слияния
+    """
+    _sorted: Tuple[array, array] = field(default_factory=lambda: (array("q"), array("q")), init=False)
+    _pending: Dict[int, int] = field(default_factory=dict, init=False)
+    _removed: int = field(default=0, init=False)  # кол-во удаленных ключей, оставшихся в массивах
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[PrimaryKey, int]]) -> "SortedArrayIndex":
+        """ Строит индекс из пар, отсортированных по ключу """
+        index = cls()
+        keys, positions = index._sorted
+        for key, position in items:
+            keys.append(key)
+            positions.append(position)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._sorted[0]) - self._removed + len(self._pending)
+
+    def __contains__(self, key: PrimaryKey) -> bool:
+        pending = self._pending  # буфер читаем раньше массивов, см. _merge_pending
+        if key in pending:
+            return True
+
+        keys, positions = self._sorted
+        idx = self._find(keys, key)
+        return idx is not None and positions[idx] != ABSENT
+
+    def get(self, key: PrimaryKey) -> int:
+        position = self._pending.get(key)
+        if position is not None:
+            return position
+
+        keys, positions = self._sorted
+        idx = self._find(keys, key)
+        if idx is None or positions[idx] == ABSENT:
+            raise RecordNotFound(f"Student with id: {key} not found")
+
+        return positions[idx]
+
+    def validate(self, key: PrimaryKey):
+        if key in self:
+            raise DuplicateRecordId(f"Found duplicate record id {key}")
+
+    def add(self, key: PrimaryKey, position: int):
+        self.validate(key)
+        keys, positions = self._sorted
+
+        if not self._pending and (not keys or key > keys[-1]):
+            # ключи обычно идут по возрастанию - просто дописываем в конец
+            positions.append(position)
+            keys.append(key)
+            return
+
+        idx = self._find(keys, key)
+        if idx is not None:
+            # ключ был удален и остался в массиве - возвращаем его на место
+            positions[idx] = position
+            self._removed -= 1
+            return
+
+        self._pending[key] = position
+        if len(self._pending) > max(PENDING_MIN_SIZE, len(keys) // 16):
+            self._merge_pending()
+
+    def put(self, key: PrimaryKey, position: int):
+        if key in self._pending:
+            self._pending[key] = position
+            return
+
+        keys, positions = self._sorted
+        idx = self._find(keys, key)
+        if idx is not None and positions[idx] != ABSENT:
+            positions[idx] = position
+            return
+
+        self.add(key, position)
+
+    def remove(self, key: PrimaryKey):
+        if self._pending.pop(key, None) is not None:
+            return
+
+        keys, positions = self._sorted
+        idx = self._find(keys, key)
+        if idx is None or positions[idx] == ABSENT:
+            raise RecordNotFound(f"Student with id: {key} not found")
+
+        positions[idx] = ABSENT
+        self._removed += 1
+
+    def items(self) -> Iterable[Tuple[PrimaryKey, int]]:
+        self._merge_pending()
+        for key, position in zip(*self._sorted):
+            if position != ABSENT:
+                yield PrimaryKey(key), position
+
+    def start_build(self):
+        pass
+
+    def finish_build(self):
+        self._merge_pending()
+
+    @staticmethod
+    def _find(keys: array, key: PrimaryKey):
+        """ Отдает индекс ключа в массиве или None """
+        idx = bisect_left(keys, key)
+        if idx < len(keys) and keys[idx] == key:
+            return idx
+        return None
+
+    def _merge_pending(self):
+        """ Вливает накопленные ключи в отсортированные массивы """
+        if not self._pending and not self._removed:
+            return
+
+        old_keys, old_positions = self._sorted
+        keys, positions = array("q"), array("q")
+        idx = 0
+
+        for pending_key, pending_position in sorted(self._pending.items()):
+            # переносим все ключи из массива, которые меньше очередного ключа из буфера
+            while idx < len(old_keys) and old_keys[idx] < pending_key:
+                self._append_alive(keys, positions, old_keys[idx], old_positions[idx])
+                idx += 1
+
+            keys.append(pending_key)
+            positions.append(pending_position)
+
+        for key, position in zip(old_keys[idx:], old_positions[idx:]):
+            self._append_alive(keys, positions, key, position)
+
+        # сначала подменяем массивы, затем очищаем буфер: читатель, увидевший пустой буфер, увидит и новые массивы
+        self._sorted = (keys, positions)
+        self._pending = {}
+        self._removed = 0
+
+    @staticmethod
+    def _append_alive(keys: array, positions: array, key: int, position: int):
+        """ При слиянии удаленные ключи выбрасываются из массивов """
+        if position != ABSENT:
+            positions.append(position)
+            keys.append(key)
+
+
+@dataclass
+class AutoIndex(IndexProtocol):
+    """
+        Индекс, сам выбирающий способ хранения по плотности ключей.
+        При построении способ выбирается один раз по всем ключам, см. finish_build.
+        Дальше плотный ArrayIndex переходит на SortedArrayIndex, как только очередной ключ сделал бы массив слишком разреженным
+    """
+    _index: Union[ArrayIndex, SortedArrayIndex] = field(default_factory=ArrayIndex, init=False)
+    _dense: bool = field(default=True, init=False)  # в _index плотный ArrayIndex
+    _building: bool = field(default=False, init=False)
+    # при построении ключи, которые сделали бы массив слишком разреженным, копятся здесь до finish_build
+    _overflow: Dict[int, int] = field(default_factory=dict, init=False)
+
+    def __len__(self) -> int:
+        return len(self._index) + len(self._overflow)
+
+    def __contains__(self, key: PrimaryKey) -> bool:
+        overflow = self._overflow  # буфер читаем раньше индекса, см. finish_build
+        return key in overflow or key in self._index
+
+    def get(self, key: PrimaryKey) -> int:
+        position = self._overflow.get(key)
+        if position is not None:
+            return position
+
+        return self._index.get(key)
+
+    def validate(self, key: PrimaryKey):
+        if key in self:
+            raise DuplicateRecordId(f"Found duplicate record id {key}")
+
+    def add(self, key: PrimaryKey, position: int):
+        if self._building:
+            self.validate(key)  # ключ может лежать в буфере
+            if not self._dense:
+                self._index.add(key, position)
+            elif self._is_too_sparse(key):
+                self._overflow[key] = position
+            else:
+                capacity = self._index.capacity
+                self._index.add(key, position)
+                if self._overflow and self._index.capacity != capacity:
+                    self._drain_overflow()
+            return
+
+        if self._dense and self._is_too_sparse(key):
+            self._index = SortedArrayIndex.from_items(self._index.items())
+            self._dense = False
+
+        self._index.add(key, position)
+
+    def put(self, key: PrimaryKey, position: int):
+        if key in self._overflow:
+            self._overflow[key] = position
+            return
+
+        if key in self._index:
+            self._index.put(key, position)  # ключ уже есть - разреженность массива не меняется
+            return
+
+        self.add(key, position)
+
+    def remove(self, key: PrimaryKey):
+        if self._overflow.pop(key, None) is not None:
+            return
+
+        self._index.remove(key)
+
+    def items(self) -> Iterable[Tuple[PrimaryKey, int]]:
+        if not self._overflow:
+            return self._index.items()
+
+        return merge(self._index.items(), sorted(self._overflow.items()))
+
+    def start_build(self):
+        self._building = True
+
+    def finish_build(self):
+        """ Выбирает способ хранения по всем ключам: в массив или в отсортированные массивы одной сортировкой """
+        self._building = False
+        overflow = self._overflow
+        if not overflow:
+            return
+
+        max_key = max(overflow)
+        if min(overflow) >= 0 and (max_key < DENSE_MAX_SIZE or max_key < len(self) * DENSE_MAX_SPARSITY):
+            for key, position in overflow.items():
+                self._index.add(key, position)
+        else:
+            self._index = SortedArrayIndex.from_items(merge(self._index.items(), sorted(overflow.items())))
+            self._dense = False
+
+        # буфер очищаем последним: читатель, увидевший пустой буфер, увидит и новый индекс
+        self._overflow = {}
+
+    def _drain_overflow(self):
+        """ Переносит из буфера в выросший массив ключи, которые теперь в него помещаются """
+        capacity = self._index.capacity
+        for key in [key for key in self._overflow if 0 <= key < capacity]:
+            self._index.add(key, self._overflow[key])
+            del self._overflow[key]  # после переноса: читатель найдет ключ в буфере или в массиве
+
+    def _is_too_sparse(self, key: PrimaryKey) -> bool:
+        if key < 0:
+            return True  # отрицательные ключи в массив не положить
+
+        return (
+            key >= self._index.capacity
+            and key >= DENSE_MAX_SIZE
+            and key >= (len(self) + 1) * DENSE_MAX_SPARSITY  # с ключами из буфера
+        )
+
+
+def create_index(mode: str = INDEX_MODE_AUTO) -> IndexProtocol:
+    """ Создает индекс по названию режима: dense, sparse или auto """
+    if mode == INDEX_MODE_DENSE:
+        return ArrayIndex()
+    if mode == INDEX_MODE_SPARSE:
+        return SortedArrayIndex()
+    if mode == INDEX_MODE_AUTO:
+        return AutoIndex()
+
+    raise ValueError(f"Unknown index mode: {mode}")
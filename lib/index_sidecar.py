@@ -0,0 +1,139 @@
+import os
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+
+# Заголовок файла индекса:
+# сигнатура, версия, кол-во записей, размер и mtime файла с данными, контрольная сумма данных
+HEADER = struct.Struct("<4sHqqqI")
+ENTRY = struct.Struct("<qq")  # запись индекса - пара (record_id, позиция)
+MAGIC = b"SFIX"
+VERSION = 2  # в версии 1 контрольная сумма считалась только по первому и последнему блоку данных
+CHECKSUM_CHUNK_SIZE = 1 << 20  # файл с данными читается для контрольной суммы кусками этого размера
+
+
+def data_checksum(data_path: str, size: int, start: int = 0, checksum: int = 0) -> int:
+    """
+        Контрольная сумма (crc32) первых size байт файла с данными. Файл читается кусками, а не целиком
+        Чтобы не перечитывать дописанный файл, можно продолжить сумму checksum, посчитанную по первым start байтам
+    """
+    with open(data_path, "rb") as file:
+        file.seek(start)
+        position = start
+
+        while position < size:
+            chunk = file.read(min(CHECKSUM_CHUNK_SIZE, size - position))
+            if not chunk:
+                break  # файл короче size
+
+            checksum = zlib.crc32(chunk, checksum)
+            position += len(chunk)
+
+    return checksum
+
+
+@dataclass
+class IndexSidecar:
+    """
+        Файл-спутник, в котором хранится построенный индекс (record_id -> позиция в файле с данными).
+        Позволяет не сканировать весь файл с данными при каждом запуске
+        Записи дописываются в порядке изменений: пара с новой позицией - новая версия записи,
+        с позицией -1 (index.ABSENT) - удаление
+    """
+    path: str
+
+    def load(self, data_path: str) -> Optional[Tuple[array, int]]:
+        """
+            Загружает сохраненный индекс.
+            Отдает плоский массив пар (record_id, позиция) и позицию в файле с данными,
+            до которой индекс актуален. Если индекс отсутствует или не соответствует данным - None
+        """
+        try:
+            with open(self.path, "rb") as file:
+                raw_header = file.read(HEADER.size)
+                if len(raw_header) != HEADER.size:
+                    return None
+
+                magic, version, count, data_size, data_mtime, checksum = HEADER.unpack(raw_header)
+                if magic != MAGIC or version != VERSION:
+                    return None
+
+                entries = array("q")
+                entries.frombytes(file.read(count * ENTRY.size))
+        except (OSError, ValueError):
+            return None
+
+        if len(entries) != count * 2:
+            return None  # файл индекса обрезан
+
+        stat = os.stat(data_path)
+        if stat.st_size < data_size:
+            return None  # файл с данными уменьшился, индекс не актуален
+
+        if stat.st_size != data_size or stat.st_mtime_ns != data_mtime:
+            # файл изменился или дописан, проверяем, что проиндексированная часть осталась прежней
+            if data_checksum(data_path, data_size) != checksum:
+                return None
+
+        if sys.byteorder == "big":
+            entries.byteswap()  # на диске храним в little-endian
+
+        return entries, data_size
+
+    def save(self, data_path: str, entries: Iterable[Tuple[int, int]]):
+        """ Полностью перезаписывает индекс. Пишем во временный файл и атомарно подменяем """
+        flat_entries = array("q")
+        for record_id, position in entries:
+            flat_entries.append(record_id)
+            flat_entries.append(position)
+
+        if sys.byteorder == "big":
+            flat_entries.byteswap()
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"  # индекс могут сохранять несколько процессов
+        with open(tmp_path, "wb") as file:
+            file.write(self._make_header(data_path, len(flat_entries) // 2))
+            file.write(flat_entries.tobytes())
+
+        os.replace(tmp_path, self.path)
+
+    def append(self, data_path: str, entries: Iterable[Tuple[int, int]]):
+        """ Дописывает записи в конец индекса и обновляет заголовок """
+        try:
+            file = open(self.path, "r+b")
+        except FileNotFoundError:
+            return self.save(data_path, entries)
+
+        with file:
+            _, version, count, data_size, _, checksum = HEADER.unpack(file.read(HEADER.size))
+            if version != VERSION:
+                data_size, checksum = 0, 0  # сумма прежней версии считалась иначе, ее нельзя продолжить
+
+            # пишем записи сразу после последней учтенной в заголовке
+            file.seek(HEADER.size + count * ENTRY.size)
+            for record_id, position in entries:
+                file.write(ENTRY.pack(record_id, position))
+                count += 1
+
+            # заголовок обновляем последним, чтобы при сбое не учитывать недописанные записи
+            file.seek(0)
+            file.write(self._make_header(data_path, count, data_size, checksum))
+
+    @staticmethod
+    def _make_header(data_path: str, count: int, checked_size: int = 0, checksum: int = 0) -> bytes:
+        """ Заголовок для текущего файла с данными. checksum - уже посчитанная сумма первых checked_size байт """
+        stat = os.stat(data_path)
+        if stat.st_size < checked_size:
+            checked_size, checksum = 0, 0  # файл с данными переписан (compact), считаем заново
+
+        return HEADER.pack(
+            MAGIC,
+            VERSION,
+            count,
+            stat.st_size,
+            stat.st_mtime_ns,
+            data_checksum(data_path, stat.st_size, checked_size, checksum),
+        )
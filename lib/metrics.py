@@ -0,0 +1,138 @@
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Union
+
+# Названия метрик слоя доступа к данным
+LOOKUPS = "lookups"  # кол-во поисков студента по id
+LOOKUP_MISSES = "lookup_misses"  # поиски, не нашедшие студента
+LOOKUP_SECONDS = "lookup_seconds"  # полное время поиска по id
+INDEX_LOOKUP_SECONDS = "index_lookup_seconds"  # время поиска позиции в индексе
+CACHE_HITS = "cache_hits"  # поиски, обслуженные из кэша
+BLOOM_REJECTS = "bloom_rejects"  # промахи, отсеянные фильтром Блума без прохода по файлу
+APPENDS = "appends"  # кол-во добавленных студентов
+APPEND_SECONDS = "append_seconds"  # время одного добавления (одиночного или пачкой)
+UPDATES = "updates"  # кол-во измененных студентов
+DELETES = "deletes"  # кол-во удаленных студентов
+COMPACTION_SECONDS = "compaction_seconds"  # перезапись файла без устаревших записей
+READ_SECONDS = "read_seconds"  # чтение записи по позиции: поиск в файле и разбор
+BYTES_READ = "bytes_read"  # байты прочитанных записей
+DECODE_SECONDS = "decode_seconds"  # разбор строки в сущность
+INDEX_SIZE = "index_size"  # кол-во записей в индексе
+INDEX_BUILD_SECONDS = "index_build_seconds"  # построение индексов при запуске
+INDEX_BUILD_PROGRESS = "index_build_progress"  # доля файла, пройденная построением индекса, от 0 до 1
+
+# Верхние границы корзин гистограммы: от 1 мкс до ~67 с, каждая следующая вдвое больше
+HISTOGRAM_BOUNDS = [2 ** power / 1_000_000 for power in range(27)]
+
+MetricCallback = Callable[[str, float], None]  # вызывается с названием метрики и значением
+
+
+@dataclass
+class LatencyHistogram:
+    """ Гистограмма задержек с корзинами, растущими в два раза. Хранит только счетчики корзин """
+    count: int = field(default=0, init=False)
+    total: float = field(default=0.0, init=False)  # сумма всех значений, в секундах
+    max: float = field(default=0.0, init=False)
+    _buckets: List[int] = field(default_factory=lambda: [0] * (len(HISTOGRAM_BOUNDS) + 1), init=False)
+
+    def observe(self, seconds: float):
+        self._buckets[bisect_left(HISTOGRAM_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent: float) -> float:
+        """ Оценка перцентиля сверху: граница корзины, в которую он попал """
+        if not self.count:
+            return 0.0
+
+        rank = self.count * percent / 100
+        seen = 0
+
+        for bound, bucket_count in zip(HISTOGRAM_BOUNDS, self._buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+@dataclass
+class Metrics:
+    """
+        Счетчики, значения и гистограммы задержек слоя доступа к данным
+        Передается в FileDataClient и реализации StudentDataAccessProtocol параметром metrics.
+        Если metrics не передан, метрики не собираются и почти ничего не стоят
+
+        Текущие значения отдает snapshot(). Для отправки во внешнюю систему мониторинга
+        можно подписаться на каждое изменение через add_callback
+    """
+    _counters: Dict[str, int] = field(default_factory=dict, init=False)
+    _gauges: Dict[str, float] = field(default_factory=dict, init=False)
+    _histograms: Dict[str, LatencyHistogram] = field(default_factory=dict, init=False)
+    _callbacks: List[MetricCallback] = field(default_factory=list, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def add_callback(self, callback: MetricCallback):
+        self._callbacks.append(callback)
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        self._notify(name, value)
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+        self._notify(name, value)
+
+    def observe(self, name: str, seconds: float):
+        """ Добавляет значение задержки в гистограмму name """
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.observe(seconds)
+        self._notify(name, seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """ Замеряет время выполнения блока в гистограмму name """
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start_time)
+
+    def snapshot(self) -> Dict[str, Union[int, float, Dict[str, float]]]:
+        """ Текущие значения всех метрик. Для гистограмм - кол-во, сумма, перцентили и максимум """
+        with self._lock:
+            result: Dict[str, Union[int, float, Dict[str, float]]] = {}
+            result.update(self._counters)
+            result.update(self._gauges)
+            result.update((name, histogram.snapshot()) for name, histogram in self._histograms.items())
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def _notify(self, name: str, value: float):
+        for callback in self._callbacks:
+            callback(name, value)
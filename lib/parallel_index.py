@@ -0,0 +1,96 @@
+import os
+from array import array
+from typing import Iterator, Iterable, List, Tuple
+
+MIN_RANGE_SIZE = 1 << 20  # файлы меньше двух таких диапазонов сканируются без пула процессов
+
+
+def split_ranges(file_path: str, start: int, parts: int) -> List[Tuple[int, int]]:
+    """
+        Делит файл с позиции start до конца на parts диапазонов байт.
+        Границы сдвигаются на начало следующей строки, чтобы строки не разрывались
+    """
+    size = os.path.getsize(file_path)
+    step = max((size - start) // parts, 1)
+    boundaries = [start]
+
+    with open(file_path, "rb") as file:
+        for part in range(1, parts):
+            file.seek(start + part * step - 1)
+            file.readline()  # дочитываем строку, в которую попала граница
+            boundary = min(file.tell(), size)
+
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+
+    if boundaries[-1] < size:
+        boundaries.append(size)
+
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def iter_range(
+    file_path: str, start: int, end: int, key_column: int, delimiter: bytes, markers: bytes = b""
+) -> Iterator[Tuple[int, int, int]]:
+    """
+        Построчно сканирует диапазон байт файла. Отдает (маркер, ключ, позиция строки)
+        Маркер - первый байт строки, если он есть в markers, иначе 0. Ключ берется после маркера
+    """
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        position = start
+
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+
+            marker = line[0] if line[:1] and line[:1] in markers else 0
+            yield marker, int(line[1 if marker else 0:].split(delimiter, key_column + 1)[key_column]), position
+            position += len(line)
+
+
+def scan_range(
+    file_path: str, start: int, end: int, key_column: int, delimiter: bytes, markers: bytes = b""
+) -> Tuple[array, array, bytearray]:
+    """ Как iter_range, но собирает массивы ключей, позиций и маркеров, чтобы передать их из процесса пула """
+    keys, positions, line_markers = array("q"), array("q"), bytearray()
+
+    for marker, key, position in iter_range(file_path, start, end, key_column, delimiter, markers):
+        keys.append(key)
+        positions.append(position)
+        line_markers.append(marker)
+
+    return keys, positions, line_markers
+
+
+def scan_keys_parallel(
+    file_path: str, start: int, key_column: int, delimiter: bytes, markers: bytes, workers: int
+) -> Iterable[Tuple[str, int, int]]:
+    """
+        Сканирует файл с позиции start в пуле процессов (при workers=1 и для небольших файлов - в текущем).
+        Отдает тройки (маркер, ключ, позиция) в порядке следования строк в файле. У строк без маркера он пустой
+    """
+    ranges = split_ranges(file_path, start, workers)
+    marker_names = {0: "", **{marker: chr(marker) for marker in markers}}
+
+    if len(ranges) < 2 or os.path.getsize(file_path) - start < MIN_RANGE_SIZE * 2:
+        # без пула файл читается построчно: первые ключи отдаются сразу, а не после прохода всего файла
+        end = ranges[-1][1] if ranges else start
+        for marker, key, position in iter_range(file_path, start, end, key_column, delimiter, markers):
+            yield marker_names[marker], key, position
+        return
+
+    # multiprocessing импортируется долго, а одноразовым запускам (run.py --find) пул не нужен
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(scan_range, file_path, range_start, range_end, key_column, delimiter, markers)
+            for range_start, range_end in ranges
+        ]
+        results = [future.result() for future in futures]
+
+    for keys, positions, line_markers in results:
+        for key, position, marker in zip(keys, positions, line_markers):
+            yield marker_names[marker], key, position
@@ -0,0 +1,135 @@
+from copy import copy
+from dataclasses import dataclass, field
+from datetime import date
+from itertools import islice
+from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, Tuple, Union
+
+from lib.file_data_client import EntityType, FileDataClient
+from lib.secondary_index import normalize_name, parse_date
+
+RawPredicate = Callable[[str], bool]  # проверка значения колонки в том виде, в котором оно лежит в файле
+LivePredicate = Callable[[List[str], int], bool]  # проверка, что строка на этой позиции - актуальная версия записи
+
+
+def equals(value: str, ignore_case: bool = False) -> RawPredicate:
+    """ Значение колонки равно value """
+    if ignore_case:
+        value = normalize_name(value)
+        return lambda raw_value: normalize_name(raw_value) == value
+
+    return lambda raw_value: raw_value == value
+
+
+def starts_with(prefix: str, ignore_case: bool = True) -> RawPredicate:
+    """ Значение колонки начинается с prefix. По умолчанию без учета регистра, как поиск по имени """
+    if ignore_case:
+        prefix = normalize_name(prefix)
+        return lambda raw_value: normalize_name(raw_value).startswith(prefix)
+
+    return lambda raw_value: raw_value.startswith(prefix)
+
+
+def date_between(start: date, end: date) -> RawPredicate:
+    """ Дата в колонке попадает в диапазон [start, end]. Даты в неизвестном формате не подходят """
+    def check(raw_value: str) -> bool:
+        value = parse_date(raw_value)
+        return value is not None and start <= value <= end
+
+    return check
+
+
+@dataclass
+class Query(Generic[EntityType]):
+    """
+        Ленивый запрос к файлу: отбор, выбор колонок и ограничение кол-ва записей
+        Каждый метод отдает новый запрос, файл читается только при итерации по результату:
+        dao.query().where("last_name", starts_with("А")).where("birthday_date", date_between(...)).limit(10)
+
+        Условия проверяются на сырых значениях колонок, до создания сущности.
+        Без select отдаются сущности, с select - словари только с выбранными полями,
+        остальные колонки не разбираются. Результат не накапливается в памяти,
+        после limit записей чтение файла прекращается
+
+        В файле могут быть устаревшие версии записей (см. FileDataClient). is_live отсеивает их,
+        проверяется только для строк, прошедших условия
+    """
+    file_client: FileDataClient  # type: FileDataClient[EntityType]
+    is_live: Optional[LivePredicate] = None  # None - все строки актуальны
+
+    _predicates: Tuple[Tuple[str, RawPredicate], ...] = field(default=(), init=False)
+    _fields: Optional[Tuple[str, ...]] = field(default=None, init=False)  # None - отдаются сущности целиком
+    _limit: Optional[int] = field(default=None, init=False)
+
+    def where(self, field_name: str, predicate: RawPredicate) -> "Query[EntityType]":
+        """ Оставляет записи, у которых значение колонки field_name проходит predicate """
+        return self._replace(_predicates=self._predicates + ((field_name, predicate),))
+
+    def select(self, *field_names: str) -> "Query[EntityType]":
+        """ Отдавать только поля field_names вместо сущностей """
+        return self._replace(_fields=field_names)
+
+    def limit(self, count: int) -> "Query[EntityType]":
+        if count < 0:
+            raise ValueError(f"Limit must be non-negative, got {count}")
+
+        return self._replace(_limit=count)
+
+    def __iter__(self) -> Iterator[Union[EntityType, Dict[str, Any]]]:
+        return islice(self._iter_matched(), self._limit)
+
+    def first(self) -> Optional[Union[EntityType, Dict[str, Any]]]:
+        """ Первая подходящая запись или None. Файл читается только до нее """
+        return next(iter(self.limit(1)), None)
+
+    def _replace(self, **changes) -> "Query[EntityType]":
+        query = copy(self)  # исходный запрос не меняется, его можно переиспользовать
+        for name, value in changes.items():
+            setattr(query, name, value)
+        return query
+
+    def _iter_matched(self) -> Iterator[Union[EntityType, Dict[str, Any]]]:
+        field_names = self.file_client.field_names
+        predicates = [(field_names.index(name), predicate) for name, predicate in self._predicates]
+        build = self._compile_builder(field_names)
+
+        is_live = self.is_live
+
+        for row, position in self.file_client.iter_rows():
+            if all(predicate(row[column]) for column, predicate in predicates) and (
+                is_live is None or is_live(row, position)
+            ):
+                yield build(row)
+
+    def _compile_builder(self, field_names: List[str]) -> Callable[[List[str]], Union[EntityType, Dict[str, Any]]]:
+        """ Собирает функцию, превращающую подходящую строку в результат """
+        entity_type = self.file_client.entity_type
+
+        if self._fields is None:
+            return entity_type.compile_loader(field_names)
+
+        columns = [
+            (name, field_names.index(name), entity_type.compile_field_loader(name)) for name in self._fields
+        ]
+
+        def build(row: List[str]) -> Dict[str, Any]:
+            return {name: load(row[column]) for name, column, load in columns}
+
+        return build
+
+
+@dataclass
+class UnionQuery(Query[EntityType]):
+    """
+        Запрос сразу к нескольким файлам с одинаковыми сущностями (например, к шардам)
+        Условия, выбор колонок и limit применяются ко всем частям, записи отдаются по очереди из каждой
+    """
+    parts: Tuple[Query[EntityType], ...] = ()
+
+    @classmethod
+    def of(cls, parts: List[Query[EntityType]]) -> "UnionQuery[EntityType]":
+        # file_client первой части нужен только для совместимости с Query, читаются файлы всех частей
+        return cls(parts[0].file_client, parts=tuple(parts))
+
+    def _iter_matched(self) -> Iterator[Union[EntityType, Dict[str, Any]]]:
+        for part in self.parts:
+            yield from part._replace(_predicates=self._predicates, _fields=self._fields)._iter_matched()
@@ -0,0 +1,49 @@
+from typing import Optional
+
+from lib.entities import PrimaryKey, Student
+from lib.exceptions import RecordNotFound
+from lib.file_data_client import FileDataClient, DELETE_MARKER
+from lib.index import ABSENT
+from lib.index_sidecar import IndexSidecar
+
+KEY_FIELD = "record_id"  # как lib.data_access.KEY_FIELD: импорт data_access тянет всё, что нужно полному индексу
+
+
+def find_student(file_client: FileDataClient[Student], record_id: PrimaryKey, index_path: Optional[str] = None) -> Student:
+    """
+        Находит одного студента без построения индекса в памяти - для одноразовых запусков (run.py --find)
+        Если есть актуальный сохраненный индекс index_path, позиция берется из него, а сканируется
+        только дописанный после него хвост файла. Иначе сканируется колонка record_id всего файла.
+        Если записи нет - RecordNotFound
+    """
+    position = None
+    start_position = None  # с какой позиции сканировать файл. None - с начала
+
+    loaded = IndexSidecar(index_path).load(file_client.file_path) if index_path is not None else None
+    if loaded is not None:
+        entries, indexed_size = loaded
+        start_position = file_client.position_for_size(indexed_size)
+
+        # записи идут в порядке изменений, актуальна последняя пара с этим id. Поиск с конца идет в C
+        try:
+            last = len(entries) // 2 - 1 - entries[-2::-2].index(record_id)
+        except ValueError:
+            pass
+        else:
+            position = entries[last * 2 + 1]
+            if position == ABSENT:
+                position = None
+
+    for marker, key, key_position in file_client.iter_keys(KEY_FIELD, start_position):
+        if key == record_id:
+            position = None if marker == DELETE_MARKER else key_position
+
+    if position is None:
+        raise RecordNotFound(f"Student with id {record_id} not found")
+
+    student = file_client.read_at_position(position)
+    if student.record_id != record_id and loaded is not None:
+        # сохраненный индекс прошел проверки, но не соответствует файлу - ищем по всему файлу
+        return find_student(file_client, record_id)
+
+    return student
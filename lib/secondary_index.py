@@ -0,0 +1,78 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+ValueType = TypeVar("ValueType")
+
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y")  # форматы дат, встречающиеся в файле
+
+
+def parse_date(value: str) -> Optional[date]:
+    """ Разбирает дату рождения из файла. Если формат неизвестен - None """
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+
+    return None
+
+
+def normalize_name(value: str) -> str:
+    """ Имена в индексе и в запросах сравниваются без учета регистра """
+    return value.casefold()
+
+
+@dataclass
+class SortedValueIndex(Generic[ValueType]):
+    """
+        Вторичный индекс значение -> позиции записей в файле.
+        Пары (значение, позиция) хранятся отсортированными по значению, поиск - бинарный
+    """
+    _values: List[ValueType] = field(default_factory=list, init=False)
+    _positions: List[int] = field(default_factory=list, init=False)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def load(self, entries: Iterable[Tuple[ValueType, int]]):
+        """ Заполняет индекс разом, сортировка выполняется один раз """
+        pairs = sorted(entries)
+        self._values = [value for value, _ in pairs]
+        self._positions = [position for _, position in pairs]
+
+    def add(self, value: ValueType, position: int):
+        idx = bisect_right(self._values, value)
+        self._values.insert(idx, value)
+        self._positions.insert(idx, position)
+
+    def remove(self, value: ValueType, position: int):
+        """ Удаляет пару (значение, позиция), например при изменении или удалении записи """
+        idx = bisect_left(self._values, value)
+        end = bisect_right(self._values, value)
+        idx += self._positions[idx:end].index(position)  # ValueError, если такой пары нет
+
+        del self._values[idx]
+        del self._positions[idx]
+
+    def remap(self, new_positions: Dict[int, int]):
+        """ Переводит позиции на новые после того, как файл с данными переписан (см. FileDataClient.compact) """
+        self._positions = [new_positions[position] for position in self._positions]
+
+    def find(self, value: ValueType) -> List[int]:
+        """ Позиции записей с точно таким значением """
+        return self._positions[bisect_left(self._values, value):bisect_right(self._values, value)]
+
+    def find_prefix(self, prefix: str) -> List[int]:
+        """ Позиции записей, значение которых начинается с prefix """
+        start = end = bisect_left(self._values, prefix)
+        while end < len(self._values) and self._values[end].startswith(prefix):
+            end += 1
+
+        return self._positions[start:end]
+
+    def find_range(self, start: Any, end: Any) -> List[int]:
+        """ Позиции записей со значением в диапазоне [start, end] """
+        return self._positions[bisect_left(self._values, start):bisect_right(self._values, end)]
+
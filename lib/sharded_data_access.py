@@ -0,0 +1,278 @@
+import os
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from datetime import date
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Protocol, TypeVar
+
+from lib.data_access import KEY_FIELD, StudentDataAccessProtocol, IndexFileStudentDataAccess
+from lib.entities import PrimaryKey, Student
+from lib.exceptions import DuplicateRecordId, RecordNotFound
+from lib.file_data_client import FileDataClient, DELETE_MARKER
+from lib.query import Query, UnionQuery
+
+ROUTING_HASH = "hash"
+ROUTING_RANGE = "range"
+
+ResultType = TypeVar("ResultType")
+
+
+class ShardRouter(Protocol):
+    """ Интерфейс выбора шарда по record_id """
+    def shard_for(self, record_id: int) -> int:
+        """ Номер шарда, в котором хранится запись """
+        ...
+
+
+@dataclass
+class HashRouter(ShardRouter):
+    """ Шард - остаток от деления record_id на кол-во шардов. Подряд идущие id расходятся по всем шардам """
+    shards_count: int
+
+    def shard_for(self, record_id: int) -> int:
+        return record_id % self.shards_count
+
+
+@dataclass
+class RangeRouter(ShardRouter):
+    """
+        Шарды по диапазонам record_id. bounds - отсортированные границы, их на одну меньше, чем шардов:
+        шард 0 - id < bounds[0], шард i - bounds[i - 1] <= id < bounds[i], последний - id >= bounds[-1]
+    """
+    bounds: List[int]
+
+    def shard_for(self, record_id: int) -> int:
+        return bisect_right(self.bounds, record_id)
+
+
+def create_router(routing: str, shards_count: int, range_bounds: Optional[List[int]] = None) -> ShardRouter:
+    """ Создает роутер по названию способа: hash или range (для range нужны границы range_bounds) """
+    if routing == ROUTING_HASH:
+        return HashRouter(shards_count)
+
+    if routing == ROUTING_RANGE:
+        bounds = list(range_bounds or [])
+        if len(bounds) != shards_count - 1 or bounds != sorted(bounds):
+            raise ValueError(f"Range routing over {shards_count} shards needs {shards_count - 1} sorted bounds")
+        return RangeRouter(bounds)
+
+    raise ValueError(f"Unknown routing: {routing}")
+
+
+@dataclass
+class ShardedStudentDataAccess(StudentDataAccessProtocol):
+    """
+        Реализация интерфейса StudentDataAccessProtocol поверх нескольких файлов (шардов)
+        Каждый студент хранится в одном шарде, который выбирается по record_id (см. create_router).
+        Шард - это IndexFileStudentDataAccess со своим файлом и своим индексом.
+        Индексы шардов строятся при запуске по очереди: в потоках они только ждали бы друг друга на GIL.
+        Файл каждого шарда сканируется в пуле процессов (index_workers), если index_workers
+        не задан в shard_options - по кол-ву ядер
+
+        Поиск по id идет только в один шард, get_students и поиск по имени и дате рождения
+        параллельно опрашивают нужные шарды. У каждого шарда своя блокировка записи, записи в разные шарды
+        идут одновременно. Добавление пачки берет блокировки всех своих шардов (по возрастанию номера)
+        и сначала проверяет id в них, поэтому при ошибке не записывается никто
+
+        Файлы шардов должны существовать (их создает tools/split_into_shards.py) и
+        должны быть разложены тем же способом, что задан в routing.
+        Если передать один Metrics всем шардам, счетчики и гистограммы суммируются по шардам,
+        а index_size показывает размер индекса шарда, изменившегося последним
+    """
+    shard_paths: List[str]  # пути к файлам шардов, номер шарда - индекс в списке
+    routing: str = ROUTING_HASH  # hash или range
+    range_bounds: Optional[List[int]] = None  # границы диапазонов id для routing=range
+    index_suffix: Optional[str] = ".idx"  # индекс шарда сохраняется в файл путь_шарда + index_suffix. None - не сохранять
+    file_client_options: Dict[str, Any] = field(default_factory=dict)  # параметры FileDataClient каждого шарда
+    shard_options: Dict[str, Any] = field(default_factory=dict)  # параметры IndexFileStudentDataAccess каждого шарда
+
+    _router: ShardRouter = field(init=False)
+    _shards: List[IndexFileStudentDataAccess] = field(default_factory=list, init=False)
+    _executor: ThreadPoolExecutor = field(init=False)
+    _shard_locks: List[threading.Lock] = field(default_factory=list, init=False)  # блокировки записи шардов
+
+    def __post_init__(self):
+        if not self.shard_paths:
+            raise ValueError("At least one shard is required")
+
+        self._router = create_router(self.routing, len(self.shard_paths), self.range_bounds)
+        self._executor = ThreadPoolExecutor(max_workers=len(self.shard_paths), thread_name_prefix="student-shard")
+        self._shard_locks = [threading.Lock() for _ in self.shard_paths]
+        self._shards = [self._open_shard(path) for path in self.shard_paths]
+
+    def __enter__(self) -> "ShardedStudentDataAccess":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_student(self, student: Student):
+        with self._locked([self.shard_index(student.record_id)]):
+            self._shard_for(student.record_id).add_student(student)
+
+    def add_students(self, students: Iterable[Student]):
+        students = list(students)
+        batch_ids = set()
+        by_shard = self._group_by_shard(students, lambda student: student.record_id)
+
+        with self._locked(by_shard):
+            # сначала проверяем все id, чтобы ошибка в одном шарде не оставила пачку записанной частично
+            for student in students:
+                if student.record_id in batch_ids or self._exists(student.record_id):
+                    raise DuplicateRecordId(f"Found duplicate record id {student.record_id}")
+                batch_ids.add(student.record_id)
+
+            for shard_index, shard_students in by_shard.items():
+                self._shards[shard_index].add_students(shard_students)
+
+    def update_student(self, student: Student):
+        with self._locked([self.shard_index(student.record_id)]):
+            self._shard_for(student.record_id).update_student(student)
+
+    def delete_student(self, record_id: PrimaryKey):
+        with self._locked([self.shard_index(record_id)]):
+            self._shard_for(record_id).delete_student(record_id)
+
+    def compact(self):
+        def compact(shard_index: int):
+            with self._locked([shard_index]):
+                self._shards[shard_index].compact()
+
+        self._fan_out(compact, range(len(self._shards)))
+
+    def get_student(self, record_id: PrimaryKey) -> Student:
+        return self._shard_for(record_id).get_student(record_id)
+
+    def get_students(self, record_ids: Iterable[PrimaryKey]) -> Dict[PrimaryKey, Optional[Student]]:
+        result: Dict[PrimaryKey, Optional[Student]] = dict.fromkeys(record_ids)
+        by_shard = self._group_by_shard(result, lambda record_id: record_id)
+
+        def get_students(shard_index: int) -> Dict[PrimaryKey, Optional[Student]]:
+            return self._shards[shard_index].get_students(by_shard[shard_index])
+
+        for found in self._fan_out(get_students, by_shard):
+            result.update(found)
+
+        return result
+
+    def find_by_last_name(self, last_name: str, prefix: bool = False) -> List[Student]:
+        return self._find_everywhere(lambda shard: shard.find_by_last_name(last_name, prefix))
+
+    def find_by_first_name(self, first_name: str, prefix: bool = False) -> List[Student]:
+        return self._find_everywhere(lambda shard: shard.find_by_first_name(first_name, prefix))
+
+    def find_by_birthday(self, start: date, end: date) -> List[Student]:
+        return self._find_everywhere(lambda shard: shard.find_by_birthday(start, end))
+
+    def query(self) -> Query[Student]:
+        return UnionQuery.of([shard.query() for shard in self._shards])
+
+    def shard_index(self, record_id: PrimaryKey) -> int:
+        """ Номер шарда, в котором хранится (или будет храниться) запись """
+        return self._router.shard_for(record_id)
+
+    def close(self):
+        """ Останавливает пул потоков и закрывает файлы шардов """
+        self._executor.shutdown(wait=True)
+
+        for shard in self._shards:
+            shard.file_client.close()
+
+    def _open_shard(self, path: str) -> IndexFileStudentDataAccess:
+        index_path = None if self.index_suffix is None else path + self.index_suffix
+        file_client = FileDataClient(path, Student, **self.file_client_options)
+        shard_options = {"index_workers": os.cpu_count() or 1, **self.shard_options}
+        return IndexFileStudentDataAccess(file_client, index_path=index_path, **shard_options)
+
+    @contextmanager
+    def _locked(self, shard_indexes: Iterable[int]) -> Iterator[None]:
+        """ Блокировки записи шардов. Берутся по возрастанию номера, чтобы пачки не ждали друг друга по кругу """
+        with ExitStack() as stack:
+            for shard_index in sorted(set(shard_indexes)):
+                stack.enter_context(self._shard_locks[shard_index])
+            yield
+
+    def _shard_for(self, record_id: PrimaryKey) -> IndexFileStudentDataAccess:
+        return self._shards[self._router.shard_for(record_id)]
+
+    def _exists(self, record_id: PrimaryKey) -> bool:
+        try:
+            self._shard_for(record_id).get_position(record_id)
+        except RecordNotFound:
+            return False
+
+        return True
+
+    def _group_by_shard(
+        self, items: Iterable[ResultType], get_key: Callable[[ResultType], PrimaryKey]
+    ) -> Dict[int, List[ResultType]]:
+        """ Раскладывает элементы по номерам шардов, сохраняя их порядок внутри шарда """
+        groups: Dict[int, List[ResultType]] = {}
+
+        for item in items:
+            groups.setdefault(self._router.shard_for(get_key(item)), []).append(item)
+
+        return dict(sorted(groups.items()))
+
+    def _fan_out(self, call: Callable[[int], ResultType], shard_indexes: Iterable[int]) -> List[ResultType]:
+        """ Вызывает call для каждого номера шарда в пуле потоков. Один шард опрашивается без пула """
+        shard_indexes = list(shard_indexes)
+        if len(shard_indexes) == 1:
+            return [call(shard_indexes[0])]
+
+        return list(self._executor.map(call, shard_indexes))
+
+    def _find_everywhere(self, find: Callable[[IndexFileStudentDataAccess], List[Student]]) -> List[Student]:
+        """ Поиск по всем шардам. Результаты идут в порядке шардов """
+        found = self._fan_out(lambda shard_index: find(self._shards[shard_index]), range(len(self._shards)))
+        return list(chain.from_iterable(found))
+
+
+def split_into_shards(
+    source: FileDataClient, shard_paths: List[str], router: ShardRouter, buffer_size: int = 1 << 20
+) -> List[int]:
+    """
+        Раскладывает актуальные версии записей из source по новым файлам шардов (файлы не должны существовать)
+        Удаленные записи и устаревшие версии не переносятся. Отдает кол-во записей в каждом шарде
+    """
+    latest: Dict[int, int] = {}  # record_id -> позиция актуальной версии
+
+    for marker, record_id, position in source.iter_keys(KEY_FIELD):
+        if marker == DELETE_MARKER:
+            latest.pop(record_id, None)
+        else:
+            latest[record_id] = position
+
+    header = source.delimiter.join(source.field_names) + source.new_line
+    for path in shard_paths:
+        with open(path, "x", encoding=source.encoding) as file:  # "x" - не перезаписываем существующие файлы
+            file.write(header)
+
+    targets = [
+        FileDataClient(path, source.entity_type, encoding=source.encoding, buffer_size=buffer_size)
+        for path in shard_paths
+    ]
+    counts = [0] * len(targets)
+
+    try:
+        for student, _ in source.read_at_positions(latest.values()):
+            shard_index = router.shard_for(student.record_id)
+            targets[shard_index].write(student)
+            counts[shard_index] += 1
+    finally:
+        for target in targets:
+            target.close()
+
+    return counts
+
+
+def even_range_bounds(record_ids: Iterable[int], shards_count: int) -> List[int]:
+    """ Границы для RangeRouter, при которых в шардах примерно поровну записей """
+    sorted_ids = sorted(record_ids)
+    if not sorted_ids:
+        return list(range(1, shards_count))
+
+    return [sorted_ids[len(sorted_ids) * shard_index // shards_count] for shard_index in range(1, shards_count)]
@@ -1,11 +1,47 @@
-from simio_di import DependencyInjector, DependenciesContainer
+import argparse
 
-from config import get_config
 
-from cli import CliInterface
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Поиск студентов по номеру зачетной книжки")
+    parser.add_argument(
+        "--find", type=int, metavar="ID",
+        help="найти одного студента и выйти, без интерактивного меню и построения индекса",
+    )
+    return parser.parse_args()
+
+
+def find(record_id: int) -> int:
+    """ Быстрый путь для одного поиска: импортирует только клиент файла и сохраненный индекс. Отдает код выхода """
+    from config import get_data_path, get_index_path
+    from lib.entities import PrimaryKey, Student
+    from lib.exceptions import RecordNotFound
+    from lib.file_data_client import FileDataClient
+    from lib.quick_lookup import find_student
+
+    try:
+        student = find_student(FileDataClient(get_data_path(), Student), PrimaryKey(record_id), get_index_path())
+    except RecordNotFound:
+        print("Студент не найден")
+        return 1
+
+    print("Студент найден")
+    print(student)
+    return 0
 
 
 def main():
+    args = parse_args()
+
+    if args.find is not None:
+        raise SystemExit(find(args.find))
+
+    # внедрение зависимостей и построение индекса нужны только интерактивному режиму
+    from simio_di import DependencyInjector, DependenciesContainer
+
+    from config import get_config
+
+    from cli import CliInterface
+
     config = get_config()
 
     injector = DependencyInjector(config, deps_container=DependenciesContainer())
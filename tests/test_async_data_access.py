@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from lib.async_data_access import AsyncIndexFileStudentDataAccess
+from lib.entities import Student, PrimaryKey
+from lib.exceptions import RecordNotFound
+
+STUDENT = Student(record_id=PrimaryKey(1), first_name='first', last_name='last', birthday_date='2020-03-03')
+
+
+def slow_get_student(record_id):
+    time.sleep(0.05)
+    return STUDENT
+
+
+class TestAsyncIndexFileStudentDataAccess:
+    @pytest.mark.parametrize('lookups_in_memory', (True, False))
+    def test_get_student_coalesced(self, lookups_in_memory):
+        lookup_threads = set()
+
+        def get_position(record_id):
+            lookup_threads.add(threading.current_thread().name.startswith('student-io'))
+            return 45
+
+        data_access = MagicMock()
+        data_access.lookups_in_memory.return_value = lookups_in_memory
+        data_access.get_position.side_effect = get_position
+        data_access.get_student.side_effect = slow_get_student
+        dao = AsyncIndexFileStudentDataAccess(data_access)
+
+        async def run():
+            return await asyncio.gather(*(dao.get_student(PrimaryKey(1)) for _ in range(10)))
+
+        assert asyncio.run(run()) == [STUDENT] * 10
+        data_access.get_student.assert_called_once_with(PrimaryKey(1))
+        # пока поиск позиции может ждать построения индекса, он идет в пуле, а не в event loop
+        assert lookup_threads == {not lookups_in_memory}
+        assert dao._pending_reads == {}
+        dao.close()
+
+    def test_get_student_not_found(self):
+        data_access = MagicMock()
+        data_access.get_position.side_effect = RecordNotFound
+        dao = AsyncIndexFileStudentDataAccess(data_access)
+
+        with pytest.raises(RecordNotFound):
+            asyncio.run(dao.get_student(PrimaryKey(2)))
+
+        data_access.get_student.assert_not_called()
+        dao.close()
+
+    def test_add_student(self):
+        data_access = MagicMock()
+        dao = AsyncIndexFileStudentDataAccess(data_access)
+
+        asyncio.run(dao.add_student(STUDENT))
+
+        data_access.add_student.assert_called_once_with(STUDENT)
+        dao.close()
+
+    def test_get_students(self):
+        data_access = MagicMock()
+        data_access.get_students.return_value = {PrimaryKey(1): STUDENT}
+        dao = AsyncIndexFileStudentDataAccess(data_access)
+
+        assert asyncio.run(dao.get_students(iter([PrimaryKey(1)]))) == {PrimaryKey(1): STUDENT}
+        data_access.get_students.assert_called_once_with([PrimaryKey(1)])
+        dao.close()
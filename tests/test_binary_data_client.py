@@ -0,0 +1,143 @@
+import pytest
+
+from lib.binary_data_client import BinaryFileDataClient, convert_text_file
+from lib.data_access import IndexFileStudentDataAccess, KEY_FIELD
+from lib.entities import Student, PrimaryKey
+from lib.exceptions import InvalidFile, NotSupported, RecordNotFound
+from lib.file_data_client import FileDataClient
+from lib.query import equals
+
+FIELD_FORMATS = {
+    'record_id': 'q',
+    'first_name': '16s',
+    'last_name': '16s',
+    'birthday_date': '10s',
+}
+
+
+@pytest.fixture
+def client(tmp_path):
+    with BinaryFileDataClient.create(str(tmp_path / 'students.bin'), Student, FIELD_FORMATS) as client:
+        yield client
+
+
+class TestBinaryFileDataClient:
+    def test_write_and_read(self, client):
+        student = Student(record_id=PrimaryKey(1), first_name='Иван', last_name='last', birthday_date='2000-02-12')
+
+        position = client.write(student)
+
+        assert client.read_at_position(position) == student
+        assert client.read_record(0) == student
+        assert list(client.iter_read()) == [(student, position)]
+
+    def test_position_of(self, client):
+        students = [
+            Student(record_id=PrimaryKey(idx), first_name='first', last_name='last', birthday_date='2000-02-12')
+            for idx in range(3)
+        ]
+
+        positions = client.write_many(students)
+
+        assert positions == [client.position_of(idx) for idx in range(3)]
+        assert len(client) == 3
+        assert client.read_record(2) == students[2]
+        assert list(client.iter_keys('record_id', positions[1])) == [('', 1, positions[1]), ('', 2, positions[2])]
+
+    def test_read_past_end(self, client):
+        student = Student(record_id=PrimaryKey(1), first_name='first', last_name='last', birthday_date='2000-02-12')
+        client.write(student)
+        mapping = client._mapping
+
+        with pytest.raises(ValueError):
+            client.read_record(1)
+
+        client.write(student)  # старое отображение не закрывается при росте файла - его может читать другой поток
+        assert client.read_record(1) == student
+        assert not mapping.closed
+
+    def test_value_too_long(self, client):
+        student = Student(record_id=PrimaryKey(1), first_name='Ф' * 9, last_name='last', birthday_date='2000-02-12')
+
+        with pytest.raises(ValueError):
+            client.write(student)
+
+    def test_reopen(self, tmp_path, client):
+        student = Student(record_id=PrimaryKey(5), first_name='first', last_name='last', birthday_date='2000-02-12')
+        client.write(student)
+
+        with BinaryFileDataClient(client.file_path, Student) as reopened:
+            assert reopened._field_names == list(FIELD_FORMATS)
+            assert reopened.read_record(0) == student
+
+    @pytest.mark.parametrize('lazy_index', (None, 'scan'))
+    def test_index(self, client, lazy_index):
+        students = [
+            Student(record_id=PrimaryKey(idx), first_name='first', last_name='last', birthday_date='2000-02-12')
+            for idx in range(5)
+        ]
+        client.write_many(students)
+
+        dao = IndexFileStudentDataAccess(client, lazy_index=lazy_index)
+
+        assert dao.get_student(PrimaryKey(3)) == students[3]
+        assert dao.wait_for_index(timeout=5)
+        assert dao.index_build_progress() == 1.0
+
+    def test_changes(self, client):
+        student = Student(record_id=PrimaryKey(1), first_name='first', last_name='last', birthday_date='2000-02-12')
+        dao = IndexFileStudentDataAccess(client, multiprocess=True)
+        dao.add_student(student)
+
+        assert list(dao.query().where('first_name', equals('first'))) == [student]
+        with pytest.raises(NotSupported):
+            dao.update_student(student)
+        with pytest.raises(NotSupported):
+            dao.delete_student(PrimaryKey(1))
+
+    @pytest.mark.parametrize('content', ('record_id,first_name\n1,first\n', None))
+    def test_invalid_file(self, tmp_path, content):
+        path = tmp_path / 'students.bin'
+        if content is not None:
+            path.write_text(content)
+
+        with pytest.raises(InvalidFile):
+            BinaryFileDataClient(str(path), Student)
+
+        assert content is not None or not path.exists()  # отсутствующий файл не создается
+
+
+def test_convert_text_file(tmp_path):
+    source = FileDataClient('students_test.txt', Student)
+    target_path = str(tmp_path / 'students.bin')
+
+    assert convert_text_file(source, target_path, KEY_FIELD, FIELD_FORMATS, batch_size=2) == 3
+
+    with BinaryFileDataClient(target_path, Student) as target:
+        assert [student for student, _ in target.iter_read()] == [student for student, _ in source.iter_read()]
+
+
+def test_convert_changed_text_file(tmp_path):
+    source_path = str(tmp_path / 'students.txt')
+    target_path = str(tmp_path / 'students.bin')
+    with open(source_path, 'w') as file:
+        file.write(','.join(FIELD_FORMATS) + '\n')
+
+    dao = IndexFileStudentDataAccess(FileDataClient(source_path, Student))
+    dao.add_students(
+        Student(record_id=PrimaryKey(idx), first_name='first', last_name='last', birthday_date='2000-02-12')
+        for idx in range(5)
+    )
+    updated = Student(record_id=PrimaryKey(1), first_name='Петр', last_name='last', birthday_date='2000-02-12')
+    dao.update_student(updated)
+    dao.delete_student(PrimaryKey(2))
+
+    # переносятся только актуальные версии, новый файл индексируется без повторов id
+    assert convert_text_file(FileDataClient(source_path, Student), target_path, KEY_FIELD, FIELD_FORMATS) == 4
+
+    with BinaryFileDataClient(target_path, Student) as target:
+        dao = IndexFileStudentDataAccess(target)
+
+        assert dao.get_student(PrimaryKey(1)) == updated
+        with pytest.raises(RecordNotFound):
+            dao.get_student(PrimaryKey(2))
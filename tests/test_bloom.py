@@ -0,0 +1,105 @@
+import pytest
+
+from lib.bloom import BloomFilter, BloomSidecar, MIN_CAPACITY
+from tests.conftest import does_not_raise
+
+
+def write_data(path, lines):
+    with open(path, "w") as file:
+        file.write("".join(lines))
+
+
+class TestBloomFilter:
+    @pytest.mark.parametrize("false_positive_rate", (0.1, 0.01, 0.001))
+    def test_false_positive_rate(self, false_positive_rate):
+        bloom = BloomFilter(10_000, false_positive_rate)
+        bloom.update(range(0, 20_000, 2))
+
+        # добавленные ключи есть всегда, доля ложных срабатываний - около заданной
+        assert all(key in bloom for key in range(0, 20_000, 2))
+        false_positives = sum(key in bloom for key in range(1, 20_000, 2))
+        assert false_positives / 10_000 < false_positive_rate * 1.5
+        assert bloom.count == pytest.approx(10_000, rel=false_positive_rate * 2)
+        assert not bloom.is_full()
+
+    def test_capacity(self):
+        bloom = BloomFilter(10, 0.01)
+        assert bloom.capacity == MIN_CAPACITY
+
+        bloom.update(range(MIN_CAPACITY + 100))
+        bloom.update(range(100))  # повторные ключи не считаются
+
+        assert bloom.is_full()
+        assert bloom.count <= MIN_CAPACITY + 100
+
+    @pytest.mark.parametrize(
+        "false_positive_rate, expected_exception",
+        (
+            (0.5, does_not_raise()),
+            (0, pytest.raises(ValueError)),
+            (1, pytest.raises(ValueError)),
+        ),
+    )
+    def test_validate_rate(self, false_positive_rate, expected_exception):
+        with expected_exception:
+            BloomFilter(100, false_positive_rate)
+
+
+class TestBloomSidecar:
+    def test_save_and_load(self, tmp_path):
+        data_path = tmp_path / "data.txt"
+        write_data(data_path, ["record_id,first_name\n", "1,first\n", "3,second\n"])
+        sidecar = BloomSidecar(str(tmp_path / "data.bloom"))
+        bloom = BloomFilter(100, 0.01)
+        bloom.update([1, 3])
+
+        sidecar.save(str(data_path), bloom, data_path.stat().st_size)
+        loaded, data_size = sidecar.load(str(data_path), 0.01)
+
+        assert loaded.to_bytes() == bloom.to_bytes()
+        assert loaded.count == 2
+        assert data_size == data_path.stat().st_size
+        assert sidecar.load(str(data_path), 0.001) is None  # фильтр рассчитан на другую долю ложных срабатываний
+
+    def test_load_grown_file(self, tmp_path):
+        data_path = tmp_path / "data.txt"
+        write_data(data_path, ["record_id,first_name\n", "1,first\n"])
+        sidecar = BloomSidecar(str(tmp_path / "data.bloom"))
+        saved_size = data_path.stat().st_size
+        sidecar.save(str(data_path), BloomFilter(100, 0.01), saved_size)
+
+        with open(data_path, "a") as file:
+            file.write("2,second\n")
+
+        # фильтр остается валидным для прежнего размера файла
+        _, data_size = sidecar.load(str(data_path), 0.01)
+        assert data_size == saved_size
+
+    @pytest.mark.parametrize(
+        "new_lines",
+        (
+            ["record_id,first_name\n", "9,changed\n"],  # содержимое изменилось
+            ["record_id,first_name\n"],  # файл уменьшился
+        ),
+    )
+    def test_load_stale(self, tmp_path, new_lines):
+        data_path = tmp_path / "data.txt"
+        write_data(data_path, ["record_id,first_name\n", "1,first\n"])
+        sidecar = BloomSidecar(str(tmp_path / "data.bloom"))
+        sidecar.save(str(data_path), BloomFilter(100, 0.01), data_path.stat().st_size)
+
+        write_data(data_path, new_lines)
+
+        assert sidecar.load(str(data_path), 0.01) is None
+
+    def test_load_truncated(self, tmp_path):
+        data_path = tmp_path / "data.txt"
+        write_data(data_path, ["record_id,first_name\n", "1,first\n"])
+        bloom_path = tmp_path / "data.bloom"
+        sidecar = BloomSidecar(str(bloom_path))
+        sidecar.save(str(data_path), BloomFilter(100, 0.01), data_path.stat().st_size)
+
+        bloom_path.write_bytes(bloom_path.read_bytes()[:-1])
+
+        assert sidecar.load(str(data_path), 0.01) is None
+        assert BloomSidecar(str(tmp_path / "missing.bloom")).load(str(data_path), 0.01) is None
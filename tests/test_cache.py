@@ -0,0 +1,31 @@
+from lib.cache import LRUCache
+
+
+class TestLRUCache:
+    def test_get(self):
+        cache = LRUCache(max_size=2)
+        cache.put(1, 'first')
+
+        assert cache.get(1) == 'first'
+        assert cache.get(2) is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_eviction(self):
+        cache = LRUCache(max_size=2)
+        cache.put(1, 'first')
+        cache.put(2, 'second')
+        cache.get(1)  # 1 использован недавно, вытеснится 2
+        cache.put(3, 'third')
+
+        assert len(cache) == 2
+        assert cache.get(2) is None
+        assert cache.get(1) == 'first'
+        assert cache.get(3) == 'third'
+
+    def test_invalidate(self):
+        cache = LRUCache(max_size=2)
+        cache.put(1, 'first')
+        cache.invalidate(1)
+        cache.invalidate(2)
+
+        assert cache.get(1) is None
@@ -0,0 +1,138 @@
+import pytest
+
+from lib.compressed_data_client import CompressedFileDataClient, convert_text_file, OFFSET_BITS
+from lib.data_access import IndexFileStudentDataAccess, KEY_FIELD
+from lib.entities import Student, PrimaryKey
+from lib.exceptions import InvalidFile, RecordNotFound
+from lib.file_data_client import FileDataClient
+
+FIELD_NAMES = ['record_id', 'first_name', 'last_name', 'birthday_date']
+
+
+def make_student(record_id: int, first_name: str = 'Иван') -> Student:
+    return Student(PrimaryKey(record_id), first_name, 'last', '2000-02-12')
+
+
+@pytest.fixture(params=('zlib', 'lzma'))
+def path(tmp_path, request):
+    path = str(tmp_path / 'students.cz')
+    CompressedFileDataClient.create(path, Student, FIELD_NAMES, request.param).close()
+    return path
+
+
+class TestCompressedFileDataClient:
+    def test_write_and_read(self, path):
+        students = [make_student(record_id) for record_id in range(10)]
+
+        with CompressedFileDataClient(path, Student, block_size=100) as client:
+            positions = client.write_many(students)
+
+            assert client.block_cache_info()['blocks'] == 2  # блок сжимается, когда набралось 100 байт
+            assert [position >> OFFSET_BITS for position in positions] == [0] * 4 + [1] * 4 + [2] * 2
+            assert [client.read_at_position(position) for position in positions] == students  # в т.ч. из памяти
+            assert list(client.iter_read()) == list(zip(students, positions))
+            assert [key for _, key, _ in client.iter_keys('record_id', positions[5])] == [5, 6, 7, 8, 9]
+
+        with CompressedFileDataClient(path, Student, block_cache_size=1) as reopened:
+            assert reopened.field_names == FIELD_NAMES
+            assert [student for student, _ in reopened.read_at_positions(reversed(positions))] == students
+            # позиции отсортированы: каждый блок распаковывается один раз
+            assert reopened.block_cache_info() == {'hits': 7, 'misses': 3, 'blocks': 3}
+
+    def test_size(self, path):
+        with CompressedFileDataClient(path, Student, block_size=1000) as client:
+            empty_size = client.size()
+            client.write(make_student(1))
+            size = client.size()
+
+            # открытый блок не сжимается, но размер вырос и указывает на этот блок
+            assert client.block_cache_info()['blocks'] == 0
+            assert size > empty_size
+            assert client.position_for_size(empty_size) == client.position_for_size(size) == 0
+
+            client.write(make_student(2))
+            client.flush()
+
+            assert client.size() > size
+            assert client.position_for_size(client.size()) == 1 << OFFSET_BITS
+            assert [key for _, key, _ in client.iter_keys('record_id', client.position_for_size(size))] == [1, 2]
+
+    def test_update_delete_compact(self, path):
+        with CompressedFileDataClient(path, Student, block_size=50) as client:
+            client.write_many([make_student(1), make_student(2)])
+            update_position = client.write_update(make_student(1, 'Петр'))
+            client.write_tombstone('record_id', 2)
+
+            assert [(marker, key) for marker, key, _, _ in client.iter_changes('record_id')] == [
+                ('', 1), ('', 2), ('~', 1), ('!', 2),
+            ]
+
+            new_positions = client.compact([update_position])
+
+            assert list(client.iter_read()) == [(make_student(1, 'Петр'), new_positions[update_position])]
+
+    @pytest.mark.parametrize('content', ('record_id,first_name\n1,first\n', None))
+    def test_invalid_file(self, tmp_path, content):
+        path = tmp_path / 'students.cz'
+        if content is not None:
+            path.write_text(content)
+
+        with pytest.raises(InvalidFile):
+            CompressedFileDataClient(str(path), Student)
+
+        assert content is not None or not path.exists()  # отсутствующий файл не создается
+
+    def test_data_access(self, path, tmp_path):
+        index_path = str(tmp_path / 'students.cz.idx')
+
+        with CompressedFileDataClient(path, Student, block_size=100) as client:
+            dao = IndexFileStudentDataAccess(client, index_path=index_path, secondary_indexes=True)
+            dao.add_students(make_student(record_id) for record_id in range(10))
+            dao.update_student(make_student(3, 'Петр'))
+            dao.delete_student(PrimaryKey(4))
+
+            assert dao.get_student(PrimaryKey(9)) == make_student(9)
+            assert dao.find_by_first_name('петр') == [make_student(3, 'Петр')]
+
+        # индекс на диске сохранен до записей, хвост файла доиндексируется по блокам
+        with CompressedFileDataClient(path, Student) as client:
+            dao = IndexFileStudentDataAccess(client, index_path=index_path)
+
+            assert dao.get_student(PrimaryKey(3)) == make_student(3, 'Петр')
+            with pytest.raises(RecordNotFound):
+                dao.get_student(PrimaryKey(4))
+
+            dao.compact()
+            assert len(list(client.iter_read())) == 9
+
+
+def test_convert_text_file(tmp_path):
+    source = FileDataClient('students_test.txt', Student)
+    target_path = str(tmp_path / 'students.cz')
+
+    assert convert_text_file(source, target_path, KEY_FIELD, batch_size=2) == 3
+
+    with CompressedFileDataClient(target_path, Student) as target:
+        assert [student for student, _ in target.iter_read()] == [student for student, _ in source.iter_read()]
+
+
+def test_convert_changed_text_file(tmp_path):
+    source_path = str(tmp_path / 'students.txt')
+    target_path = str(tmp_path / 'students.cz')
+    with open(source_path, 'w') as file:
+        file.write(','.join(FIELD_NAMES) + '\n')
+
+    dao = IndexFileStudentDataAccess(FileDataClient(source_path, Student))
+    dao.add_students(make_student(record_id) for record_id in range(5))
+    dao.update_student(make_student(1, 'Петр'))
+    dao.delete_student(PrimaryKey(2))
+
+    # переносятся только актуальные версии, новый файл индексируется без повторов id
+    assert convert_text_file(FileDataClient(source_path, Student), target_path, KEY_FIELD) == 4
+
+    with CompressedFileDataClient(target_path, Student) as target:
+        dao = IndexFileStudentDataAccess(target)
+
+        assert dao.get_student(PrimaryKey(1)) == make_student(1, 'Петр')
+        with pytest.raises(RecordNotFound):
+            dao.get_student(PrimaryKey(2))
@@ -1,3 +1,7 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from datetime import date
 from unittest.mock import MagicMock
 
 import pytest
@@ -5,9 +9,22 @@ import pytest
 from lib.data_access import FileStudentDataAccess, IndexFileStudentDataAccess
 from lib.entities import Student, PrimaryKey
 from lib.exceptions import RecordNotFound, DuplicateRecordId
+from lib.file_data_client import FileDataClient
+from lib.index_sidecar import IndexSidecar
+from lib.metrics import Metrics
 from tests.conftest import does_not_raise
 
 
+def as_changes(students):
+    """ Пары (студент, позиция) в виде строк-добавлений, как их отдает FileDataClient.iter_changes """
+    return [('', student.record_id, student, position) for student, position in students]
+
+
+def as_keys(students):
+    """ То же, но как их отдает FileDataClient.iter_keys: без сущностей """
+    return [('', student.record_id, position) for student, position in students]
+
+
 class TestFileStudentDataAccess:
     def test_add_student(self):
         file_client = MagicMock()
@@ -49,7 +66,7 @@ class TestFileStudentDataAccess:
     )
     def test_get_student(self, students, record_id_to_find, expected_result, expected_exception):
         file_client = MagicMock()
-        file_client.iter_read.return_value = students
+        file_client.iter_changes.return_value = as_changes(students)
 
         dao = FileStudentDataAccess(file_client)
 
@@ -57,6 +74,166 @@ class TestFileStudentDataAccess:
             result = dao.get_student(record_id_to_find)
             assert result == expected_result
 
+    def test_get_students(self):
+        students = [
+            (Student(record_id=PrimaryKey(1), first_name='first', last_name='last', birthday_date='2020-03-03'), 0),
+            (Student(record_id=PrimaryKey(2), first_name='das', last_name='das', birthday_date='2020-03-03'), 1),
+            (Student(record_id=PrimaryKey(3), first_name='cccc', last_name='aaa', birthday_date='2020-03-03'), 2),
+        ]
+        file_client = MagicMock()
+        file_client.iter_changes.return_value = as_changes(students)
+
+        dao = FileStudentDataAccess(file_client)
+
+        assert dao.get_students([PrimaryKey(3), PrimaryKey(7), PrimaryKey(1)]) == {
+            PrimaryKey(3): students[2][0],
+            PrimaryKey(7): None,
+            PrimaryKey(1): students[0][0],
+        }
+        file_client.iter_changes.assert_called_once_with('record_id')
+
+    def test_find_by_last_name(self):
+        students = [
+            (Student(record_id=PrimaryKey(1), first_name='first', last_name='Иванов', birthday_date='2020-03-03'), 0),
+            (Student(record_id=PrimaryKey(2), first_name='das', last_name='Иванова', birthday_date='2020-03-03'), 1),
+            (Student(record_id=PrimaryKey(3), first_name='cccc', last_name='Петров', birthday_date='2020-03-03'), 2),
+        ]
+        file_client = MagicMock()
+        file_client.iter_changes.return_value = as_changes(students)
+
+        dao = FileStudentDataAccess(file_client)
+
+        assert dao.find_by_last_name('иванов') == [students[0][0]]
+        assert dao.find_by_last_name('Ив', prefix=True) == [students[0][0], students[1][0]]
+
+    def test_find_by_birthday(self):
+        students = [
+            (Student(record_id=PrimaryKey(1), first_name='first', last_name='last', birthday_date='2001-03-03'), 0),
+            (Student(record_id=PrimaryKey(2), first_name='das', last_name='das', birthday_date='12-05-2001'), 1),
+            (Student(record_id=PrimaryKey(3), first_name='cccc', last_name='aaa', birthday_date='2002-01-01'), 2),
+        ]
+        file_client = MagicMock()
+        file_client.iter_changes.return_value = as_changes(students)
+
+        dao = FileStudentDataAccess(file_client)
+
+        assert dao.find_by_birthday(date(2001, 1, 1), date(2001, 12, 31)) == [students[0][0], students[1][0]]
+
+    def test_metrics(self):
+        students = [
+            (Student(record_id=PrimaryKey(1), first_name='first', last_name='last', birthday_date='2020-03-03'), 0),
+        ]
+        file_client = MagicMock()
+        file_client.iter_changes.return_value = as_changes(students)
+        file_client.write_many.return_value = [10, 20]
+        metrics = Metrics()
+
+        dao = FileStudentDataAccess(file_client, metrics=metrics)
+        dao.get_student(PrimaryKey(1))
+        with pytest.raises(RecordNotFound):
+            dao.get_student(PrimaryKey(2))
+        dao.add_students([students[0][0], students[0][0]])
+
+        snapshot = metrics.snapshot()
+        assert (snapshot['lookups'], snapshot['lookup_misses'], snapshot['appends']) == (2, 1, 2)
+        assert snapshot['lookup_seconds']['count'] == 2
+        assert snapshot['append_seconds']['count'] == 1
+
+    def test_update_and_delete(self, tmp_path):
+        data_path = tmp_path / 'students.txt'
+        data_path.write_text(
+            'record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n2,second,last,12-02-2000\n'
+        )
+        dao = FileStudentDataAccess(FileDataClient(str(data_path), Student))
+        updated = Student(record_id=PrimaryKey(1), first_name='new', last_name='other', birthday_date='12-02-2000')
+
+        dao.update_student(updated)
+        dao.delete_student(PrimaryKey(2))
+
+        assert dao.get_student(PrimaryKey(1)) == updated
+        with pytest.raises(RecordNotFound):
+            dao.get_student(PrimaryKey(2))
+        with pytest.raises(RecordNotFound):
+            dao.update_student(Student(PrimaryKey(2), 'second', 'last', '12-02-2000'))
+        with pytest.raises(RecordNotFound):
+            dao.delete_student(PrimaryKey(3))
+
+        assert dao.get_students([PrimaryKey(1), PrimaryKey(2)]) == {PrimaryKey(1): updated, PrimaryKey(2): None}
+        assert dao.find_by_last_name('last') == []
+        assert list(dao.query().select('first_name')) == [{'first_name': 'new'}]
+
+        dao.compact()
+
+        assert data_path.read_text() == 'record_id,first_name,last_name,birthday_date\n1,new,other,12-02-2000\n'
+        assert dao.get_student(PrimaryKey(1)) == updated
+
+    def test_bloom_filter(self, tmp_path):
+        data_path = tmp_path / 'students.txt'
+        bloom_path = str(tmp_path / 'students.txt.bloom')
+        data_path.write_text(
+            'record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n2,second,last,12-02-2000\n!2,,,\n'
+        )
+        metrics = Metrics()
+        dao = FileStudentDataAccess(
+            FileDataClient(str(data_path), Student), metrics=metrics, bloom_filter=True, bloom_path=bloom_path
+        )
+
+        # первый проход строит фильтр, дальше промахи по id, которых нет в файле, отсеиваются без прохода
+        assert dao.get_student(PrimaryKey(1)).first_name == 'first'
+        for record_id in range(100, 200):
+            with pytest.raises(RecordNotFound):
+                dao.get_student(PrimaryKey(record_id))
+        with pytest.raises(RecordNotFound):
+            dao.get_student(PrimaryKey(2))  # удаленный id остается в фильтре, но проход его не находит
+        with pytest.raises(RecordNotFound):
+            dao.delete_student(PrimaryKey(300))
+        assert dao.get_students([PrimaryKey(400), PrimaryKey(401)]) == {PrimaryKey(400): None, PrimaryKey(401): None}
+
+        snapshot = metrics.snapshot()
+        assert snapshot['bloom_rejects'] >= 100
+        assert snapshot['lookup_misses'] == 103
+
+        student = Student(PrimaryKey(150), 'added', 'last', '12-02-2000')
+        dao.add_student(student)
+        assert dao.get_student(PrimaryKey(150)) == student
+
+        # запись другого объекта (или процесса) досканируется перед проверкой фильтра
+        FileStudentDataAccess(FileDataClient(str(data_path), Student)).add_student(
+            Student(PrimaryKey(160), 'other', 'last', '12-02-2000')
+        )
+        assert dao.get_student(PrimaryKey(160)).first_name == 'other'
+
+        dao.compact()
+        FileStudentDataAccess(FileDataClient(str(data_path), Student)).add_student(
+            Student(PrimaryKey(170), 'after', 'compact', '12-02-2000')
+        )
+        assert dao.get_student(PrimaryKey(170)).first_name == 'after'
+
+        # сохраненный фильтр загружается новым объектом без прохода по файлу
+        reloaded_metrics = Metrics()
+        file_client = FileDataClient(str(data_path), Student, metrics=reloaded_metrics)
+        reloaded = FileStudentDataAccess(file_client, bloom_filter=True, bloom_path=bloom_path)
+        with pytest.raises(RecordNotFound):
+            reloaded.get_student(PrimaryKey(999))
+        assert reloaded_metrics.snapshot().get('bytes_read', 0) == 0
+        assert reloaded.get_student(PrimaryKey(170)).first_name == 'after'
+
+    def test_bloom_filter_rebuild(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('lib.bloom.MIN_CAPACITY', 1)
+        data_path = tmp_path / 'students.txt'
+        data_path.write_text('record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n')
+        dao = FileStudentDataAccess(FileDataClient(str(data_path), Student), bloom_filter=True)
+        dao.get_student(PrimaryKey(1))
+        capacity = dao._bloom.capacity
+
+        dao.add_students([Student(PrimaryKey(record_id), 'n', 'l', 'd') for record_id in range(2, 2 + capacity)])
+
+        # фильтр переполнен: поиск проходит файл и строит фильтр заново, побольше
+        assert dao.get_student(PrimaryKey(2 + capacity - 1)).first_name == 'n'
+        assert dao._bloom.capacity > capacity
+        with pytest.raises(RecordNotFound):
+            dao.get_student(PrimaryKey(10_000))
+
 
 class TestIndexFileStudentDataAccess:
     @pytest.mark.parametrize(
@@ -68,72 +245,81 @@ class TestIndexFileStudentDataAccess:
                     (Student(record_id=PrimaryKey(3), first_name='das', last_name='das', birthday_date='2020-03-03'), 22),
                     (Student(record_id=PrimaryKey(8), first_name='cccc', last_name='aaa', birthday_date='2020-03-03'), 33),
                 ],
-                [None, 11, None, 22, None, None, None, None, 33, None, None, None, None, None],
+                [(1, 11), (3, 22), (8, 33)],
             ),
         ),
     )
     def test_create_index(self, students, expected_index):
         file_client = MagicMock()
-        file_client.iter_read.return_value = students
+        file_client.iter_keys.return_value = as_keys(students)
 
         dao = IndexFileStudentDataAccess(file_client)
-        assert dao._index_array == expected_index
+        assert list(dao._index.items()) == expected_index
+
+    def test_create_index_duplicate(self):
+        file_client = MagicMock()
+        file_client.iter_keys.return_value = as_keys([
+            (Student(record_id=PrimaryKey(1), first_name='first', last_name='last', birthday_date='2020-03-03'), 11),
+            (Student(record_id=PrimaryKey(1), first_name='das', last_name='das', birthday_date='2020-03-03'), 22),
+        ])
+
+        with pytest.raises(DuplicateRecordId):
+            IndexFileStudentDataAccess(file_client)
 
     @pytest.mark.parametrize(
-        'current_index, record_id, expected_index, expected_exception',
+        'current_index, record_id, expected_exception',
         (
-            (
-                [], PrimaryKey(3), [None, None, None, None, None, None, None, None], does_not_raise()
-            ),
-            (
-                [None, 123], PrimaryKey(1), [None, 123], pytest.raises(DuplicateRecordId)
-            ),
+            ([], PrimaryKey(3), does_not_raise()),
+            ([(1, 123)], PrimaryKey(1), pytest.raises(DuplicateRecordId)),
         ),
     )
-    def test_validate_record_id(self, current_index, record_id, expected_index, expected_exception):
+    def test_validate_record_id(self, current_index, record_id, expected_exception):
         file_client = MagicMock()
-        file_client.iter_read.return_value = ()
+        file_client.iter_keys.return_value = as_keys(current_index and [
+            (Student(record_id=PrimaryKey(key), first_name='1', last_name='1', birthday_date='1'), position)
+            for key, position in current_index
+        ])
 
         dao = IndexFileStudentDataAccess(file_client)
-        dao._index_array = current_index
 
         with expected_exception:
             dao._validate_record_id(record_id)
-            assert dao._index_array == expected_index
 
     @pytest.mark.parametrize(
-        'key, current_index, expected_result, expected_exception',
+        'key, expected_result, expected_exception',
         (
-            (PrimaryKey(2), [None, None, 12], 12, does_not_raise()),
-            (PrimaryKey(1), [None, None, 12], None, pytest.raises(RecordNotFound)),
-            (PrimaryKey(10), [None, None, 12], None, pytest.raises(RecordNotFound))
+            (PrimaryKey(2), 12, does_not_raise()),
+            (PrimaryKey(1), None, pytest.raises(RecordNotFound)),
+            (PrimaryKey(10000), None, pytest.raises(RecordNotFound))
         ),
     )
-    def test_get_position_by_key(self, key, current_index, expected_result, expected_exception):
+    def test_get_position_by_key(self, key, expected_result, expected_exception):
         file_client = MagicMock()
-        file_client.iter_read.return_value = ()
+        file_client.iter_keys.return_value = as_keys([
+            (Student(record_id=PrimaryKey(2), first_name='1', last_name='1', birthday_date='1'), 12),
+        ])
 
         dao = IndexFileStudentDataAccess(file_client)
-        dao._index_array = current_index
 
         with expected_exception:
             result = dao._get_position_by_key(key)
             assert result == expected_result
 
     @pytest.mark.parametrize(
-        'record_id, current_index, position, expected_index, expected_exception',
+        'record_id, position, expected_index, expected_exception',
         (
-            (PrimaryKey(2), [], 123, [None, None, 123, None, None, None], does_not_raise()),
-            (PrimaryKey(1), [None, 222], 123, [None, 222], pytest.raises(DuplicateRecordId)),
+            (PrimaryKey(2), 123, [(1, 222), (2, 123)], does_not_raise()),
+            (PrimaryKey(1), 123, [(1, 222)], pytest.raises(DuplicateRecordId)),
         ),
     )
-    def test_add_student(self, record_id, current_index, position, expected_index, expected_exception):
+    def test_add_student(self, record_id, position, expected_index, expected_exception):
         file_client = MagicMock()
-        file_client.iter_read.return_value = ()
+        file_client.iter_keys.return_value = as_keys([
+            (Student(record_id=PrimaryKey(1), first_name='1', last_name='1', birthday_date='1'), 222),
+        ])
         file_client.write.return_value = position
 
         dao = IndexFileStudentDataAccess(file_client)
-        dao._index_array = current_index
 
         student = Student(
             record_id=record_id,
@@ -145,4 +331,574 @@ class TestIndexFileStudentDataAccess:
         with expected_exception:
             dao.add_student(student)
 
-        assert dao._index_array == expected_index
+        assert list(dao._index.items()) == expected_index
+
+    @pytest.mark.parametrize(
+        'record_ids, expected_index, expected_exception',
+        (
+            ([2, 3], [(1, 222), (2, 300), (3, 310)], does_not_raise()),
+            ([2, 1], [(1, 222)], pytest.raises(DuplicateRecordId)),
+            ([2, 2], [(1, 222)], pytest.raises(DuplicateRecordId)),
+        ),
+    )
+    def test_add_students(self, record_ids, expected_index, expected_exception):
+        file_client = MagicMock()
+        file_client.iter_keys.return_value = as_keys([
+            (Student(record_id=PrimaryKey(1), first_name='1', last_name='1', birthday_date='1'), 222),
+        ])
+        file_client.write_many.side_effect = lambda students: [300 + idx * 10 for idx in range(len(students))]
+
+        dao = IndexFileStudentDataAccess(file_client)
+        students = [
+            Student(record_id=PrimaryKey(record_id), first_name='123', last_name='123', birthday_date='123')
+            for record_id in record_ids
+        ]
+
+        with expected_exception:
+            dao.add_students(students)
+
+        # при ошибке проверки в файл ничего не пишется
+        assert file_client.write_many.called == (len(expected_index) > 1)
+        assert list(dao._index.items()) == expected_index
+
+    def test_get_students(self):
+        students = [
+            (Student(record_id=PrimaryKey(1), first_name='first', last_name='last', birthday_date='2020-03-03'), 30),
+            (Student(record_id=PrimaryKey(2), first_name='das', last_name='das', birthday_date='2020-03-03'), 10),
+            (Student(record_id=PrimaryKey(3), first_name='cccc', last_name='aaa', birthday_date='2020-03-03'), 20),
+        ]
+        file_client = MagicMock()
+        file_client.iter_keys.return_value = as_keys(students)
+        file_client.read_at_positions.side_effect = lambda positions: sorted(
+            [(student, position) for student, position in students if position in positions],
+            key=lambda item: item[1],
+        )
+
+        dao = IndexFileStudentDataAccess(file_client)
+
+        assert dao.get_students([PrimaryKey(1), PrimaryKey(5), PrimaryKey(3)]) == {
+            PrimaryKey(1): students[0][0],
+            PrimaryKey(5): None,
+            PrimaryKey(3): students[2][0],
+        }
+        assert sorted(file_client.read_at_positions.call_args[0][0]) == [20, 30]
+
+    def test_cache(self):
+        student = Student(record_id=PrimaryKey(1), first_name='first', last_name='last', birthday_date='2020-03-03')
+        file_client = MagicMock()
+        file_client.iter_keys.return_value = as_keys([(student, 10)])
+        file_client.read_at_position.return_value = student
+
+        dao = IndexFileStudentDataAccess(file_client, cache_size=10)
+
+        assert dao.get_student(PrimaryKey(1)) == student
+        assert dao.get_student(PrimaryKey(1)) == student
+        assert dao.get_students([PrimaryKey(1)]) == {PrimaryKey(1): student}
+
+        file_client.read_at_position.assert_called_once_with(10)
+        assert dao.cache_info() == {"hits": 2, "misses": 1, "size": 1, "max_size": 10}
+
+    def test_secondary_indexes(self, tmp_path):
+        data_path = tmp_path / "students.txt"
+        data_path.write_text(
+            "record_id,first_name,last_name,birthday_date\n"
+            "1,Иван,Иванов,2001-03-03\n"
+            "2,Петр,Петров,12-05-2001\n",
+            encoding="utf-8",
+        )
+        file_client = FileDataClient(str(data_path), Student, encoding="utf-8")
+        dao = IndexFileStudentDataAccess(file_client, secondary_indexes=True)
+
+        student = Student(record_id=PrimaryKey(3), first_name='Анна', last_name='Иванова', birthday_date='2002-01-01')
+        dao.add_student(student)
+
+        assert [found.record_id for found in dao.find_by_last_name('иванов')] == [1]
+        assert [found.record_id for found in dao.find_by_last_name('ИВАН', prefix=True)] == [1, 3]
+        assert [found.record_id for found in dao.find_by_first_name('анна')] == [3]
+        assert [found.record_id for found in dao.find_by_birthday(date(2001, 1, 1), date(2002, 1, 1))] == [1, 2, 3]
+        assert dao.find_by_birthday(date(2003, 1, 1), date(2004, 1, 1)) == []
+
+    def test_index_sidecar(self, tmp_path):
+        data_path = tmp_path / "students.txt"
+        index_path = tmp_path / "students.txt.idx"
+        with open(data_path, "w") as file:
+            file.write("record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n")
+
+        file_client = FileDataClient(str(data_path), Student)
+        dao = IndexFileStudentDataAccess(file_client, index_path=str(index_path))
+        student = Student(record_id=PrimaryKey(2), first_name='das', last_name='das', birthday_date='2020-03-03')
+        dao.add_student(student)
+
+        # при повторном запуске индекс берется с диска, файл не сканируется
+        file_client = MagicMock(wraps=FileDataClient(str(data_path), Student))
+        file_client.file_path = str(data_path)
+        dao = IndexFileStudentDataAccess(file_client, index_path=str(index_path))
+
+        file_client.iter_keys.assert_called_once_with('record_id', data_path.stat().st_size, 1)
+        assert dao._get_position_by_key(PrimaryKey(1)) == 45
+        assert dao.get_student(PrimaryKey(2)) == student
+
+    def test_stale_index_sidecar(self, tmp_path):
+        data_path = tmp_path / "students.txt"
+        index_path = tmp_path / "students.txt.idx"
+        data_path.write_text(
+            "record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n2,second,last,12-02-2000\n"
+        )
+        # индекс соответствует файлу по контрольной сумме, но позиции в нем неверны: середина строки и чужая запись
+        IndexSidecar(str(index_path)).save(str(data_path), [(1, 70), (2, 45)])
+
+        dao = IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), index_path=str(index_path))
+
+        # чтение замечает чужую запись по позиции и перестраивает индекс вместе с сохраненным
+        assert dao.get_student(PrimaryKey(1)).first_name == 'first'
+        assert dao.get_students([PrimaryKey(2)])[PrimaryKey(2)].first_name == 'second'
+        entries, _ = IndexSidecar(str(index_path)).load(str(data_path))
+        assert list(entries) == [1, 45, 2, 69]
+
+    def test_parallel_index(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('lib.parallel_index.MIN_RANGE_SIZE', 0)  # сканируем в пуле даже маленький файл
+        data_path = tmp_path / "students.txt"
+        lines = ["record_id,first_name,last_name,birthday_date\n"]
+        lines += [f"{record_id},first,last,12-02-2000\n" for record_id in range(200)]
+        data_path.write_text("".join(lines))
+
+        file_client = FileDataClient(str(data_path), Student)
+        dao = IndexFileStudentDataAccess(file_client, index_workers=4)
+
+        assert list(dao._index.items()) == list(IndexFileStudentDataAccess(file_client)._index.items())
+
+        # дубликат в другом диапазоне файла
+        with open(data_path, "a") as file:
+            file.write("0,first,last,12-02-2000\n")
+
+        with pytest.raises(DuplicateRecordId):
+            IndexFileStudentDataAccess(file_client, index_workers=4)
+
+    def test_metrics(self, tmp_path):
+        data_path = tmp_path / 'students.txt'
+        data_path.write_text('record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n')
+        metrics = Metrics()
+
+        file_client = FileDataClient(str(data_path), Student, metrics=metrics)
+        dao = IndexFileStudentDataAccess(file_client, metrics=metrics, cache_size=10)
+        dao.add_student(Student(PrimaryKey(2), 'second', 'last', '12-02-2000'))
+
+        dao.get_student(PrimaryKey(2))
+        dao.get_student(PrimaryKey(2))  # из кэша
+        with pytest.raises(RecordNotFound):
+            dao.get_student(PrimaryKey(3))
+
+        snapshot = metrics.snapshot()
+        assert snapshot['index_size'] == 2
+        assert snapshot['index_build_seconds']['count'] == 1
+        assert (snapshot['lookups'], snapshot['cache_hits'], snapshot['lookup_misses']) == (3, 1, 1)
+        assert snapshot['appends'] == 1
+        assert snapshot['read_seconds']['count'] == 1
+        assert snapshot['bytes_read'] > 0
+        assert snapshot['decode_seconds']['count'] == 1  # только чтение по позиции: индекс строится без разбора строк
+
+    def test_update_and_delete(self, tmp_path):
+        data_path = tmp_path / 'students.txt'
+        index_path = tmp_path / 'students.txt.idx'
+        data_path.write_text(
+            'record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n2,second,last,12-02-2000\n'
+        )
+        dao = IndexFileStudentDataAccess(
+            FileDataClient(str(data_path), Student), index_path=str(index_path), cache_size=10, secondary_indexes=True
+        )
+        updated = Student(record_id=PrimaryKey(1), first_name='new', last_name='other', birthday_date='12-03-2001')
+
+        dao.get_student(PrimaryKey(1))  # старая версия попадает в кэш
+        dao.update_student(updated)
+        dao.delete_student(PrimaryKey(2))
+
+        def check(dao):
+            assert dao.get_student(PrimaryKey(1)) == updated
+            with pytest.raises(RecordNotFound):
+                dao.get_student(PrimaryKey(2))
+            assert dao.find_by_last_name('last') == []
+            assert dao.find_by_last_name('other') == [updated]
+            assert dao.find_by_birthday(date(2000, 1, 1), date(2000, 12, 31)) == []
+            assert list(dao.query().select('record_id')) == [{'record_id': 1}]
+
+        check(dao)
+        with pytest.raises(RecordNotFound):
+            dao.update_student(Student(PrimaryKey(2), 'second', 'last', '12-02-2000'))
+        with pytest.raises(RecordNotFound):
+            dao.delete_student(PrimaryKey(2))
+
+        # индекс с диска и индекс, построенный сканированием, учитывают изменения и удаления
+        check(IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), index_path=str(index_path),
+                                         secondary_indexes=True))
+        check(IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), secondary_indexes=True))
+
+        dao.add_student(Student(PrimaryKey(2), 'again', 'last', '12-02-2000'))  # удаленный id можно добавить заново
+        dao.compact()
+
+        assert data_path.read_text() == (
+            'record_id,first_name,last_name,birthday_date\n1,new,other,12-03-2001\n2,again,last,12-02-2000\n'
+        )
+        assert dao.get_student(PrimaryKey(1)) == updated
+        assert [student.first_name for student in dao.find_by_last_name('last')] == ['again']
+
+        reloaded = IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), index_path=str(index_path))
+        assert list(reloaded._index.items()) == list(dao._index.items())
+
+    def test_buffered_file_client(self, tmp_path):
+        data_path = tmp_path / 'students.txt'
+        index_path = tmp_path / 'students.txt.idx'
+        data_path.write_text('record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n')
+        file_client = FileDataClient(str(data_path), Student, keep_open=True, buffer_size=1 << 20)
+        dao = IndexFileStudentDataAccess(file_client, index_path=str(index_path))
+        student = Student(PrimaryKey(2), 'second', 'last', '12-02-2000')
+
+        dao.add_student(student)
+
+        assert dao.get_student(PrimaryKey(2)) == student  # запись отдается из буфера клиента
+        assert dao.get_students([PrimaryKey(1), PrimaryKey(2)])[PrimaryKey(2)] == student
+        assert len(data_path.read_text().splitlines()) == 2
+
+        file_client.close()
+
+        # сохраненный индекс не знал о записи из буфера, хвост файла доиндексирован при запуске
+        reloaded = IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), index_path=str(index_path))
+        assert reloaded.get_student(PrimaryKey(2)) == student
+
+        with pytest.raises(ValueError):
+            IndexFileStudentDataAccess(FileDataClient(str(data_path), Student, buffer_size=1), multiprocess=True)
+
+    def test_parallel_index_with_changes(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('lib.parallel_index.MIN_RANGE_SIZE', 0)
+        data_path = tmp_path / "students.txt"
+        lines = ["record_id,first_name,last_name,birthday_date\n"]
+        lines += [f"{record_id},first,last,12-02-2000\n" for record_id in range(100)]
+        lines += [f"~{record_id},second,last,12-02-2000\n" for record_id in range(0, 100, 2)]
+        lines += [f"!{record_id},,,\n" for record_id in range(0, 100, 3)]
+        data_path.write_text("".join(lines))
+
+        file_client = FileDataClient(str(data_path), Student)
+
+        assert list(IndexFileStudentDataAccess(file_client, index_workers=4)._index.items()) == list(
+            IndexFileStudentDataAccess(file_client)._index.items()
+        )
+
+    def test_multiprocess_compact(self, tmp_path):
+        data_path = tmp_path / 'students.txt'
+        data_path.write_text('record_id,first_name,last_name,birthday_date\n')
+        dao = IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), multiprocess=True)
+
+        with pytest.raises(RuntimeError):
+            dao.compact()
+
+
+class TestIndexFileStudentDataAccessConcurrency:
+    @pytest.mark.parametrize('keep_open', (False, True))
+    @pytest.mark.parametrize('index_mode', ('dense', 'sparse'))
+    def test_stress(self, tmp_path, keep_open, index_mode):
+        data_path = tmp_path / "students.txt"
+        data_path.write_text("record_id,first_name,last_name,birthday_date\n")
+        file_client = FileDataClient(str(data_path), Student, keep_open=keep_open)
+        dao = IndexFileStudentDataAccess(file_client, index_mode=index_mode, cache_size=16)
+
+        writers_count, ids_count = 8, 200
+        added = []
+        duplicates = []
+        errors = []
+
+        def make_student(record_id):
+            return Student(record_id=PrimaryKey(record_id), first_name=f'n{record_id}', last_name='l', birthday_date='d')
+
+        def writer(writer_id):
+            # все писатели пытаются добавить одни и те же id, в обратном порядке через одного
+            record_ids = range(ids_count) if writer_id % 2 else reversed(range(ids_count))
+            for record_id in record_ids:
+                try:
+                    dao.add_student(make_student(record_id))
+                    added.append(record_id)
+                except DuplicateRecordId:
+                    duplicates.append(record_id)
+
+        def reader():
+            for _ in range(ids_count * 5):
+                record_id = random.randrange(ids_count)
+                try:
+                    if dao.get_student(PrimaryKey(record_id)) != make_student(record_id):
+                        errors.append(record_id)
+                except RecordNotFound:
+                    pass  # еще не добавлен
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            futures = [executor.submit(writer, idx) for idx in range(writers_count)]
+            futures += [executor.submit(reader) for _ in range(8)]
+            for future in futures:
+                future.result()
+
+        file_client.close()
+
+        assert errors == []
+        assert sorted(added) == list(range(ids_count))  # каждый id добавлен ровно один раз
+        assert len(duplicates) == ids_count * (writers_count - 1)
+
+        records = [student.record_id for student, _ in FileDataClient(str(data_path), Student).iter_read()]
+        assert sorted(records) == list(range(ids_count))
+
+
+    @pytest.mark.parametrize('keep_open', (False, True))
+    def test_read_during_compact(self, tmp_path, keep_open):
+        data_path = tmp_path / "students.txt"
+        lines = ["record_id,first_name,last_name,birthday_date\n"]
+        lines += [f"{record_id},n{record_id},l,d\n" for record_id in range(300)]
+        data_path.write_text("".join(lines))
+        file_client = FileDataClient(str(data_path), Student, keep_open=keep_open)
+        dao = IndexFileStudentDataAccess(file_client)
+        errors = []
+
+        def updater():
+            for round_id in range(5):
+                for record_id in range(0, 300, 7):
+                    dao.update_student(Student(PrimaryKey(record_id), f'n{record_id}', f'l{round_id}', 'd'))
+                dao.compact()
+
+        def reader():
+            for _ in range(1000):
+                record_id = random.randrange(300)
+                student = dao.get_student(PrimaryKey(record_id))
+                if (student.record_id, student.first_name) != (record_id, f'n{record_id}'):
+                    errors.append(record_id)
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(updater)] + [executor.submit(reader) for _ in range(4)]
+            for future in futures:
+                future.result()
+
+        assert errors == []
+        assert len(list(file_client.iter_read())) == 300
+
+
+def add_students_in_process(data_path, record_ids):
+    """ Добавляет студентов из отдельного процесса. Отдает id, которые удалось добавить """
+    dao = IndexFileStudentDataAccess(FileDataClient(data_path, Student), multiprocess=True)
+    added = []
+
+    for record_id in record_ids:
+        try:
+            dao.add_student(
+                Student(record_id=PrimaryKey(record_id), first_name='first', last_name='last', birthday_date='d')
+            )
+            added.append(record_id)
+        except DuplicateRecordId:
+            pass
+
+    return added
+
+
+class TestIndexFileStudentDataAccessLazyIndex:
+    LINES = (
+        'record_id,first_name,last_name,birthday_date\n'
+        '1,first,last,12-02-2000\n'
+        '2,second,last,12-02-2000\n'
+        '3,third,last,12-02-2000\n'
+        '4,fourth,last,12-02-2000\n'
+        '~2,updated,last,12-02-2000\n'
+        '!3,,,\n'
+    )
+
+    @pytest.fixture
+    def paused_build(self, monkeypatch):
+        """
+            Построение индекса по одной строке, которое останавливается после второй строки
+            Отдает события (paused, resume): paused - построение остановилось, resume.set() - продолжить
+        """
+        paused, resume = threading.Event(), threading.Event()
+        iter_keys = IndexFileStudentDataAccess._iter_keys
+
+        def paused_iter_keys(dao, start_position):
+            for idx, change in enumerate(iter_keys(dao, start_position)):
+                if idx == 2:
+                    paused.set()
+                    resume.wait()
+                yield change
+
+        monkeypatch.setattr('lib.data_access.BUILD_CHUNK_SIZE', 1)
+        monkeypatch.setattr(IndexFileStudentDataAccess, '_iter_keys', paused_iter_keys)
+        yield paused, resume
+        resume.set()
+
+    def test_scan_during_build(self, tmp_path, paused_build):
+        data_path = tmp_path / 'students.txt'
+        data_path.write_text(self.LINES)
+        metrics = Metrics()
+        dao = IndexFileStudentDataAccess(
+            FileDataClient(str(data_path), Student), lazy_index='scan', cache_size=16, metrics=metrics
+        )
+        paused, resume = paused_build
+        assert paused.wait(timeout=5)
+
+        # id 1 и 2 уже в индексе, остальное дочитывается из файла
+        assert 0 < dao.index_build_progress() < 1
+        assert dao.get_student(PrimaryKey(1)).first_name == 'first'
+        assert dao.get_student(PrimaryKey(2)).first_name == 'updated'
+        assert dao.get_student(PrimaryKey(4)).first_name == 'fourth'
+        with pytest.raises(RecordNotFound):
+            dao.get_student(PrimaryKey(3))
+
+        found = dao.get_students([PrimaryKey(2), PrimaryKey(3), PrimaryKey(4)])
+        assert [student and student.first_name for student in found.values()] == ['updated', None, 'fourth']
+        assert dao.cache_info()['size'] == 0  # до конца построения в кэш ничего не попадает
+
+        # хвост файла проиндексирован первым промахом - повторный поиск его не сканирует
+        dao.file_client.iter_keys = MagicMock(wraps=dao.file_client.iter_keys)
+        assert dao.get_student(PrimaryKey(4)).first_name == 'fourth'
+        assert dao.file_client.iter_keys.call_args.args[1] == len(self.LINES) - len('!3,,,\n')
+
+        assert not dao.wait_for_index(timeout=0.01)
+        resume.set()
+        assert dao.wait_for_index(timeout=5)
+        assert dao.index_build_progress() == 1.0
+        assert metrics.snapshot()['index_build_progress'] == 1.0
+        assert dao.get_position(PrimaryKey(2)) > dao.get_position(PrimaryKey(4))
+
+    def test_wait_during_build(self, tmp_path, paused_build):
+        data_path = tmp_path / 'students.txt'
+        data_path.write_text(self.LINES)
+        dao = IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), lazy_index='wait')
+        student = Student(PrimaryKey(5), 'fifth', 'last', '12-02-2000')
+        paused, resume = paused_build
+        assert paused.wait(timeout=5)
+
+        assert dao.get_student(PrimaryKey(1)).first_name == 'first'
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            lookup = executor.submit(dao.get_student, PrimaryKey(4))
+            write = executor.submit(dao.add_student, student)
+
+            # поиск ждет, пока построение дойдет до записи, запись - конца построения
+            assert len(wait([lookup, write], timeout=0.05).not_done) == 2
+            resume.set()
+
+            assert lookup.result(timeout=5).first_name == 'fourth'
+            write.result(timeout=5)
+
+        assert dao.get_student(PrimaryKey(2)).first_name == 'updated'
+        assert dao.get_student(PrimaryKey(5)) == student
+        with pytest.raises(RecordNotFound):
+            dao.get_student(PrimaryKey(3))
+
+    def test_build_error(self, tmp_path, monkeypatch):
+        data_path = tmp_path / 'students.txt'
+        data_path.write_text(self.LINES)
+
+        def broken_iter_keys(dao, start_position):
+            raise OSError('disk error')
+            yield
+
+        monkeypatch.setattr(IndexFileStudentDataAccess, '_iter_keys', broken_iter_keys)
+        dao = IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), lazy_index='wait')
+
+        with pytest.raises(RuntimeError):
+            dao.wait_for_index(timeout=5)
+        with pytest.raises(RuntimeError):
+            dao.get_student(PrimaryKey(1))
+
+    @pytest.mark.parametrize(
+        'lazy_index, multiprocess, expected_exception',
+        (
+            (None, True, does_not_raise()),
+            ('wait', False, does_not_raise()),
+            ('scan', True, pytest.raises(ValueError)),
+            ('later', False, pytest.raises(ValueError)),
+        ),
+    )
+    def test_options(self, tmp_path, lazy_index, multiprocess, expected_exception):
+        data_path = tmp_path / 'students.txt'
+        data_path.write_text(self.LINES)
+
+        with expected_exception:
+            dao = IndexFileStudentDataAccess(
+                FileDataClient(str(data_path), Student), lazy_index=lazy_index, multiprocess=multiprocess
+            )
+            assert dao.wait_for_index(timeout=5)
+            assert dao.lookups_in_memory() is not multiprocess
+
+
+class TestIndexFileStudentDataAccessMultiprocess:
+    def test_refresh_on_miss(self, tmp_path):
+        data_path = tmp_path / "students.txt"
+        data_path.write_text("record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n")
+
+        first = IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), multiprocess=True)
+        second = IndexFileStudentDataAccess(
+            FileDataClient(str(data_path), Student, keep_open=True), multiprocess=True, secondary_indexes=True
+        )
+        student = Student(record_id=PrimaryKey(2), first_name='das', last_name='das', birthday_date='2020-03-03')
+
+        first.add_student(student)
+
+        # второй экземпляр видит запись после дочитывания хвоста файла
+        assert second.get_student(PrimaryKey(2)) == student
+        assert second.find_by_last_name('das') == [student]
+        with pytest.raises(DuplicateRecordId):
+            second.add_student(student)
+        with pytest.raises(RecordNotFound):
+            second.get_student(PrimaryKey(3))
+
+    def test_refresh_on_hit(self, tmp_path):
+        data_path = tmp_path / "students.txt"
+        data_path.write_text(
+            "record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n2,second,last,12-02-2000\n"
+        )
+
+        first = IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), multiprocess=True)
+        second = IndexFileStudentDataAccess(
+            FileDataClient(str(data_path), Student, keep_open=True), multiprocess=True, cache_size=10
+        )
+        updated = Student(record_id=PrimaryKey(1), first_name='das', last_name='das', birthday_date='2020-03-03')
+
+        # записи уже в индексе и в кэше второго экземпляра
+        assert second.get_student(PrimaryKey(1)).first_name == 'first'
+        assert second.get_students([PrimaryKey(2)])[PrimaryKey(2)].first_name == 'second'
+
+        first.update_student(updated)
+        first.delete_student(PrimaryKey(2))
+
+        # второй экземпляр видит чужие изменения, а не старую версию
+        assert second.get_student(PrimaryKey(1)) == updated
+        assert second.get_students([PrimaryKey(1), PrimaryKey(2)]) == {PrimaryKey(1): updated, PrimaryKey(2): None}
+        with pytest.raises(RecordNotFound):
+            second.get_student(PrimaryKey(2))
+        with pytest.raises(RecordNotFound):
+            second.get_position(PrimaryKey(2))
+
+    def test_add_during_build(self, tmp_path, monkeypatch):
+        data_path = tmp_path / "students.txt"
+        data_path.write_text("record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n")
+        index_path = str(tmp_path / "students.txt.idx")
+        writer = IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), multiprocess=True)
+        student = Student(record_id=PrimaryKey(2), first_name='das', last_name='das', birthday_date='2020-03-03')
+        iter_keys = IndexFileStudentDataAccess._iter_keys
+
+        def iter_keys_and_add(dao, start_position):
+            # другой процесс дописывает файл, пока индекс строится
+            yield from iter_keys(dao, start_position)
+            writer.add_student(student)
+
+        monkeypatch.setattr(IndexFileStudentDataAccess, '_iter_keys', iter_keys_and_add)
+        IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), index_path=index_path, multiprocess=True)
+        monkeypatch.undo()
+
+        # сохраненный индекс учитывает весь файл, поэтому запись должна в нем быть
+        reader = IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), index_path=index_path)
+        assert reader.get_student(PrimaryKey(2)) == student
+
+    def test_concurrent_processes(self, tmp_path):
+        data_path = tmp_path / "students.txt"
+        data_path.write_text("record_id,first_name,last_name,birthday_date\n")
+        record_ids = list(range(50))
+
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(add_students_in_process, [str(data_path)] * 4, [record_ids] * 4))
+
+        # каждый id добавлен ровно одним процессом
+        assert sorted(sum(results, [])) == record_ids
+        records = [student.record_id for student, _ in FileDataClient(str(data_path), Student).iter_read()]
+        assert sorted(records) == record_ids
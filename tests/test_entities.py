@@ -31,3 +31,35 @@ class TestStudent:
             'last_name': 'last',
             'birthday_date': '2020-03-03',
         }
+
+    def test_compile_loader(self):
+        load = Student.compile_loader(['last_name', 'record_id', 'birthday_date', 'first_name'])
+
+        assert load(['last', '123', '2020-03-03', 'first']) == Student(
+            record_id=PrimaryKey(123),
+            first_name='first',
+            last_name='last',
+            birthday_date='2020-03-03'
+        )
+
+    def test_compile_dumper(self):
+        student = Student(
+            record_id=PrimaryKey(123),
+            first_name='first',
+            last_name='last',
+            birthday_date='2020-03-03'
+        )
+
+        assert Student.compile_dumper(['last_name', 'record_id'])(student) == ('last', 123)
+        assert Student.compile_dumper(['first_name'])(student) == ('first',)
+
+    def test_slots(self):
+        student = Student(
+            record_id=PrimaryKey(123),
+            first_name='first',
+            last_name='last',
+            birthday_date='2020-03-03'
+        )
+
+        assert not hasattr(student, '__dict__')
+        assert not hasattr(student.record_id, '__dict__')
@@ -1,3 +1,7 @@
+import time
+
+import pytest
+
 from lib.entities import Student, PrimaryKey
 from lib.file_data_client import FileDataClient
 
@@ -25,6 +29,19 @@ class TestFileDataClient:
         ]
         assert [student for student in client.iter_read()] == students
 
+    def test_iter_rows(self):
+        client = FileDataClient('students_test.txt', Student)
+        assert list(client.iter_rows(69)) == [
+            (['3', 'dsa', 'ddd', '12-01-2000'], 69),
+            (['2', 'dssss', 'ccc', '12-03-2000'], 90),
+        ]
+
+    def test_read_at_positions(self):
+        client = FileDataClient('students_test.txt', Student)
+        assert [
+            (student.record_id, position) for student, position in client.read_at_positions([90, 45])
+        ] == [(1, 45), (2, 90)]
+
     def test_load_entity(self):
         client = FileDataClient('students_test.txt', Student)
         assert client._load_entity('1,first,last,12-02-2000\n') == Student(
@@ -45,3 +62,127 @@ class TestFileDataClient:
         )
 
         assert client._dump_entity(student) == '1,first,last,12-02-2000'
+
+    def test_write_many(self, tmp_path):
+        path = tmp_path / 'students.txt'
+        path.write_text('record_id,first_name,last_name,birthday_date\n')
+        students = [
+            Student(record_id=PrimaryKey(1), first_name='Иван', last_name='last', birthday_date='12-02-2000'),
+            Student(record_id=PrimaryKey(2), first_name='second', last_name='last', birthday_date='12-02-2000'),
+        ]
+        client = FileDataClient(str(path), Student, encoding='utf-8')
+
+        positions = client.write_many(students)
+
+        assert [client.read_at_position(position) for position in positions] == students
+        assert list(client.iter_read()) == list(zip(students, positions))
+
+
+    @pytest.mark.parametrize('keep_open', (False, True))
+    def test_update_delete_compact(self, tmp_path, keep_open):
+        path = tmp_path / 'students.txt'
+        path.write_text('record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n2,second,last,12-02-2000\n')
+        updated = Student(record_id=PrimaryKey(1), first_name='new', last_name='last', birthday_date='12-02-2000')
+
+        with FileDataClient(str(path), Student, keep_open=keep_open) as client:
+            update_position = client.write_update(updated)
+            client.write_tombstone('record_id', 2)
+
+            assert [(marker, key) for marker, key, _, _ in client.iter_changes('record_id')] == [
+                ('', 1), ('', 2), ('~', 1), ('!', 2),
+            ]
+            assert [marker for marker, _, _ in client.iter_keys('record_id')] == ['', '', '~', '!']
+            assert client.read_at_position(update_position) == updated
+            assert len(list(client.iter_read())) == 3  # строка удаления не отдается
+
+            new_positions = client.compact([update_position])
+
+            assert path.read_text() == 'record_id,first_name,last_name,birthday_date\n1,new,last,12-02-2000\n'
+            assert client.read_at_position(new_positions[update_position]) == updated
+
+    @pytest.mark.parametrize('keep_open', (False, True))
+    def test_buffered_write(self, tmp_path, keep_open):
+        path = tmp_path / 'students.txt'
+        header = 'record_id,first_name,last_name,birthday_date\n'
+        path.write_text(header)
+        students = [
+            Student(record_id=PrimaryKey(record_id), first_name='first', last_name='last', birthday_date='12-02-2000')
+            for record_id in range(3)
+        ]
+
+        with FileDataClient(str(path), Student, keep_open=keep_open, buffer_size=1000) as client:
+            positions = [client.write(students[0])] + client.write_many(students[1:])
+
+            assert path.read_text() == header  # все еще в буфере
+            assert [client.read_at_position(position) for position in positions] == students
+            assert list(client.read_at_positions(positions)) == list(zip(students, positions))
+
+            assert list(client.iter_read()) == list(zip(students, positions))  # проход по файлу сбрасывает буфер
+            assert len(path.read_text().splitlines()) == 4
+
+            client.write(Student(PrimaryKey(3), 'first', 'last', '12-02-2000'))
+
+        assert len(path.read_text().splitlines()) == 5  # close сбрасывает буфер
+
+    def test_buffered_write_thresholds(self, tmp_path):
+        path = tmp_path / 'students.txt'
+        path.write_text('record_id,first_name,last_name,birthday_date\n')
+        client = FileDataClient(str(path), Student, buffer_size=40, flush_interval=0.01)
+
+        client.write(Student(PrimaryKey(1), 'first', 'last', '12-02-2000'))
+        client.write(Student(PrimaryKey(2), 'first', 'last', '12-02-2000'))
+        assert len(path.read_text().splitlines()) == 3  # набралось больше 40 байт
+
+        client.write(Student(PrimaryKey(3), 'first', 'last', '12-02-2000'))
+        deadline = time.monotonic() + 1
+        while len(path.read_text().splitlines()) < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(path.read_text().splitlines()) == 4  # сброшено по таймеру
+
+    def test_buffered_write_foreign_append(self, tmp_path):
+        path = tmp_path / 'students.txt'
+        path.write_text('record_id,first_name,last_name,birthday_date\n')
+        client = FileDataClient(str(path), Student, buffer_size=1000)
+
+        client.write(Student(PrimaryKey(1), 'first', 'last', '12-02-2000'))
+        FileDataClient(str(path), Student).write(Student(PrimaryKey(2), 'first', 'last', '12-02-2000'))
+
+        with pytest.raises(RuntimeError):
+            client.flush()
+
+
+class TestFileDataClientKeepOpen:
+    def test_read_at_position(self):
+        with FileDataClient('students_test.txt', Student, keep_open=True) as client:
+            assert client.read_at_position(69) == Student(
+                record_id=PrimaryKey(3),
+                first_name='dsa',
+                last_name='ddd',
+                birthday_date='12-01-2000',
+            )
+
+    def test_iter_read(self):
+        with FileDataClient('students_test.txt', Student, keep_open=True) as client:
+            assert [position for _, position in client.iter_read()] == [45, 69, 90]
+            assert [position for _, position in client.iter_read(69)] == [69, 90]
+
+    def test_write_and_read(self, tmp_path):
+        path = tmp_path / 'students.txt'
+        path.write_text('record_id,first_name,last_name,birthday_date\n1,first,last,12-02-2000\n')
+        student = Student(record_id=PrimaryKey(2), first_name='second', last_name='last', birthday_date='12-02-2000')
+
+        with FileDataClient(str(path), Student, keep_open=True) as client:
+            position = client.write(student)
+
+            # отображение обновляется, когда файл вырос
+            assert client.read_at_position(position) == student
+            assert [entity for entity, _ in client.iter_read()][-1] == student
+
+        assert FileDataClient(str(path), Student).read_at_position(position) == student
+
+    def test_close(self):
+        client = FileDataClient('students_test.txt', Student, keep_open=True)
+        client.close()
+
+        assert client._file is None
+        assert client._mapping is None
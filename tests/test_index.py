@@ -0,0 +1,190 @@
+import pytest
+
+from lib.entities import PrimaryKey
+from lib.exceptions import DuplicateRecordId, RecordNotFound
+from lib.index import ArrayIndex, SortedArrayIndex, AutoIndex, create_index
+from tests.conftest import does_not_raise
+
+
+class TestArrayIndex:
+    def test_add_and_get(self):
+        index = ArrayIndex()
+        index.add(PrimaryKey(3), 10)
+        index.add(PrimaryKey(100), 20)
+
+        assert index.get(PrimaryKey(3)) == 10
+        assert index.get(PrimaryKey(100)) == 20
+        assert len(index) == 2
+        assert list(index.items()) == [(3, 10), (100, 20)]
+
+    @pytest.mark.parametrize(
+        'key, expected_exception',
+        (
+            (PrimaryKey(1), does_not_raise()),
+            (PrimaryKey(0), pytest.raises(RecordNotFound)),
+            (PrimaryKey(1000), pytest.raises(RecordNotFound)),
+            (PrimaryKey(-1), pytest.raises(RecordNotFound)),
+        ),
+    )
+    def test_get(self, key, expected_exception):
+        index = ArrayIndex()
+        index.add(PrimaryKey(1), 0)
+
+        with expected_exception:
+            assert index.get(key) == 0
+
+    def test_add_duplicate(self):
+        index = ArrayIndex()
+        index.add(PrimaryKey(1), 10)
+
+        with pytest.raises(DuplicateRecordId):
+            index.add(PrimaryKey(1), 20)
+
+        assert index.get(PrimaryKey(1)) == 10
+        assert len(index) == 1
+
+    def test_expand_geometric(self):
+        index = ArrayIndex()
+        index.add(PrimaryKey(20), 1)
+        capacity = len(index._positions)
+        index.add(PrimaryKey(capacity), 2)
+
+        assert len(index._positions) == capacity * 2
+
+
+class TestSortedArrayIndex:
+    def test_add_and_get(self):
+        index = SortedArrayIndex()
+        keys = [20231234567, 5, 20231234568, -7, 100]
+        for position, key in enumerate(keys):
+            index.add(PrimaryKey(key), position)
+
+        for position, key in enumerate(keys):
+            assert index.get(PrimaryKey(key)) == position
+
+        assert len(index) == len(keys)
+        assert list(index.items()) == sorted((key, position) for position, key in enumerate(keys))
+
+    def test_merge_pending(self):
+        index = SortedArrayIndex()
+        keys = list(range(5000, 0, -1))
+        for key in keys:
+            index.add(PrimaryKey(key), key * 10)
+
+        assert len(index._pending) < len(keys)
+        assert all(index.get(PrimaryKey(key)) == key * 10 for key in keys)
+
+    @pytest.mark.parametrize(
+        'key, expected_exception',
+        (
+            (PrimaryKey(20231234567), pytest.raises(DuplicateRecordId)),
+            (PrimaryKey(3), pytest.raises(DuplicateRecordId)),
+            (PrimaryKey(4), does_not_raise()),
+        ),
+    )
+    def test_validate(self, key, expected_exception):
+        index = SortedArrayIndex()
+        index.add(PrimaryKey(20231234567), 1)
+        index.add(PrimaryKey(3), 2)
+
+        with expected_exception:
+            index.validate(key)
+
+    def test_get_missing(self):
+        index = SortedArrayIndex()
+        index.add(PrimaryKey(10), 1)
+
+        with pytest.raises(RecordNotFound):
+            index.get(PrimaryKey(11))
+
+
+class TestAutoIndex:
+    def test_dense_keys(self):
+        index = AutoIndex()
+        for key in range(1000):
+            index.add(PrimaryKey(key), key)
+
+        assert isinstance(index._index, ArrayIndex)
+
+    def test_sparse_keys(self):
+        index = AutoIndex()
+        index.add(PrimaryKey(1), 10)
+        index.add(PrimaryKey(20231234567), 20)
+
+        assert isinstance(index._index, SortedArrayIndex)
+        assert index.get(PrimaryKey(1)) == 10
+        assert index.get(PrimaryKey(20231234567)) == 20
+
+        with pytest.raises(DuplicateRecordId):
+            index.add(PrimaryKey(1), 30)
+
+    @pytest.mark.parametrize(
+        'keys, expected_type',
+        (
+            ([100_000, *range(100_000)], ArrayIndex),  # большой ключ в начале не переводит плотные ключи в разреженный индекс
+            ([1, 20231234567, 3, 10**15, 2], SortedArrayIndex),
+            ([5, -1, 3], SortedArrayIndex),
+        ),
+    )
+    def test_build(self, keys, expected_type):
+        index = AutoIndex()
+        index.start_build()
+        for position, key in enumerate(keys):
+            index.add(PrimaryKey(key), position)
+
+        index.put(PrimaryKey(keys[1]), 1000)
+        index.remove(PrimaryKey(keys[2]))
+        with pytest.raises(DuplicateRecordId):
+            index.add(PrimaryKey(keys[0]), 30)
+
+        expected = {key: position for position, key in enumerate(keys)}
+        expected[keys[1]] = 1000
+        del expected[keys[2]]
+        assert dict(index.items()) == expected
+
+        index.finish_build()
+
+        assert isinstance(index._index, expected_type)
+        assert list(index.items()) == sorted(expected.items())
+        assert all(index.get(PrimaryKey(key)) == position for key, position in expected.items())
+        assert len(index) == len(expected)
+
+
+@pytest.mark.parametrize(
+    'index_type',
+    (ArrayIndex, SortedArrayIndex, AutoIndex),
+)
+def test_put_and_remove(index_type):
+    index = index_type()
+    for key in (5, 1, 3):
+        index.add(PrimaryKey(key), key * 10)
+
+    index.put(PrimaryKey(3), 300)  # новая версия записи
+    index.put(PrimaryKey(7), 70)  # новый ключ
+    index.remove(PrimaryKey(5))
+
+    assert index.get(PrimaryKey(3)) == 300
+    assert PrimaryKey(5) not in index
+    assert len(index) == 3
+    assert list(index.items()) == [(1, 10), (3, 300), (7, 70)]
+
+    with pytest.raises(RecordNotFound):
+        index.remove(PrimaryKey(5))
+
+    index.add(PrimaryKey(5), 500)  # удаленный ключ можно добавить заново
+    assert index.get(PrimaryKey(5)) == 500
+    assert len(index) == 4
+
+
+@pytest.mark.parametrize(
+    'mode, expected_type, expected_exception',
+    (
+        ('dense', ArrayIndex, does_not_raise()),
+        ('sparse', SortedArrayIndex, does_not_raise()),
+        ('auto', AutoIndex, does_not_raise()),
+        ('unknown', None, pytest.raises(ValueError)),
+    ),
+)
+def test_create_index(mode, expected_type, expected_exception):
+    with expected_exception:
+        assert isinstance(create_index(mode), expected_type)
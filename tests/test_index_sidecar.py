@@ -0,0 +1,94 @@
+from lib.index_sidecar import IndexSidecar
+
+
+def write_data(path, lines):
+    with open(path, "w") as file:
+        file.write("".join(lines))
+
+
+class TestIndexSidecar:
+    def test_load_missing(self, tmp_path):
+        data_path = tmp_path / "data.txt"
+        write_data(data_path, ["record_id,first_name\n", "1,first\n"])
+
+        assert IndexSidecar(str(tmp_path / "data.idx")).load(str(data_path)) is None
+
+    def test_save_and_load(self, tmp_path):
+        data_path = tmp_path / "data.txt"
+        write_data(data_path, ["record_id,first_name\n", "1,first\n", "3,second\n"])
+        sidecar = IndexSidecar(str(tmp_path / "data.idx"))
+
+        sidecar.save(str(data_path), [(1, 21), (3, 29)])
+        entries, indexed_size = sidecar.load(str(data_path))
+
+        assert list(entries) == [1, 21, 3, 29]
+        assert indexed_size == data_path.stat().st_size
+
+    def test_append(self, tmp_path):
+        data_path = tmp_path / "data.txt"
+        write_data(data_path, ["record_id,first_name\n", "1,first\n"])
+        sidecar = IndexSidecar(str(tmp_path / "data.idx"))
+        sidecar.save(str(data_path), [(1, 21)])
+
+        with open(data_path, "a") as file:
+            file.write("2,second\n")
+        sidecar.append(str(data_path), [(2, 29)])
+
+        entries, indexed_size = sidecar.load(str(data_path))
+        assert list(entries) == [1, 21, 2, 29]
+        assert indexed_size == data_path.stat().st_size
+
+    def test_load_grown_file(self, tmp_path):
+        data_path = tmp_path / "data.txt"
+        write_data(data_path, ["record_id,first_name\n", "1,first\n"])
+        sidecar = IndexSidecar(str(tmp_path / "data.idx"))
+        sidecar.save(str(data_path), [(1, 21)])
+        indexed_size = data_path.stat().st_size
+
+        with open(data_path, "a") as file:
+            file.write("2,second\n")
+
+        # индекс остается валидным до позиции, на которой он был сохранен
+        entries, loaded_size = sidecar.load(str(data_path))
+        assert list(entries) == [1, 21]
+        assert loaded_size == indexed_size
+
+    def test_load_changed_file(self, tmp_path):
+        data_path = tmp_path / "data.txt"
+        write_data(data_path, ["record_id,first_name\n", "1,first\n"])
+        sidecar = IndexSidecar(str(tmp_path / "data.idx"))
+        sidecar.save(str(data_path), [(1, 21)])
+
+        write_data(data_path, ["record_id,first_name\n", "7,other\n", "8,other\n"])
+
+        assert sidecar.load(str(data_path)) is None
+
+    def test_load_changed_middle(self, tmp_path):
+        data_path = tmp_path / "data.txt"
+        lines = ["record_id,first_name\n"] + [f"{record_id},name\n" for record_id in range(10_000)]
+        write_data(data_path, lines)
+        sidecar = IndexSidecar(str(tmp_path / "data.idx"))
+        sidecar.save(str(data_path), [(1, 21)])
+
+        # та же длина, изменение далеко от начала и конца файла
+        lines[5000] = lines[5000].replace("name", "nama")
+        write_data(data_path, lines)
+
+        assert sidecar.load(str(data_path)) is None
+
+    def test_append_continues_checksum(self, tmp_path):
+        data_path = tmp_path / "data.txt"
+        write_data(data_path, ["record_id,first_name\n", "1,first\n"])
+        sidecar = IndexSidecar(str(tmp_path / "data.idx"))
+        sidecar.save(str(data_path), [(1, 21)])
+
+        with open(data_path, "a") as file:
+            file.write("2,second\n")
+        sidecar.append(str(data_path), [(2, 29)])
+        with open(data_path, "a") as file:
+            file.write("3,third\n")
+
+        # сумма, продолженная при append, совпадает с суммой по всему проиндексированному куску
+        entries, indexed_size = sidecar.load(str(data_path))
+        assert list(entries) == [1, 21, 2, 29]
+        assert indexed_size == data_path.stat().st_size - len("3,third\n")
@@ -0,0 +1,57 @@
+import pytest
+
+from lib.metrics import LatencyHistogram, Metrics
+
+
+class TestLatencyHistogram:
+    @pytest.mark.parametrize(
+        'values, percent, expected_result',
+        (
+            ([], 50, 0.0),
+            ([0.000001] * 99 + [0.5], 50, 0.000001),
+            ([0.000001] * 99 + [0.5], 100, 0.5),
+            ([0.003], 99, 0.003),  # оценка не превышает максимум
+        ),
+    )
+    def test_percentile(self, values, percent, expected_result):
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.observe(value)
+
+        assert histogram.percentile(percent) == expected_result
+
+    def test_snapshot(self):
+        histogram = LatencyHistogram()
+        histogram.observe(0.25)
+        histogram.observe(0.75)
+
+        snapshot = histogram.snapshot()
+        assert (snapshot['count'], snapshot['total'], snapshot['mean'], snapshot['max']) == (2, 1.0, 0.5, 0.75)
+
+
+class TestMetrics:
+    def test_snapshot(self):
+        metrics = Metrics()
+        metrics.increment('lookups')
+        metrics.increment('lookups', 2)
+        metrics.set_gauge('index_size', 10)
+        with metrics.timer('lookup_seconds'):
+            pass
+
+        snapshot = metrics.snapshot()
+        assert snapshot['lookups'] == 3
+        assert snapshot['index_size'] == 10
+        assert snapshot['lookup_seconds']['count'] == 1
+
+        metrics.reset()
+        assert metrics.snapshot() == {}
+
+    def test_callback(self):
+        events = []
+        metrics = Metrics()
+        metrics.add_callback(lambda name, value: events.append((name, value)))
+
+        metrics.increment('appends', 5)
+        metrics.observe('append_seconds', 0.5)
+
+        assert events == [('appends', 5), ('append_seconds', 0.5)]
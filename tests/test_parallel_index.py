@@ -0,0 +1,52 @@
+import pytest
+
+from lib.parallel_index import split_ranges, scan_range, scan_keys_parallel
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'students.txt'
+    lines = ['record_id,first_name\n'] + [f'{record_id},name{record_id}\n' for record_id in range(100)]
+    path.write_text(''.join(lines))
+    return str(path)
+
+
+def test_split_ranges(data_path):
+    with open(data_path, 'rb') as file:
+        start = len(file.readline())
+        content = file.read()
+
+    ranges = split_ranges(data_path, start, 7)
+
+    assert ranges[0][0] == start
+    assert ranges[-1][1] == start + len(content)
+    for (_, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert end == next_start
+        assert content[end - start - 1:end - start] == b'\n'  # границы совпадают с началом строк
+
+
+def test_scan_range(data_path):
+    keys, positions, markers = scan_range(data_path, 21, 21 + 8 * 2, 0, b',')
+
+    assert list(keys) == [0, 1]
+    assert list(positions) == [21, 29]
+    assert list(markers) == [0, 0]
+
+
+def test_scan_range_markers(tmp_path):
+    path = tmp_path / 'students.txt'
+    path.write_bytes(b'1,a\n~1,b\n!1,\n')
+
+    keys, positions, markers = scan_range(str(path), 0, 100, 0, b',', b'~!')
+
+    assert list(keys) == [1, 1, 1]
+    assert list(positions) == [0, 4, 9]
+    assert bytes(markers) == b'\0~!'
+
+
+def test_scan_keys_parallel(data_path):
+    keys, positions, _ = scan_range(data_path, 21, 10 ** 6, 0, b',')
+    expected = [('', key, position) for key, position in zip(keys, positions)]
+
+    assert list(scan_keys_parallel(data_path, 21, 0, b',', b'~!', 5)) == expected
+    assert [key for _, key, _ in expected] == list(range(100))
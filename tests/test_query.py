@@ -0,0 +1,76 @@
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+
+from lib.entities import Student, PrimaryKey
+from lib.file_data_client import FileDataClient
+from lib.query import Query, UnionQuery, equals, starts_with, date_between
+
+
+class TestQuery:
+    @pytest.mark.parametrize(
+        'keep_open',
+        (False, True),
+    )
+    def test_where(self, keep_open):
+        with FileDataClient('students_test.txt', Student, keep_open=keep_open) as client:
+            query = Query(client).where('first_name', starts_with('DS'))
+
+            assert list(query) == [
+                Student(record_id=PrimaryKey(3), first_name='dsa', last_name='ddd', birthday_date='12-01-2000'),
+                Student(record_id=PrimaryKey(2), first_name='dssss', last_name='ccc', birthday_date='12-03-2000'),
+            ]
+            assert list(query.where('birthday_date', date_between(date(2000, 3, 1), date(2000, 3, 31)))) == [
+                Student(record_id=PrimaryKey(2), first_name='dssss', last_name='ccc', birthday_date='12-03-2000'),
+            ]
+
+    def test_select(self):
+        client = FileDataClient('students_test.txt', Student)
+        query = Query(client).where('last_name', equals('last')).select('record_id', 'birthday_date')
+
+        assert list(query) == [{'record_id': 1, 'birthday_date': '12-02-2000'}]
+        assert type(query.first()['record_id']) is PrimaryKey
+
+    @pytest.mark.parametrize(
+        'count, expected_rows_read',
+        (
+            (0, 0),
+            (1, 1),
+            (2, 2),
+            (5, 3),
+        ),
+    )
+    def test_limit(self, count, expected_rows_read):
+        rows = [
+            (['1', 'first', 'last', '12-02-2000'], 0),
+            (['3', 'dsa', 'ddd', '12-01-2000'], 1),
+            (['2', 'dssss', 'ccc', '12-03-2000'], 2),
+        ]
+        rows_read = []
+
+        def iter_rows():
+            for row in rows:
+                rows_read.append(row)
+                yield row
+
+        client = MagicMock()
+        client.entity_type = Student
+        client.field_names = ['record_id', 'first_name', 'last_name', 'birthday_date']
+        client.iter_rows.side_effect = iter_rows
+
+        result = list(Query(client).select('record_id').limit(count))
+
+        assert len(result) == min(count, len(rows))
+        assert len(rows_read) == expected_rows_read  # после limit записей файл дальше не читается
+
+    def test_limit_negative(self):
+        with pytest.raises(ValueError):
+            Query(MagicMock()).limit(-1)
+
+    def test_union(self):
+        client = FileDataClient('students_test.txt', Student)
+        query = UnionQuery.of([Query(client), Query(client)]).where('first_name', starts_with('DS')).select('record_id')
+
+        assert list(query) == [{'record_id': 3}, {'record_id': 2}] * 2
+        assert list(query.limit(3)) == [{'record_id': 3}, {'record_id': 2}, {'record_id': 3}]
@@ -0,0 +1,68 @@
+import pytest
+
+from lib.data_access import IndexFileStudentDataAccess
+from lib.entities import Student, PrimaryKey
+from lib.exceptions import RecordNotFound
+from lib.file_data_client import FileDataClient
+from lib.index_sidecar import IndexSidecar
+from lib.quick_lookup import find_student
+from tests.conftest import does_not_raise
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'students.txt'
+    path.write_text(
+        'record_id,first_name,last_name,birthday_date\n'
+        '1,first,last,12-02-2000\n'
+        '2,second,last,12-02-2000\n'
+        '3,third,last,12-02-2000\n'
+        '~1,updated,last,12-02-2000\n'
+        '!2,,,\n'
+    )
+    return path
+
+
+@pytest.mark.parametrize(
+    'with_index, record_id, expected_first_name, expected_exception',
+    (
+        (False, PrimaryKey(1), 'updated', does_not_raise()),
+        (False, PrimaryKey(3), 'third', does_not_raise()),
+        (False, PrimaryKey(2), None, pytest.raises(RecordNotFound)),
+        (False, PrimaryKey(7), None, pytest.raises(RecordNotFound)),
+        (True, PrimaryKey(1), 'updated', does_not_raise()),
+        (True, PrimaryKey(3), 'third', does_not_raise()),
+        (True, PrimaryKey(2), None, pytest.raises(RecordNotFound)),
+        (True, PrimaryKey(7), None, pytest.raises(RecordNotFound)),
+    ),
+)
+def test_find_student(tmp_path, data_path, with_index, record_id, expected_first_name, expected_exception):
+    index_path = str(tmp_path / 'students.txt.idx')
+    if with_index:
+        IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), index_path=index_path)
+
+    with expected_exception:
+        assert find_student(FileDataClient(str(data_path), Student), record_id, index_path).first_name == expected_first_name
+
+
+def test_find_student_after_index(tmp_path, data_path):
+    index_path = str(tmp_path / 'students.txt.idx')
+    IndexFileStudentDataAccess(FileDataClient(str(data_path), Student), index_path=index_path)
+
+    # строки, дописанные после сохранения индекса, находятся сканированием хвоста файла
+    with data_path.open('a') as file:
+        file.write('4,fourth,last,12-02-2000\n~3,changed,last,12-02-2000\n!1,,,\n')
+
+    file_client = FileDataClient(str(data_path), Student)
+    assert find_student(file_client, PrimaryKey(4), index_path).first_name == 'fourth'
+    assert find_student(file_client, PrimaryKey(3), index_path).first_name == 'changed'
+    with pytest.raises(RecordNotFound):
+        find_student(file_client, PrimaryKey(1), index_path)
+
+
+def test_find_student_stale_index(tmp_path, data_path):
+    index_path = str(tmp_path / 'students.txt.idx')
+    # индекс соответствует файлу по контрольной сумме, но позиции в нем перепутаны
+    IndexSidecar(index_path).save(str(data_path), [(1, 94), (3, 45)])
+
+    assert find_student(FileDataClient(str(data_path), Student), PrimaryKey(3), index_path).first_name == 'third'
@@ -0,0 +1,43 @@
+from datetime import date
+
+import pytest
+
+from lib.secondary_index import SortedValueIndex, parse_date
+
+
+@pytest.mark.parametrize(
+    'value, expected_result',
+    (
+        ('2000-02-12', date(2000, 2, 12)),
+        ('12-02-2000', date(2000, 2, 12)),
+        ('123', None),
+    ),
+)
+def test_parse_date(value, expected_result):
+    assert parse_date(value) == expected_result
+
+
+class TestSortedValueIndex:
+    def test_find(self):
+        index = SortedValueIndex()
+        index.load([('иванов', 10), ('петров', 20), ('иванов', 30)])
+        index.add('иванова', 40)
+
+        assert sorted(index.find('иванов')) == [10, 30]
+        assert index.find('сидоров') == []
+        assert len(index) == 4
+
+    def test_find_prefix(self):
+        index = SortedValueIndex()
+        index.load([('иванов', 10), ('петров', 20), ('иванова', 30), ('ив', 40), ('и', 50)])
+
+        assert sorted(index.find_prefix('ив')) == [10, 30, 40]
+        assert index.find_prefix('я') == []
+
+    def test_find_range(self):
+        index = SortedValueIndex()
+        index.load([(1, 10), (5, 20), (7, 30)])
+        index.add(5, 40)
+
+        assert sorted(index.find_range(2, 5)) == [20, 40]
+        assert index.find_range(8, 9) == []
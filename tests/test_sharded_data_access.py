@@ -0,0 +1,156 @@
+import os
+import threading
+from datetime import date
+
+import pytest
+
+from lib.entities import PrimaryKey, Student
+from lib.exceptions import DuplicateRecordId, RecordNotFound
+from lib.file_data_client import FileDataClient
+from lib.query import starts_with
+from lib.sharded_data_access import (
+    HashRouter,
+    RangeRouter,
+    ShardedStudentDataAccess,
+    create_router,
+    even_range_bounds,
+    split_into_shards,
+)
+from tests.conftest import does_not_raise
+
+HEADER = 'record_id,first_name,last_name,birthday_date\n'
+
+
+def make_student(record_id: int, last_name: str = 'last') -> Student:
+    return Student(PrimaryKey(record_id), f'first{record_id}', last_name, '12-02-2000')
+
+
+@pytest.mark.parametrize(
+    'router, record_id, expected_shard',
+    (
+        (HashRouter(3), 7, 1),
+        (HashRouter(3), 9, 0),
+        (RangeRouter([10, 20]), 9, 0),
+        (RangeRouter([10, 20]), 10, 1),
+        (RangeRouter([10, 20]), 25, 2),
+    ),
+)
+def test_router(router, record_id, expected_shard):
+    assert router.shard_for(record_id) == expected_shard
+
+
+@pytest.mark.parametrize(
+    'routing, range_bounds, expectation',
+    (
+        ('hash', None, does_not_raise()),
+        ('range', [10, 20], does_not_raise()),
+        ('range', [20, 10], pytest.raises(ValueError)),
+        ('range', [10], pytest.raises(ValueError)),
+        ('unknown', None, pytest.raises(ValueError)),
+    ),
+)
+def test_create_router(routing, range_bounds, expectation):
+    with expectation:
+        create_router(routing, 3, range_bounds)
+
+
+def test_even_range_bounds():
+    assert even_range_bounds(range(100), 4) == [25, 50, 75]
+
+
+@pytest.fixture()
+def shard_paths(tmp_path):
+    paths = [str(tmp_path / f'students.{shard}.txt') for shard in range(3)]
+    for path in paths:
+        with open(path, 'w') as file:
+            file.write(HEADER)
+    return paths
+
+
+class TestShardedStudentDataAccess:
+    def test_add_and_get(self, shard_paths):
+        with ShardedStudentDataAccess(shard_paths, shard_options={'secondary_indexes': True}) as dao:
+            dao.add_students(make_student(record_id) for record_id in range(6))
+            dao.add_student(make_student(6, last_name='other'))
+
+            assert dao.get_student(PrimaryKey(4)) == make_student(4)
+            assert dao.get_students([PrimaryKey(5), PrimaryKey(1), PrimaryKey(100)]) == {
+                5: make_student(5), 1: make_student(1), 100: None,
+            }
+            assert sorted(student.record_id for student in dao.find_by_last_name('last')) == [0, 1, 2, 3, 4, 5]
+            assert dao.find_by_first_name('first6') == [make_student(6, last_name='other')]
+            assert len(dao.find_by_birthday(date(2000, 1, 1), date(2000, 12, 31))) == 7
+            assert sorted(
+                row['record_id'] for row in dao.query().where('last_name', starts_with('LA')).select('record_id')
+            ) == [0, 1, 2, 3, 4, 5]
+            assert len(list(dao.query().limit(4))) == 4
+
+        # записи лежат в своих шардах: id % 3
+        with open(shard_paths[1]) as file:
+            assert [line.split(',')[0] for line in file.readlines()[1:]] == ['1', '4']
+
+        # индексы шардов загружаются с диска
+        with ShardedStudentDataAccess(shard_paths) as dao:
+            assert dao.get_student(PrimaryKey(6)) == make_student(6, last_name='other')
+
+    def test_add_students_is_atomic(self, shard_paths):
+        with ShardedStudentDataAccess(shard_paths) as dao:
+            dao.add_student(make_student(4))
+
+            with pytest.raises(DuplicateRecordId):
+                dao.add_students([make_student(0), make_student(4)])
+            with pytest.raises(DuplicateRecordId):
+                dao.add_students([make_student(1), make_student(1)])
+
+            assert dao.get_students([PrimaryKey(0), PrimaryKey(1)]) == {0: None, 1: None}
+
+    def test_shard_locks(self, shard_paths):
+        with ShardedStudentDataAccess(shard_paths) as dao:
+            assert [shard.index_workers for shard in dao._shards] == [os.cpu_count() or 1] * 3
+
+            with dao._shard_locks[0]:
+                # запись в другой шард не ждет блокировки шарда 0
+                writer = threading.Thread(target=dao.add_students, args=([make_student(1), make_student(2)],))
+                writer.start()
+                writer.join(timeout=5)
+                assert not writer.is_alive()
+
+                # пачка, затрагивающая шард 0, ждет его освобождения
+                blocked = threading.Thread(target=dao.add_students, args=([make_student(3), make_student(4)],))
+                blocked.start()
+                blocked.join(timeout=0.1)
+                assert blocked.is_alive()
+
+            blocked.join(timeout=5)
+            assert sorted(student.record_id for student in dao.query()) == [1, 2, 3, 4]
+
+    def test_update_delete_compact(self, shard_paths):
+        with ShardedStudentDataAccess(shard_paths, routing='range', range_bounds=[2, 4]) as dao:
+            dao.add_students(make_student(record_id) for record_id in range(6))
+            dao.update_student(make_student(3, last_name='new'))
+            dao.delete_student(PrimaryKey(5))
+            dao.compact()
+
+            assert dao.get_student(PrimaryKey(3)) == make_student(3, last_name='new')
+            with pytest.raises(RecordNotFound):
+                dao.get_student(PrimaryKey(5))
+
+        with open(shard_paths[2]) as file:
+            assert file.read() == HEADER + '4,first4,last,12-02-2000\n'
+
+
+def test_split_into_shards(tmp_path):
+    source_path = tmp_path / 'students.txt'
+    source_path.write_text(
+        HEADER + '1,first,last,12-02-2000\n2,second,last,12-02-2000\n~1,new,last,12-02-2000\n!2,,,\n3,third,last,12-02-2000\n'
+    )
+    shard_paths = [str(tmp_path / f'students.{shard}.txt') for shard in range(2)]
+
+    counts = split_into_shards(FileDataClient(str(source_path), Student), shard_paths, HashRouter(2))
+
+    assert counts == [0, 2]
+    with open(shard_paths[1]) as file:
+        assert file.read() == HEADER + '1,new,last,12-02-2000\n3,third,last,12-02-2000\n'
+
+    with pytest.raises(FileExistsError):
+        split_into_shards(FileDataClient(str(source_path), Student), shard_paths, HashRouter(2))
@@ -0,0 +1,31 @@
+import argparse
+
+from lib.binary_data_client import convert_text_file
+from lib.data_access import KEY_FIELD
+from lib.entities import Student
+from lib.file_data_client import FileDataClient
+
+# Раскладка колонок студента: строки в utf-8, кириллица занимает 2 байта на символ
+STUDENT_FIELD_FORMATS = {
+    "record_id": "q",
+    "first_name": "64s",
+    "last_name": "64s",
+    "birthday_date": "10s",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Конвертация students.txt в бинарный формат с записями фиксированной длины")
+    parser.add_argument("source", help="путь к текстовому файлу")
+    parser.add_argument("target", help="путь к создаваемому бинарному файлу")
+    parser.add_argument("--encoding", default=None, help="кодировка текстового файла")
+    args = parser.parse_args()
+
+    source = FileDataClient(args.source, Student, encoding=args.encoding)
+    count = convert_text_file(source, args.target, KEY_FIELD, STUDENT_FIELD_FORMATS)
+
+    print(f"Converted {count} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import argparse
+
+from lib.compressed_data_client import CODECS, CODEC_ZLIB, convert_text_file
+from lib.data_access import KEY_FIELD
+from lib.entities import Student
+from lib.file_data_client import FileDataClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Конвертация students.txt в файл со сжатыми блоками")
+    parser.add_argument("source", help="путь к текстовому файлу")
+    parser.add_argument("target", help="путь к создаваемому сжатому файлу")
+    parser.add_argument("--codec", choices=sorted(CODECS), default=CODEC_ZLIB)
+    parser.add_argument("--block-size", type=int, default=64 * 1024, help="байт строк в одном блоке до сжатия")
+    parser.add_argument("--encoding", default=None, help="кодировка текстового файла")
+    args = parser.parse_args()
+
+    source = FileDataClient(args.source, Student, encoding=args.encoding)
+    count = convert_text_file(source, args.target, KEY_FIELD, args.codec, args.block_size)
+
+    print(f"Converted {count} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+
+from lib.entities import Student
+from lib.file_data_client import FileDataClient
+from lib.sharded_data_access import ROUTING_HASH, ROUTING_RANGE, create_router, even_range_bounds, split_into_shards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Раскладка students.txt по файлам шардов для ShardedStudentDataAccess")
+    parser.add_argument("source", help="путь к текстовому файлу")
+    parser.add_argument("--shards", type=int, required=True, help="кол-во шардов")
+    parser.add_argument("--routing", choices=(ROUTING_HASH, ROUTING_RANGE), default=ROUTING_HASH)
+    parser.add_argument(
+        "--bounds", type=int, nargs="*", default=None,
+        help="границы диапазонов id для range. По умолчанию подбираются так, чтобы в шардах было поровну записей",
+    )
+    parser.add_argument(
+        "--target-pattern", default="students.{shard}.txt", help="путь к файлу шарда, {shard} - номер шарда"
+    )
+    parser.add_argument("--encoding", default=None, help="кодировка текстового файла")
+    args = parser.parse_args()
+
+    source = FileDataClient(args.source, Student, encoding=args.encoding)
+    bounds = args.bounds
+    if args.routing == ROUTING_RANGE and bounds is None:
+        bounds = even_range_bounds((record_id for _, record_id, _ in source.iter_keys("record_id")), args.shards)
+
+    shard_paths = [args.target_pattern.format(shard=shard_index) for shard_index in range(args.shards)]
+    counts = split_into_shards(source, shard_paths, create_router(args.routing, args.shards, bounds))
+
+    for path, count in zip(shard_paths, counts):
+        print(f"{path}: {count} records")
+
+    # эти же параметры нужно указать в config.get_config для ShardedStudentDataAccess
+    print(f"routing={args.routing!r}" + (f", range_bounds={bounds}" if args.routing == ROUTING_RANGE else ""))
+
+
+if __name__ == "__main__":
+    main()